@@ -0,0 +1,125 @@
+"""
+Backends de almacenamiento de los anuncios extraídos.
+
+FUNCIONAMIENTO:
+1. tipar_anuncios() convierte los registros (cadenas tal como salen de la página) en columnas tipadas:
+   precio, área y dormitorios numéricos (normalizacion.py), fecha como fecha real y columnas categóricas (tipo, promotora,
+   certificado energético, código postal) codificadas como diccionario.
+2. guardar_anuncios() escribe un lote de registros en el formato configurado (FORMATO_SALIDA):
+   - 'csv': el CSV de siempre ('datos/anuncios.csv'), sin tipar.
+   - 'parquet': dataset Parquet particionado por fecha de captura y código postal
+     ('datos/anuncios_parquet/fecha=2024-11-20/codigo_postal=28001/...').
+   - 'sqlite': tabla tipada 'anuncios' con índice por fecha y código postal.
+3. leer_anuncios_parquet() lee solo las particiones y columnas necesarias.
+
+USO:
+    guardar_anuncios(registros, formato='parquet')
+    df = leer_anuncios_parquet(columnas=['precio'], desde=datetime.date(2024, 11, 1), codigos_postales=['28001'])
+
+Las consultas habituales ("mediana del precio por código postal este mes") leen una partición y unas
+pocas columnas en lugar de todo el histórico.
+"""
+
+import datetime
+import os
+import sqlite3
+import pandas as pd
+import configuracion
+from campos_anuncio import COLUMNAS_ANUNCIO, ENCABEZADOS_CSV
+from normalizacion import normalizar_anuncios
+
+# Columnas categóricas (se guardan codificadas como diccionario)
+COLUMNAS_CATEGORICAS = ['promotora', 'certificado_energetico', 'codigo_postal', 'tipo']
+
+# Columnas numéricas y su tipo
+COLUMNAS_NUMERICAS = {'precio': 'Float64', 'area': 'Float64', 'dormitorios': 'Int64'}
+
+
+# Función para guardar los datos en un archivo CSV
+def guardar_datos_csv(data, ruta=configuracion.RUTA_ANUNCIOS_CSV):
+    """Añade la lista de anuncios al CSV; solo escribe el encabezado si el archivo está vacío."""
+    df_anuncios = pd.DataFrame(data, columns=COLUMNAS_ANUNCIO).rename(columns=ENCABEZADOS_CSV)
+    with open(ruta, mode='a', newline='', encoding='utf-8') as f:
+        df_anuncios.to_csv(f, index=False, header=f.tell() == 0)
+        f.flush()
+        os.fsync(f.fileno())  # Que las filas estén en disco antes de marcarlas en el punto de control
+
+# Función para tipar los registros
+def tipar_anuncios(registros):
+    """Devuelve un DataFrame con las columnas de COLUMNAS_ANUNCIO tipadas."""
+    df = pd.DataFrame(registros, columns=COLUMNAS_ANUNCIO)
+    df['fecha'] = pd.to_datetime(df['fecha'], format='%d-%m-%Y').dt.date
+    normalizados = normalizar_anuncios(df[['precio', 'area', 'dormitorios', 'planta', 'certificado_energetico']])
+    for columna, normalizada in (('precio', 'precio_eur'), ('area', 'superficie_m2'), ('dormitorios', 'habitaciones')):
+        df[columna] = normalizados[normalizada].astype(COLUMNAS_NUMERICAS[columna])
+    df['codigo_postal'] = df['codigo_postal'].astype(str)
+    for columna in COLUMNAS_CATEGORICAS:
+        df[columna] = df[columna].astype('category')
+    otras = [c for c in COLUMNAS_ANUNCIO if c not in COLUMNAS_NUMERICAS and c not in COLUMNAS_CATEGORICAS and c != 'fecha']
+    df[otras] = df[otras].astype('string')
+    return df
+
+# Función para guardar en Parquet particionado
+def guardar_parquet(registros, directorio=configuracion.DIR_PARQUET):
+    """Añade los registros al dataset Parquet particionado por fecha y código postal."""
+    import pyarrow as pa  # Dependencia opcional, solo para este formato
+    import pyarrow.parquet as pq
+    df = tipar_anuncios(registros)
+    df['fecha'] = df['fecha'].astype(str)  # La partición se guarda como 'fecha=aaaa-mm-dd'
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(tabla, root_path=directorio, partition_cols=['fecha', 'codigo_postal'])
+
+# Función para leer del dataset Parquet
+def leer_anuncios_parquet(columnas=None, desde=None, hasta=None, codigos_postales=None, directorio=configuracion.DIR_PARQUET):
+    """Lee solo las particiones (fecha, código postal) y columnas pedidas."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    particiones = ds.partitioning(pa.schema([('fecha', pa.date32()), ('codigo_postal', pa.string())]), flavor='hive')
+    dataset = ds.dataset(directorio, format='parquet', partitioning=particiones)
+    filtro = None
+    condiciones = []
+    if desde:
+        condiciones.append(ds.field('fecha') >= desde)
+    if hasta:
+        condiciones.append(ds.field('fecha') <= hasta)
+    if codigos_postales:
+        condiciones.append(ds.field('codigo_postal').isin([str(cp) for cp in codigos_postales]))
+    for condicion in condiciones:
+        filtro = condicion if filtro is None else filtro & condicion
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+# Función para guardar en SQLite
+def guardar_sqlite(registros, ruta=configuracion.RUTA_ANUNCIOS_SQLITE):
+    """Añade los registros a la tabla tipada 'anuncios'."""
+    df = tipar_anuncios(registros)
+    df['fecha'] = df['fecha'].astype(str)
+    for columna in COLUMNAS_CATEGORICAS:  # SQLite no tiene diccionarios: se guardan como texto
+        df[columna] = df[columna].astype('string')
+    with sqlite3.connect(ruta) as conexion:
+        conexion.execute("""
+            CREATE TABLE IF NOT EXISTS anuncios (
+                fecha DATE, referencia TEXT, promotora TEXT, zonas_comunes TEXT, certificado_energetico TEXT,
+                codigo_postal TEXT, direccion TEXT, dormitorios INTEGER, area REAL, planta TEXT,
+                caracteristicas TEXT, fecha_actualizacion TEXT, url TEXT, img TEXT, tipo TEXT, precio REAL
+            )
+        """)
+        conexion.execute("CREATE INDEX IF NOT EXISTS anuncios_fecha_cp ON anuncios(fecha, codigo_postal)")
+        df.astype(object).where(df.notna(), None).to_sql('anuncios', conexion, if_exists='append', index=False)
+
+# Función para guardar un lote en el formato configurado
+def guardar_anuncios(registros, formato=configuracion.FORMATO_SALIDA, ruta=None):
+    """Guarda un lote de registros en 'csv', 'parquet' o 'sqlite' (ruta=None usa la de configuracion)."""
+    backends = {'csv': guardar_datos_csv, 'parquet': guardar_parquet, 'sqlite': guardar_sqlite}
+    if formato not in backends:
+        raise ValueError(f"Formato de salida desconocido: {formato}")
+    if ruta is None:
+        backends[formato](registros)
+    else:
+        backends[formato](registros, ruta)
+
+# Función de ejemplo: mediana del precio por código postal
+def mediana_precio_por_cp(desde=None, hasta=None):
+    """Mediana del precio por código postal leyendo solo las columnas necesarias del Parquet."""
+    desde = desde or datetime.date.today().replace(day=1)
+    df = leer_anuncios_parquet(columnas=['codigo_postal', 'precio'], desde=desde, hasta=hasta)
+    return df.groupby('codigo_postal', observed=True)['precio'].median()
@@ -8,12 +8,14 @@ Este script utiliza Selenium para realizar web scraping en una página de anunci
 Extrae información relevante sobre cada anuncio y la guarda en un archivo CSV.
 
 Flujo de trabajo:
-1. Carga una lista de enlaces de anuncios desde un archivo CSV.
+1. Carga una lista de enlaces de anuncios desde un archivo CSV y le añade los de la cola de reintentos
+   (fallos.py) cuyo reintento ya toca.
 2. Para cada enlace:
    - Abre el navegador en modo incógnito con un agente de usuario aleatorio.
    - Accede a la página del anuncio y espera su carga.
-   - Verifica si la página está bloqueada y, de ser así, detiene la ejecución.
-   - Extrae datos clave del anuncio (promotora, precio, superficie, número de habitaciones, etc.).
+   - Verifica si la página está bloqueada y, de ser así, la anota en la cola de reintentos (fallos.py) y sigue con el siguiente.
+   - Extrae datos clave del anuncio (promotora, precio, superficie, número de habitaciones, etc.); si falla, lo anota
+     en la cola de reintentos en lugar de guardar campos a medias.
    - Almacena los datos extraídos en un archivo CSV.
    - Cierra el navegador y pasa al siguiente anuncio.
 
@@ -36,7 +38,13 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+from pool_drivers import PaginaBloqueada
+from fallos import ColaReintentos
 from time import sleep
+from campos_anuncio import CAMPOS_ANUNCIO, extraer_campos, referencia_anuncio
+from navegacion import scroll_hasta, aceptar_cookies
+from metricas import obtener_metricas
 import datetime
 import random
 import pandas as pd
@@ -52,11 +60,17 @@ def esperar_aleatoriamente(min_seg=5, max_seg=15):
 
 # Leer el archivo csv
 pd.set_option('display.max_colwidth', None)
-df = pd.read_csv('datos/links_anuncios.csv', header=None)[[1, 2]] # Leer el archivo csv
+df = pd.read_csv('datos/links_anuncios.csv', header=None, usecols=[1, 2], dtype=str) # Leer el archivo csv (sin las columnas de la tarjeta)
 df_lista = df.values.tolist() # Convertir a lista seleccionando las columnas 1 y 2
+metricas = obtener_metricas()  # Tiempos por tramo y contadores (metricas.py)
+reintentos = ColaReintentos()  # Anuncios bloqueados o sin cargar, para reintentarlos (fallos.py)
+df_lista += reintentos.listos('anuncios')  # Reintentos de ejecuciones anteriores que ya tocan
+
 links = [] # Lista de links
+referencias = set() # Referencias ya añadidas (un anuncio puede venir del CSV y de los reintentos)
 for item in df_lista: # Recorrer la lista
-    if item not in links: # Si el item no está en la lista de links
+    if referencia_anuncio(item[1]) not in referencias: # Si el anuncio no está en la lista de links
+        referencias.add(referencia_anuncio(item[1]))
         links.append(item) # Agregar a la lista de links
 
 print(f"Se encontraron {len(links)} anuncios")
@@ -83,61 +97,72 @@ for link in links:
     ]
     options.add_argument(f'user-agent={random.choice(user_agents)}')
     # Inicializar el driver
-    driver = webdriver.Chrome(service=service, options=options)
+    with metricas.tramo('arranque_driver'):
+        driver = webdriver.Chrome(service=service, options=options)
     esperar_aleatoriamente(1, 5)  # Esperar antes de interactuar
 
     # Ingresar a la pagina
-    driver.get(str(link[1])) # Ingresar a la pagina
+    with metricas.tramo('get'):
+        driver.get(str(link[1])) # Ingresar a la pagina
+    metricas.contar('paginas')
     esperar_aleatoriamente()  # Esperar antes de interactuar
     driver.maximize_window() # Maximizar la ventana
 
     # Verificar si la pagina esta bloqueada
-    bloqueo = driver.find_elements(By.XPATH, '//html/body/div/h1') if driver.find_elements(By.XPATH, '//html/body/div/h1') else 0
+    with metricas.tramo('comprobar_bloqueo'):
+        bloqueo = driver.find_elements(By.XPATH, '//html/body/div/h1') if driver.find_elements(By.XPATH, '//html/body/div/h1') else 0
     if bloqueo != 0:
+        metricas.contar('bloqueos')
         print("Pagina bloqueada")
+        reintentos.registrar('anuncios', referencia_anuncio(link[1]), link, PaginaBloqueada(link[1]))  # Reintentar más tarde y seguir
         driver.quit()
-        break
+        continue
 
     # Esperar a que cargue la pagina
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
-    
-    # Espera a que el popup sea visible y cierra el popup
     try:
-        close_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-agree-button"]'))
-        )
-        close_button.click()
-    except Exception as e:
-        print("No se pudo cerrar el popup:", e)
+        with metricas.tramo('espera_app'):
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
+    except TimeoutException as e:
+        print("La pagina no ha cargado a tiempo")
+        reintentos.registrar('anuncios', referencia_anuncio(link[1]), link, e)
+        driver.quit()
+        continue
+    
+    # Aceptar las cookies si el aviso está en la página (una sola vez por sesión)
+    with metricas.tramo('cookies'):
+        aceptar_cookies(driver)
 
 
-    # Hacer scroll hasta el final de la pagina
-    height = driver.execute_script("return Math.max( document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight );")
-    for e in range(0, height, 700):
-        driver.execute_script('window.scrollTo(0, {});'.format(e))
-        esperar_aleatoriamente(1, 5)  # Esperar antes de seguir
+    # Hacer scroll hasta que estén todos los campos de la ficha (o la página deje de cambiar)
+    with metricas.tramo('scroll'):
+        scroll_hasta(driver, CAMPOS_ANUNCIO.values())
 
     try:
         fecha = datetime.datetime.today().strftime('%d-%m-%Y')
-        referencia = (link[1].split("/")[-1]).split("?")[-2] # Extraemos la referencia
-        promotora = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[2]/section[1]/div/div/div/div/div[2]/div[1]/h4').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[2]/section[1]/div/div/div/div/div[2]/div[1]/h4') else 'No disponible'
-        zonas_comunes = 'No disponible'
-        certificado_energetico = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[4]/div[1]/div/div/span[3]').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[4]/div[1]/div/div/span[3]') else 'No disponible'
+        referencia = referencia_anuncio(link[1]) # Extraemos la referencia
+        with metricas.tramo('extraccion'):
+            campos = extraer_campos(driver)  # Todos los campos de CAMPOS_ANUNCIO en una sola llamada
+        promotora = campos['promotora']
+        zonas_comunes = campos['zonas_comunes']
+        certificado_energetico = campos['certificado_energetico']
         codigo_postal = cd_postal
-        direccion = 'No disponible'
-        dormitorios = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[2]/div/div/span[2]').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[2]/div/div/span[2]') else 'No disponible'
-        area = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[4]/div/div/span[2]').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[4]/div/div/span[2]') else 'No disponible'
-        planta = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[5]/div/div/span[2]').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[5]/div/div/span[2]') else 'No disponible'
-        caracteristicas = 'No disponible'
-        fecha_actualizacion = 'No disponible'
+        direccion = campos['direccion']
+        dormitorios = campos['dormitorios']
+        area = campos['area']
+        planta = campos['planta']
+        caracteristicas = campos['caracteristicas']
+        fecha_actualizacion = campos['fecha_actualizacion']
         url = link
-        img = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[2]/section/figure[1]/img').get_attribute('src') if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[2]/section/figure[1]/img') else 'No disponible'
-        tipo = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[1]/div/div/span[2]').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[1]/div/div/span[2]') else 'No disponible'
-        precio = driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[1]/div/div[2]/div[1]/span').text if driver.find_element(By.XPATH, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[1]/div/div[2]/div[1]/span') else 'No disponible'
+        img = campos['img']
+        tipo = campos['tipo']
+        precio = campos['precio']
         print(fecha, referencia, promotora, zonas_comunes, certificado_energetico, codigo_postal, direccion, dormitorios, area, planta, caracteristicas, fecha_actualizacion, url, img, tipo, precio)
     except Exception as e:
         logging.error(f"Error en {link[1]}: {str(e)}")
         print("No se pudo obtener la información:", e)
+        reintentos.registrar('anuncios', referencia_anuncio(link[1]), link, e)  # No se guardan campos a medias
+        driver.quit()
+        continue
 
     esperar_aleatoriamente()  # Esperar antes de interactuar
 
@@ -146,8 +171,12 @@ for link in links:
         fecha, referencia, promotora, zonas_comunes, certificado_energetico, codigo_postal, direccion, dormitorios, area, planta, caracteristicas, fecha_actualizacion, url, img, tipo, precio]], 
         columns=['Fecha', 'Referencia', 'Promotora', 'Zonas comunes', 'Certificado energético', 'Código postal', 'Dirección', 'Dormitorios', 'Área', 'Planta', 'Características', 'Fecha de actualización', 'URL', 'Imagen', 'Tipo', 'Precio'])
     
-    with open('datos/anuncios.csv', mode='a', newline='', encoding='utf-8') as f:
+    with metricas.tramo('escritura'), open('datos/anuncios.csv', mode='a', newline='', encoding='utf-8') as f:
         anuncios.to_csv(f, index=False, header=f.tell()==0)  # Solo escribe encabezado si el archivo está vacío
+    reintentos.completar('anuncios', [referencia_anuncio(link[1])])  # Sale de la cola de reintentos si estaba
 
     # Cerrar el driver
-    driver.quit()
\ No newline at end of file
+    driver.quit()
+
+reintentos.cerrar()
+metricas.imprimir_resumen()
@@ -10,27 +10,45 @@ de manera eficiente y robusta.
 Mejoras en esta versión:
 ✔ Manejo avanzado de excepciones con logging detallado para una mejor trazabilidad de errores.
 ✔ Optimización de tiempos de espera mediante WebDriverWait, evitando esperas innecesarias.
+✔ Consentimiento de cookies recordado por sesión y perfil, sin esperar al aviso en cada anuncio.
 ✔ Prevención de bloqueos mediante la rotación de agentes de usuario y tiempos de espera aleatorios.
 ✔ Estructuración del código en funciones reutilizables, mejorando la legibilidad y mantenimiento.
 ✔ Uso de context manager para gestionar el ciclo de vida del WebDriver de forma más eficiente.
-✔ Implementación de scroll eficiente para cargar todo el contenido dinámico de la página.
+✔ Scroll guiado por condiciones (navegacion.py): se detiene al aparecer los campos o al estabilizarse el DOM.
 ✔ Eliminación de la inicialización del WebDriver en cada iteración, mejorando el rendimiento.
-✔ Guardado de datos de manera incremental en CSV sin sobrescribir registros existentes.
+✔ Pool de navegadores reutilizables (pool_drivers.py) que reparte los anuncios entre varios hilos.
+✔ Campos definidos de forma declarativa (campos_anuncio.py) y extraídos con una sola llamada al navegador.
+✔ Guardado opcional del HTML de cada anuncio para repetir la extracción sin navegador (parser_offline.py).
+✔ Archivo comprimido y deduplicado de las fichas descargadas (archivo_paginas.py).
+✔ Modo HTTP sin navegador (fetch_http.py, MODO_FETCH='http') con Selenium como alternativa.
+✔ Guardado de datos de manera incremental en CSV sin sobrescribir registros existentes, por lotes y con reanudación.
 
 Flujo de trabajo:
-1. Carga una lista de enlaces de anuncios desde un archivo CSV.
+1. Lee los enlaces de anuncios del archivo CSV fila a fila, por trozos de TROZO_ENLACES, y, consultando
+   el índice de anuncios vistos (indice_vistos.py), se queda solo con los nuevos, los extraídos hace más
+   de TTL_VISTOS_DIAS y los que tienen una tarjeta distinta (precio, dormitorios, superficie) de la que
+   tenían al extraerlos.
+   Si la tarjeta no ha cambiado, la ficha no se vuelve a abrir hasta TTL_HUELLA_DIAS.
 2. Para cada enlace:
-   - Abre el navegador en modo incógnito con un agente de usuario aleatorio.
+   - Toma un navegador libre del pool (modo incógnito, agente de usuario aleatorio).
    - Accede a la página del anuncio y espera su carga.
-   - Verifica si la página está bloqueada y, de ser así, detiene la ejecución.
+   - Verifica si la página está bloqueada. Los bloqueos, timeouts, fichas sin datos, caídas del
+     navegador y errores de red se clasifican y el anuncio pasa a una cola de reintentos persistente
+     con espera creciente por clase (fallos.py); el resto de anuncios sigue adelante. Los que agotan
+     sus intentos se anotan en 'datos/fallidos.jsonl'.
    - Extrae datos clave del anuncio (promotora, precio, superficie, número de habitaciones, etc.).
-   - Almacena los datos extraídos en un archivo CSV.
-   - Cierra el navegador y pasa al siguiente anuncio.
+   - Almacena los datos extraídos en un buffer que se vuelca al CSV cada N registros o T segundos
+     (escritor_anuncios.py), con un punto de control para reanudar si la ejecución se interrumpe.
+   - Al volcarlos, registra en el historial de precios (historial_precios.py) los anuncios cuyo
+     precio u otro campo seguido ha cambiado (HISTORIAL_PRECIOS).
+   - Devuelve el navegador al pool y pasa al siguiente anuncio.
 
 Mecanismos anti-bloqueo:
-✔ Uso de un tiempo de espera aleatorio entre solicitudes.
+✔ Ritmo de peticiones por host controlado por un planificador central (planificador.py), con
+  Crawl-delay del robots.txt y reducción automática del ritmo al detectar un bloqueo.
+✔ Cortacircuitos por host (fallos.py): tras varios bloqueos seguidos el host se pausa y se reanuda solo.
 ✔ Rotación de agentes de usuario.
-✔ Scroll automático para cargar contenido dinámico.
+✔ Scroll automático, solo el necesario, para cargar contenido dinámico.
 
 Salida:
 Los datos extraídos se guardan en 'datos/anuncios.csv', agregando nuevos registros sin sobrescribir los existentes.
@@ -42,183 +60,145 @@ Este script es útil para recopilar información detallada de los anuncios de Fo
 """
 
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from time import sleep
+from pool_drivers import PoolDrivers, PaginaBloqueada
+from fallos import mapear_con_reintentos, hay_reintentos
+from campos_anuncio import CAMPOS_ANUNCIO, extraer_campos, construir_registro, referencia_anuncio, url_anuncio_canonica
+from validar_urls import obtener_politica
+from parser_offline import guardar_html
+from archivo_paginas import ArchivoPaginas
+from functools import partial
+from indice_vistos import IndiceVistos, hash_registro
+from historial_precios import HistorialPrecios
+from escritor_anuncios import EscritorAnuncios
+from fetch_http import obtener_anuncios
+from navegacion import abrir_pagina, scroll_hasta
+from metricas import obtener_metricas
+import csv
+import configuracion
 import datetime
-import random
-import pandas as pd
+import itertools
 import logging
 
 # Configurar logging
 logging.basicConfig(filename='scraping_errors.log', level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Función para evitar bloqueos
-def esperar_aleatoriamente(min_seg=5, max_seg=15):
-    tiempo = random.uniform(min_seg, max_seg) # Tiempo aleatorio entre min_seg y max_seg segundos, utilizamos uniform que permite intervalos con decimales
-    sleep(tiempo)
-
-# Función para configurar el driver
-def configurar_driver():
-    """Inicializa y configura el driver de Selenium."""
-    options = Options()
-    options.add_argument('--incognito')
-    #options.add_argument('--headless')  # Opcional: Ejecutar sin interfaz gráfica
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    ]
-    options.add_argument(f'user-agent={random.choice(user_agents)}')
-    service = Service('chromedriver/chromedriver.exe')
-    return webdriver.Chrome(service=service, options=options)
-
 # Función para extraer los datos de cada anuncio
 def obtener_datos_anuncio(driver, link, cd_postal):
     """Extraer la información de un anuncio."""
     try:
+        campos = extraer_campos(driver)  # Todos los campos de CAMPOS_ANUNCIO en una sola llamada
         fecha = datetime.datetime.today().strftime('%d-%m-%Y')
-        referencia = (link[1].split("/")[-1]).split("?")[-2] # Extraer la referencia del anuncio
-        promotora = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[2]/section[1]/div/div/div/div/div[2]/div[1]/h4')
-        zonas_comunes = 'No disponible'
-        certificado_energetico = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[4]/div[1]/div/div/span[3]')
-        codigo_postal = cd_postal
-        direccion = 'No disponible'
-        dormitorios = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[2]/div/div/span[2]')
-        area = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[4]/div/div/span[2]')
-        planta = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[5]/div/div/span[2]')
-        caracteristicas = 'No disponible'
-        fecha_actualizacion = 'No disponible'
-        img = obtener_atributo(driver, '//*[@id="App"]/div[1]/main/div[2]/section/figure[1]/img', 'src')
-        tipo = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[1]/div/div/span[2]')
-        precio = obtener_texto(driver, '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[1]/div/div[2]/div[1]/span')
-
-        return {
-            'fecha': fecha,
-            'referencia': referencia,
-            'promotora': promotora,
-            'zonas_comunes': zonas_comunes,
-            'certificado_energetico': certificado_energetico,
-            'codigo_postal': codigo_postal,
-            'direccion': direccion,
-            'dormitorios': dormitorios,
-            'area': area,
-            'planta': planta,
-            'caracteristicas': caracteristicas,
-            'fecha_actualizacion': fecha_actualizacion,
-            'url': link[1],
-            'img': img,
-            'tipo': tipo,
-            'precio': precio
-        }
+        return construir_registro(campos, link[1], cd_postal, fecha)
     except Exception as e:
         logging.error(f"Error en {link[1]}: {str(e)}")
         return None
-    
-# Función para obtener texto de un elemento con verificación
-def obtener_texto(driver, xpath):
-    """Obtiene el texto de un elemento, devuelve 'No disponible' si no se encuentra."""
-    try:
-        return driver.find_element(By.XPATH, xpath).text
-    except NoSuchElementException:
-        return 'No disponible'
-
-# Función para obtener atributo de un elemento con verificación
-def obtener_atributo(driver, xpath, atributo):
-    """Obtiene un atributo de un elemento, devuelve 'No disponible' si no se encuentra."""
-    try:
-        return driver.find_element(By.XPATH, xpath).get_attribute(atributo)
-    except NoSuchElementException:
-        return 'No disponible'
-
-# Función para guardar los datos en un archivo CSV
-def guardar_datos_csv(data):
-    """Guardar la lista de anuncios en un archivo CSV."""
-    df_anuncios = pd.DataFrame(data, columns=[
-        'Fecha', 'Referencia', 'Promotora', 'Zonas comunes', 'Certificado energético', 'Código postal',
-        'Dirección', 'Dormitorios', 'Área', 'Planta', 'Características', 'Fecha de actualización', 'URL', 'Imagen', 'Tipo', 'Precio'
-    ])
-    
-    # Escribir los datos al final
-    with open('datos/anuncios.csv', mode='a', newline='', encoding='utf-8') as f:
-        df_anuncios.to_csv(f, index=False, header=f.tell() == 0)  # Solo escribe encabezado si el archivo está vacío
 
 # Leer el archivo CSV con los enlaces
-def leer_enlaces():
-    pd.set_option('display.max_colwidth', None) # Mostrar todo el contenido de las celdas
-    df = pd.read_csv('datos/links_anuncios.csv', header=None)[[1, 2]]  # Leer el archivo CSV
-    df_lista = df.values.tolist()  # Convertir a lista seleccionando las columnas 1 y 2
-    links = list(set(map(tuple, df_lista)))  # Eliminar duplicados
-    print(f"Se encontraron {len(links)} anuncios")
-    return links
+def leer_enlaces(indice=None, ttl_dias=configuracion.TTL_VISTOS_DIAS):
+    """Genera (código postal, link) leyendo el CSV fila a fila; con un índice, solo los pendientes."""
+    politica = obtener_politica()
+
+    def filas():
+        with open('datos/links_anuncios.csv', newline='', encoding='utf-8') as f:
+            for fila in csv.reader(f):
+                if len(fila) < 3:
+                    continue
+                url = url_anuncio_canonica(fila[2])  # Sin la query de seguimiento ('?from=list')
+                if politica.permitida(url):  # Descartar lo que robots.txt no permite
+                    yield fila[1], url
+
+    enlaces = filas()
+    if indice:  # Descartar los anuncios extraídos hace menos de ttl_dias
+        return indice.filtrar_pendientes(enlaces, clave=lambda link: referencia_anuncio(link[1]), ttl_dias=ttl_dias)
+    return enlaces
+
+# Función para procesar un anuncio con una sesión del pool
+def procesar_anuncio(driver, link, archivo=None):
+    """Abre el anuncio, lo prepara para la extracción y devuelve sus datos."""
+    print(link[1])  # Imprimir el link
+    cd_postal = link[0]  # Extraer el código postal
+
+    # Esperar el turno, ingresar a la página, comprobar el bloqueo y aceptar las cookies
+    abrir_pagina(driver, link[1])
+    metricas = obtener_metricas()
+
+    # Hacer scroll hasta que estén todos los campos de la ficha (o la página deje de cambiar)
+    with metricas.tramo('scroll'):
+        scroll_hasta(driver, CAMPOS_ANUNCIO.values())
+
+    # Archivar la ficha del anuncio
+    if archivo:
+        archivo.guardar('anuncio', link[1], driver.page_source, referencia=referencia_anuncio(link[1]), codigo_postal=cd_postal)
+
+    # Guardar el HTML para poder repetir la extracción sin navegador (parser_offline.py)
+    if configuracion.GUARDAR_HTML:
+        guardar_html(driver.page_source, link[1], cd_postal, datetime.datetime.today().strftime('%d-%m-%Y'))
+
+    # Extraer los datos del anuncio
+    with metricas.tramo('extraccion'):
+        return obtener_datos_anuncio(driver, link, cd_postal)
 
 def main():
-    # Leer los enlaces
-    links = leer_enlaces()
-
-    # Inicializar el driver
-    driver = configurar_driver()
-
-    # Lista para almacenar los anuncios
-    anuncios_data = []
-
-    # Iterar sobre los enlaces
-    for link in links:
-        print(link[1])  # Imprimir el link
-        cd_postal = link[0]  # Extraer el código postal
-
-        # Ingresar a la página
-        driver.get(str(link[1]))  # Ingresar a la página
-        esperar_aleatoriamente()  # Esperar antes de interactuar
-        driver.maximize_window()  # Maximizar la ventana
-
-        # Verificar si la página está bloqueada
-        if driver.find_elements(By.XPATH, '//html/body/div/h1'):
-            print("Página bloqueada")
-            # continue
-            driver.quit() # Cerrar el driver
-            break
-
-        # Esperar a que cargue la página
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
-
-        # Cerrar popup si está presente
-        try:
-            close_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-agree-button"]'))
-            )
-            close_button.click()
-        except TimeoutException:
-            print("No se pudo cerrar el popup:")
-            pass
-
-        # Hacer scroll hasta el final de la página
-        height = driver.execute_script("return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-        for e in range(0, height, 500):
-            driver.execute_script(f'window.scrollTo(0, {e});')
-            esperar_aleatoriamente(1, 3)
-
-        # Extraer los datos del anuncio
-        datos = obtener_datos_anuncio(driver, link, cd_postal)
-        if datos:
-            anuncios_data.append(datos)
-
-        # Esperar antes de la siguiente iteración
-        esperar_aleatoriamente()
-
-    # Guardar los datos en el CSV
-    guardar_datos_csv(anuncios_data)
-
-    # Cerrar
-    driver.quit()
+    indice = IndiceVistos()
+    historial = HistorialPrecios() if configuracion.HISTORIAL_PRECIOS else None
+
+    # Marcar en el índice (y en el historial de precios) los anuncios a medida que quedan guardados en el CSV
+    def marcar_guardados(registros):
+        for datos in registros:
+            indice.marcar(datos['referencia'], hash_registro(datos))
+        if historial:
+            historial.registrar(registros)
+
+    escritor = EscritorAnuncios(al_volcar=marcar_guardados)
+
+    # Leer los enlaces pendientes por trozos, saltando los ya guardados por una ejecución interrumpida
+    procesados = escritor.procesados()
+    if procesados:
+        print(f"Reanudando: {len(procesados)} anuncios ya guardados en la ejecución anterior")
+    enlaces = (link for link in leer_enlaces(indice) if referencia_anuncio(link[1]) not in procesados)
+    archivo = ArchivoPaginas() if configuracion.ARCHIVAR_PAGINAS else None
+    cuenta = {'pendientes': 0, 'http': 0}
+
+    def para_selenium():
+        """Genera los enlaces que quedan para el navegador, extrayendo antes cada trozo por HTTP si procede."""
+        while trozo := list(itertools.islice(enlaces, configuracion.TROZO_ENLACES)):
+            cuenta['pendientes'] += len(trozo)
+            if configuracion.MODO_FETCH != 'http':
+                yield from trozo
+                continue
+            # Modo HTTP: extraer sin navegador y dejar para Selenium solo los que no se puedan
+            for link, datos in obtener_anuncios(trozo, archivo):
+                if datos:
+                    escritor.escribir(datos)
+                    cuenta['http'] += 1
+                else:
+                    yield link
+
+    completo = False
+    try:
+        # Repartir los enlaces entre las sesiones del pool; los que fallan pasan a la cola de reintentos.
+        # El pool solo se arranca si algún enlace llega a Selenium o quedan reintentos pendientes
+        links = para_selenium()
+        primero = next(links, None)
+        if primero is not None or hay_reintentos('anuncios'):
+            links = itertools.chain([primero], links) if primero is not None else links
+            with PoolDrivers() as pool:
+                for _, datos in mapear_con_reintentos(pool, partial(procesar_anuncio, archivo=archivo), links, 'anuncios',
+                                                      clave=lambda link: referencia_anuncio(link[1]), requerido=True):
+                    escritor.escribir(datos)
+        completo = True
+    except PaginaBloqueada as e:  # CircuitoAbierto: el host sigue bloqueado tras varias pausas
+        print("Página bloqueada, los anuncios pendientes quedan para la siguiente ejecución:", e)
+    finally:
+        # Guardar lo pendiente; el punto de control solo se borra si se han procesado todos los enlaces
+        escritor.terminar(completo)
+        indice.cerrar()
+        if historial:
+            historial.cerrar()
+        print(f"Se leyeron {cuenta['pendientes']} anuncios nuevos, caducados o con cambios en la tarjeta")
+        if configuracion.MODO_FETCH == 'http':
+            print(f"{cuenta['http']} anuncios extraídos por HTTP, {cuenta['pendientes'] - cuenta['http']} pasaron a Selenium")
+        obtener_metricas().imprimir_resumen()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
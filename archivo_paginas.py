@@ -0,0 +1,198 @@
+"""
+Archivo local de las páginas descargadas (búsquedas y fichas de anuncios).
+
+FUNCIONAMIENTO:
+1. Cada página se comprime con zlib y se añade al final de un archivo de segmento
+   ('datos/archivo/segmento_000001.bin', ...). Los segmentos nunca se reescriben; cuando uno supera
+   TAMANO_SEGMENTO se abre el siguiente.
+2. Un índice SQLite ('datos/archivo/indice.sqlite') guarda:
+   - contenidos: hash SHA-256 del HTML -> segmento, desplazamiento y longitud del bloque comprimido.
+   - capturas: tipo de página, URL, referencia, código postal, fecha de captura y hash del contenido.
+3. Si una página se vuelve a capturar con el mismo contenido solo se añade la fila de captura:
+   el HTML no se vuelve a escribir.
+   Varios procesos pueden archivar en el mismo directorio (trabajadores de coordinador.py en una
+   máquina): la comprobación del contenido, la escritura del bloque y su fila en el índice se hacen
+   con un bloqueo del sistema sobre 'escritura.lock', así que los desplazamientos no se pisan.
+4. iterar() recorre las capturas de un rango de fechas leyendo los bloques de uno en uno, sin cargar
+   el archivo entero en memoria.
+
+USO:
+    archivo = ArchivoPaginas()
+    archivo.guardar('anuncio', url, driver.page_source, referencia='183930550', codigo_postal='28001')
+    for captura, contenido in archivo.iterar(desde=datetime.date(2024, 11, 1), tipo='anuncio'):
+        ...
+
+Permite responder preguntas históricas y repetir extracciones sin volver a descargar las páginas.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+import configuracion
+
+TAMANO_SEGMENTO = 256 * 1024 * 1024  # Tamaño máximo de cada segmento (256 MB)
+
+
+# Función para bloquear un archivo frente a otros procesos
+@contextlib.contextmanager
+def bloqueo_exclusivo(ruta):
+    """Mantiene el archivo bloqueado durante el bloque 'with'; si lo tiene otro proceso, espera a que lo suelte."""
+    with open(ruta, 'a+') as archivo:
+        if os.name == 'nt':
+            import msvcrt
+            archivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)  # Reintenta 10 s antes de fallar
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+
+
+class ArchivoPaginas:
+    """Almacén de páginas comprimidas, deduplicadas por contenido e indexadas por URL, referencia y fecha."""
+
+    def __init__(self, directorio=configuracion.DIR_ARCHIVO, tamano_segmento=TAMANO_SEGMENTO):
+        self.directorio = directorio
+        self.tamano_segmento = tamano_segmento
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()  # Los hilos del pool de drivers comparten el archivo
+        self._ruta_bloqueo = os.path.join(directorio, 'escritura.lock')  # Y otros procesos, el directorio
+        self._conexion = sqlite3.connect(os.path.join(directorio, 'indice.sqlite'), check_same_thread=False)
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS contenidos (
+                hash TEXT PRIMARY KEY,
+                segmento INTEGER NOT NULL,
+                desplazamiento INTEGER NOT NULL,
+                longitud INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS capturas (
+                id INTEGER PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                url TEXT NOT NULL,
+                referencia TEXT,
+                codigo_postal TEXT,
+                fecha TEXT NOT NULL,
+                hash TEXT NOT NULL REFERENCES contenidos(hash)
+            );
+            CREATE INDEX IF NOT EXISTS capturas_url ON capturas(url, fecha);
+            CREATE INDEX IF NOT EXISTS capturas_referencia ON capturas(referencia, fecha);
+            CREATE INDEX IF NOT EXISTS capturas_fecha ON capturas(fecha, tipo);
+        """)
+
+    def _ruta_segmento(self, segmento):
+        return os.path.join(self.directorio, f"segmento_{segmento:06d}.bin")
+
+    def _escribir_bloque(self, bloque):
+        """
+        Añade el bloque al segmento actual y devuelve (segmento, desplazamiento). Se llama con el bloqueo
+        de escritura: el segmento actual se lee del índice, que puede haber avanzado en otro proceso.
+        """
+        segmento = self._conexion.execute("SELECT MAX(segmento) FROM contenidos").fetchone()[0] or 1
+        ruta = self._ruta_segmento(segmento)
+        if os.path.exists(ruta) and os.path.getsize(ruta) + len(bloque) > self.tamano_segmento:
+            segmento += 1
+            ruta = self._ruta_segmento(segmento)
+        with open(ruta, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            desplazamiento = f.tell()
+            f.write(bloque)
+        return segmento, desplazamiento
+
+    def guardar(self, tipo, url, contenido, referencia=None, codigo_postal=None, fecha=None):
+        """Archiva una captura de la página y devuelve el hash de su contenido."""
+        fecha = (fecha or datetime.date.today()).isoformat()
+        datos = contenido.encode('utf-8')
+        hash_contenido = hashlib.sha256(datos).hexdigest()
+        with self._lock, bloqueo_exclusivo(self._ruta_bloqueo):
+            existe = self._conexion.execute("SELECT 1 FROM contenidos WHERE hash = ?", (hash_contenido,)).fetchone()
+            if not existe:  # Contenido nuevo: se comprime y se añade al segmento
+                bloque = zlib.compress(datos, 6)
+                segmento, desplazamiento = self._escribir_bloque(bloque)
+                self._conexion.execute(
+                    "INSERT OR IGNORE INTO contenidos VALUES (?, ?, ?, ?)", (hash_contenido, segmento, desplazamiento, len(bloque)))
+            self._conexion.execute(
+                "INSERT INTO capturas (tipo, url, referencia, codigo_postal, fecha, hash) VALUES (?, ?, ?, ?, ?, ?)",
+                (tipo, url, referencia, codigo_postal, fecha, hash_contenido))
+            self._conexion.commit()
+        return hash_contenido
+
+    def leer_contenido(self, hash_contenido):
+        """Devuelve el HTML archivado con ese hash."""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT segmento, desplazamiento, longitud FROM contenidos WHERE hash = ?", (hash_contenido,)).fetchone()
+        if fila is None:
+            raise KeyError(hash_contenido)
+        segmento, desplazamiento, longitud = fila
+        with open(self._ruta_segmento(segmento), 'rb') as f:
+            f.seek(desplazamiento)
+            return zlib.decompress(f.read(longitud)).decode('utf-8')
+
+    def ultima_captura(self, url=None, referencia=None):
+        """Devuelve (captura, html) de la captura más reciente de una URL o referencia, o None."""
+        columna, valor = ('url', url) if url is not None else ('referencia', referencia)
+        with self._lock:
+            self._conexion.row_factory = sqlite3.Row
+            fila = self._conexion.execute(
+                f"SELECT * FROM capturas WHERE {columna} = ? ORDER BY fecha DESC, id DESC LIMIT 1", (valor,)).fetchone()
+            self._conexion.row_factory = None
+        if fila is None:
+            return None
+        return dict(fila), self.leer_contenido(fila['hash'])
+
+    def iterar(self, desde=None, hasta=None, tipo=None):
+        """Genera (captura, html) de las capturas entre las fechas indicadas (ambas incluidas)."""
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("c.fecha >= ?")
+            parametros.append(desde.isoformat())
+        if hasta:
+            condiciones.append("c.fecha <= ?")
+            parametros.append(hasta.isoformat())
+        if tipo:
+            condiciones.append("c.tipo = ?")
+            parametros.append(tipo)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        consulta = f"""
+            SELECT c.id, c.tipo, c.url, c.referencia, c.codigo_postal, c.fecha, c.hash,
+                   b.segmento, b.desplazamiento, b.longitud
+            FROM capturas c JOIN contenidos b ON b.hash = c.hash
+            {where}
+            ORDER BY c.fecha, b.segmento, b.desplazamiento
+        """
+        # Conexión propia para no bloquear a los hilos que siguen guardando mientras se itera
+        conexion = sqlite3.connect(os.path.join(self.directorio, 'indice.sqlite'))
+        archivos = {}
+        try:
+            for fila in conexion.execute(consulta, parametros):
+                captura = dict(zip(('id', 'tipo', 'url', 'referencia', 'codigo_postal', 'fecha', 'hash'), fila[:7]))
+                segmento, desplazamiento, longitud = fila[7:]
+                if segmento not in archivos:
+                    archivos[segmento] = open(self._ruta_segmento(segmento), 'rb')
+                f = archivos[segmento]
+                f.seek(desplazamiento)
+                yield captura, zlib.decompress(f.read(longitud)).decode('utf-8')
+        finally:
+            for f in archivos.values():
+                f.close()
+            conexion.close()
+
+    def cerrar(self):
+        """Cierra el índice."""
+        self._conexion.close()
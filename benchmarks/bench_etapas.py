@@ -0,0 +1,195 @@
+"""
+Benchmark de extremo a extremo de cada etapa del scraper contra el sitio local de pruebas (sitio_fixtures.py).
+
+FUNCIONAMIENTO:
+1. Levanta el sitio de pruebas con ZONAS códigos postales (ANUNCIOS_POR_ZONA anuncios cada uno).
+2. Ejecuta cada etapa con cada modo de descarga, cada combinación en un proceso nuevo para medir su
+   pico de memoria por separado:
+   - busquedas/http y anuncios/http: fetch_http.py (obtener_busquedas, obtener_anuncios).
+   - busquedas/selenium y anuncios/selenium: obtener_links y procesar_anuncio con el pool de
+     navegadores. Se omiten si no se puede arrancar Chrome con RUTA_CHROMEDRIVER (INMO_CHROMEDRIVER).
+   - anuncios/offline: parser_offline.py sobre las fichas guardadas en un directorio temporal.
+   Las esperas configurables se desactivan: planificador sin límite de ritmo, sin archivo de páginas,
+   sin HTML guardado y sin eventos de métricas.
+3. Muestra páginas/s, anuncios/s y el pico de memoria (RSS) de cada etapa y los compara con
+   'benchmarks/baseline.json'. Un empeoramiento mayor que la tolerancia se marca como REGRESIÓN y el
+   script termina con código 1.
+
+La línea base depende de la máquina, así que no se versiona (está en .gitignore): cada equipo guarda
+la suya con --guardar-baseline antes de comparar. Sin línea base las etapas se muestran como
+'sin línea base' y el script no falla.
+
+USO:
+    python benchmarks/bench_etapas.py [--zonas 4] [--etapas anuncios/http,anuncios/offline] [--tolerancia 0.2]
+    python benchmarks/bench_etapas.py --guardar-baseline
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Sin esperas ni escrituras auxiliares en los procesos de medida (se leen al importar configuracion)
+os.environ.update({'INMO_METRICAS': '', 'INMO_ARCHIVAR_PAGINAS': '0', 'INMO_GUARDAR_HTML': '0',
+                   'INMO_PERFILES_PERSISTENTES': '0'})
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sitio_fixtures import SitioFixtures
+
+try:
+    import resource
+except ImportError:  # Windows: sin medida de memoria
+    resource = None
+
+RUTA_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+ETAPAS = ['busquedas/http', 'anuncios/http', 'anuncios/offline', 'busquedas/selenium', 'anuncios/selenium']
+
+
+# Función para desactivar el límite de ritmo del planificador compartido
+def sin_esperas():
+    import planificador
+    planificador._planificador = planificador.Planificador(1e9, 1e9)
+    planificador._planificador.ritmo = 1e9  # Sin Crawl-delay del robots.txt
+    return planificador._planificador
+
+# Función para leer el pico de memoria del proceso (y de sus procesos hijos)
+def pico_rss_mb():
+    if resource is None:
+        return None
+    maximo = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024)  # macOS en bytes, Linux en KiB
+
+# Funciones de cada etapa: devuelven (páginas procesadas, anuncios obtenidos)
+def busquedas_http(websites, links):
+    from fetch_http import obtener_busquedas
+    from links_anuncios import paginas_busqueda
+    primeras = obtener_busquedas(websites)
+    siguientes = [pagina for website, resultado in primeras if resultado
+                  for pagina in paginas_busqueda(website, resultado[0])[1:]]
+    resultados = primeras + obtener_busquedas(siguientes)
+    return len(resultados), sum(len(resultado[1]) for _, resultado in resultados if resultado)
+
+def anuncios_http(websites, links):
+    from fetch_http import obtener_anuncios
+    return len(links), sum(1 for _, datos in obtener_anuncios(links) if datos)
+
+def anuncios_offline(websites, links):
+    from parser_offline import guardar_html, parsear_directorio
+    from sitio_fixtures import pagina_anuncio
+    from campos_anuncio import referencia_anuncio
+    directorio = tempfile.mkdtemp(prefix='bench_offline_')
+    for cd_postal, url in links:  # Preparación fuera de la medida
+        guardar_html(pagina_anuncio(referencia_anuncio(url)), url, cd_postal, '01-01-2025', directorio)
+    try:
+        inicio = time.perf_counter()
+        registros = parsear_directorio(directorio)
+        return len(links), len(registros), time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+def busquedas_selenium(websites, links):
+    from pool_drivers import PoolDrivers
+    from links_anuncios import obtener_links, paginas_busqueda
+    with PoolDrivers() as pool:
+        primeras = list(zip(websites, pool.mapear(obtener_links, websites)))
+        siguientes = [pagina for website, (contador, _) in primeras for pagina in paginas_busqueda(website, contador)[1:]]
+        resultados = [resultado for _, resultado in primeras] + list(pool.mapear(obtener_links, siguientes))
+    return len(resultados), sum(len(links) for _, links in resultados)
+
+def anuncios_selenium(websites, links):
+    from pool_drivers import PoolDrivers
+    from anuncios_v2 import procesar_anuncio
+    with PoolDrivers() as pool:
+        return len(links), sum(1 for datos in pool.mapear(procesar_anuncio, links) if datos)
+
+FUNCIONES_ETAPA = {'busquedas/http': busquedas_http, 'anuncios/http': anuncios_http, 'anuncios/offline': anuncios_offline,
+                   'busquedas/selenium': busquedas_selenium, 'anuncios/selenium': anuncios_selenium}
+
+# Función que mide una etapa en el proceso hijo
+def medir_etapa(etapa, websites, links, salida):
+    """Ejecuta la etapa y envía {'segundos', 'paginas', 'anuncios', 'rss_mb'} (o {'omitida': motivo})."""
+    sin_esperas()
+    if etapa.endswith('/selenium'):
+        try:
+            from pool_drivers import configurar_driver
+            configurar_driver(headless=True).quit()
+        except Exception as e:  # Sin Chrome o sin ChromeDriver en esta máquina
+            salida.put({'omitida': f"no se puede arrancar Chrome ({type(e).__name__})"})
+            return
+    inicio = time.perf_counter()
+    resultado = FUNCIONES_ETAPA[etapa](websites, links)
+    segundos = resultado[2] if len(resultado) > 2 else time.perf_counter() - inicio  # Offline mide solo el parseo
+    salida.put({'segundos': segundos, 'paginas': resultado[0], 'anuncios': resultado[1], 'rss_mb': pico_rss_mb()})
+
+# Función para ejecutar una etapa en un proceso nuevo
+def ejecutar_etapa(etapa, websites, links):
+    contexto = multiprocessing.get_context('spawn')
+    salida = contexto.Queue()
+    proceso = contexto.Process(target=medir_etapa, args=(etapa, websites, links, salida))
+    proceso.start()
+    proceso.join()
+    if salida.empty():
+        return {'omitida': f"el proceso terminó con código {proceso.exitcode}"}
+    medida = salida.get()
+    if 'segundos' in medida:
+        medida['paginas_s'] = medida['paginas'] / medida['segundos']
+        medida['anuncios_s'] = medida['anuncios'] / medida['segundos']
+    return medida
+
+# Función para comparar una medida con la línea base
+def comparar(medida, base, tolerancia):
+    """Devuelve la lista de empeoramientos mayores que la tolerancia."""
+    regresiones = []
+    for clave in ('paginas_s', 'anuncios_s'):
+        if base.get(clave) and medida[clave] < base[clave] * (1 - tolerancia):
+            regresiones.append(f"{clave} {medida[clave]:.1f} < {base[clave]:.1f}")
+    if base.get('rss_mb') and medida.get('rss_mb') and medida['rss_mb'] > base['rss_mb'] * (1 + tolerancia):
+        regresiones.append(f"rss {medida['rss_mb']:.0f} MB > {base['rss_mb']:.0f} MB")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas contra el sitio local de pruebas")
+    parser.add_argument('--zonas', type=int, default=4, help="Códigos postales del sitio de pruebas")
+    parser.add_argument('--etapas', default=','.join(ETAPAS), help="Etapas separadas por comas")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento permitido respecto a la línea base")
+    parser.add_argument('--guardar-baseline', action='store_true', help="Guardar las medidas como nueva línea base")
+    argumentos = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(RUTA_BASELINE):
+        with open(RUTA_BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    medidas, regresiones = {}, False
+    codigos_postales = [f"{28001 + i:05d}" for i in range(argumentos.zonas)]
+    with SitioFixtures() as sitio:
+        websites, links = sitio.busquedas(codigos_postales), sitio.anuncios(codigos_postales)
+        print(f"Sitio de pruebas en {sitio.url}: {len(websites)} búsquedas, {len(links)} anuncios")
+        print(f"{'etapa':<20}{'páginas/s':>11}{'anuncios/s':>12}{'RSS MB':>9}  comparación")
+        for etapa in argumentos.etapas.split(','):
+            medida = ejecutar_etapa(etapa, websites, links)
+            if 'omitida' in medida:
+                print(f"{etapa:<20}{'omitida: ' + medida['omitida']:>32}")
+                continue
+            medidas[etapa] = {clave: round(medida[clave], 1) for clave in ('paginas_s', 'anuncios_s')}
+            medidas[etapa]['rss_mb'] = round(medida['rss_mb'], 1) if medida['rss_mb'] is not None else None
+            empeoramientos = comparar(medida, baseline.get(etapa, {}), argumentos.tolerancia)
+            regresiones = regresiones or bool(empeoramientos)
+            comparacion = 'REGRESIÓN: ' + ', '.join(empeoramientos) if empeoramientos else ('ok' if etapa in baseline else 'sin línea base')
+            rss = f"{medida['rss_mb']:.0f}" if medida['rss_mb'] is not None else 'n/d'
+            print(f"{etapa:<20}{medida['paginas_s']:>11.1f}{medida['anuncios_s']:>12.1f}{rss:>9}  {comparacion}")
+
+    if argumentos.guardar_baseline:
+        with open(RUTA_BASELINE, 'w', encoding='utf-8') as f:
+            json.dump({**baseline, **medidas}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Línea base guardada en {RUTA_BASELINE}")
+    elif regresiones:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
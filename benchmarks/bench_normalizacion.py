@@ -0,0 +1,50 @@
+"""
+Benchmark de la normalización vectorizada (normalizacion.py).
+
+Genera N filas sintéticas con los formatos que devuelve la página ("250.000 €", "85 m²", "3 habs.",
+"2ª planta", letras de certificado, 'No disponible' y algunos valores inválidos) y mide cuánto tarda
+normalizar_anuncios() en procesarlas.
+
+USO:
+    python benchmarks/bench_normalizacion.py [filas]
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from normalizacion import normalizar_anuncios
+
+
+# Función para generar anuncios sintéticos
+def generar_anuncios(filas, semilla=0):
+    """DataFrame con valores de texto como los que se extraen de las fichas."""
+    rng = np.random.default_rng(semilla)
+    precios = pd.Series(rng.integers(50, 3000, filas) * 1000).map('{:,.0f} €'.format).str.replace(',', '.')
+    areas = pd.Series(rng.integers(25, 400, filas)).astype(str) + ' m²'
+    dormitorios = pd.Series(rng.integers(1, 7, filas)).astype(str) + ' habs.'
+    plantas = pd.Series(rng.choice(['Bajo', '1ª planta', '2ª planta', '3ª planta', '7ª planta', 'Sótano', 'Entresuelo'], filas))
+    certificados = pd.Series(rng.choice(list('ABCDEFG') + ['En trámite', 'No disponible'], filas))
+    df = pd.DataFrame({'precio': precios, 'area': areas, 'dormitorios': dormitorios, 'planta': plantas,
+                       'certificado_energetico': certificados})
+    # Un 2 % de valores ausentes o sin formato reconocible
+    for columna in df.columns:
+        df.loc[rng.random(filas) < 0.01, columna] = 'No disponible'
+        df.loc[rng.random(filas) < 0.01, columna] = 'A consultar'
+    return df
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = generar_anuncios(filas)
+    inicio = time.perf_counter()
+    resultado = normalizar_anuncios(df)
+    segundos = time.perf_counter() - inicio
+    invalidos = {c: int(resultado[c].sum()) for c in resultado.columns if c.endswith('_invalido')}
+    print(f"{filas} filas normalizadas en {segundos:.2f} s ({filas / segundos:,.0f} filas/s)")
+    print(f"Valores inválidos marcados: {invalidos}")
+
+if __name__ == "__main__":
+    main()
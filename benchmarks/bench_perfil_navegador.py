@@ -0,0 +1,106 @@
+"""
+Benchmark de los perfiles de navegador de pool_drivers.py ('completo' frente a 'ligero').
+
+Levanta un servidor HTTP local con una ficha de prueba que, como las de la web, carga imágenes,
+fuentes, un vídeo y un script de seguimiento, cada recurso con un pequeño retardo. Abre la ficha
+varias veces con cada perfil y muestra el tiempo medio hasta que driver.get() devuelve el control y
+los bytes servidos por página, es decir, el ancho de banda que se ahorra el perfil ligero.
+
+Necesita Chrome y el ChromeDriver de RUTA_CHROMEDRIVER.
+
+USO:
+    python benchmarks/bench_perfil_navegador.py [repeticiones]
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pool_drivers import configurar_driver
+
+RETARDO_RECURSO = 0.2  # Segundos que tarda el servidor en servir cada recurso
+RECURSOS = {
+    **{f'/img/{i}.jpg': ('image/jpeg', 150_000) for i in range(12)},
+    '/fuente.woff2': ('font/woff2', 80_000),
+    '/video.mp4': ('video/mp4', 1_000_000),
+    '/analytics.js': ('application/javascript', 40_000),
+}
+FICHA = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Ficha de prueba</title>
+<style>@font-face {{font-family: F; src: url(/fuente.woff2);}} body {{font-family: F;}}</style>
+<script src="/analytics.js"></script></head>
+<body><div id="App"><h1>Piso en venta</h1><span class="re-DetailHeader-price">250.000 €</span>
+{imagenes}<video src="/video.mp4" autoplay muted></video></div></body></html>"""
+
+
+class Servidor(BaseHTTPRequestHandler):
+    """Sirve la ficha y sus recursos y cuenta los bytes enviados."""
+    bytes_servidos = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path == '/':
+            tipo = 'text/html; charset=utf-8'
+            imagenes = ''.join(f'<img src="{ruta}">' for ruta in RECURSOS if ruta.startswith('/img/'))
+            cuerpo = FICHA.format(imagenes=imagenes).encode('utf-8')
+        elif self.path in RECURSOS:
+            time.sleep(RETARDO_RECURSO)
+            tipo, tamano = RECURSOS[self.path]
+            cuerpo = b'\0' * tamano
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):  # El navegador ha cancelado la descarga
+            return
+        with Servidor.lock:
+            Servidor.bytes_servidos += len(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+# Función para medir un perfil
+def medir_perfil(perfil, url, repeticiones):
+    """Devuelve (segundos medios por página, bytes medios servidos por página)."""
+    driver = configurar_driver(headless=True, perfil=perfil)
+    try:
+        driver.get(url)  # Primera carga fuera de la medida (arranque del navegador)
+        time.sleep(2 * RETARDO_RECURSO)  # Dejar terminar las descargas en curso antes de contar
+        Servidor.bytes_servidos = 0
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            driver.get(url)
+        segundos = time.perf_counter() - inicio
+        time.sleep(2 * RETARDO_RECURSO)
+        return segundos / repeticiones, Servidor.bytes_servidos / repeticiones
+    finally:
+        driver.quit()
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Servidor)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{servidor.server_address[1]}/'
+    try:
+        resultados = {perfil: medir_perfil(perfil, url, repeticiones) for perfil in ('completo', 'ligero')}
+    finally:
+        servidor.shutdown()
+    for perfil, (segundos, bytes_pagina) in resultados.items():
+        print(f"{perfil:>8}: {segundos * 1000:7.0f} ms/página, {bytes_pagina / 1024:8.0f} KiB/página")
+    (t_completo, b_completo), (t_ligero, b_ligero) = resultados['completo'], resultados['ligero']
+    print(f"Tiempo de carga: {100 * (1 - t_ligero / t_completo):.0f} % menos con el perfil ligero")
+    if b_completo:
+        print(f"Ancho de banda: {100 * (1 - b_ligero / b_completo):.0f} % menos con el perfil ligero")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Sitio local de pruebas con páginas de búsqueda y fichas de anuncio como las de Fotocasa.
+
+FUNCIONAMIENTO:
+1. Las plantillas de 'benchmarks/fixtures' reproducen la estructura de las páginas reales: la ficha
+   tiene cada campo en el XPath de CAMPOS_ANUNCIO (campos_anuncio.py) y la búsqueda tiene el
+   contador (XPATH_CONTADOR) y los artículos en '//section[@class="re-SearchResult"]/article', con
+   los campos de la tarjeta (CAMPOS_TARJETA) iguales a los de la ficha. Una zona sin anuncios
+   (total=0) muestra el aviso de búsqueda sin resultados (XPATH_SIN_RESULTADOS) en vez del contador.
+2. El servidor responde con las mismas rutas que la web:
+   - '.../l?...&zipCode=28001' y '.../l/2?...': páginas de resultados del código postal.
+   - '.../obra-nueva/<zona>/<promocion>/<referencia>': ficha del anuncio.
+   - '/img/<referencia>.jpg': imagen principal de la ficha.
+3. Cada código postal tiene ANUNCIOS_POR_ZONA anuncios y los valores de cada ficha se derivan de su
+   referencia, así que dos ejecuciones reciben exactamente las mismas páginas.
+
+USO:
+    with SitioFixtures() as sitio:
+        websites = sitio.busquedas(['28001', '28002'])
+        links = sitio.anuncios(['28001', '28002'])
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from string import Template
+from urllib.parse import urlsplit, parse_qs
+import os
+import sys
+import threading
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import configuracion
+
+DIR_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ANUNCIOS_POR_ZONA = 75  # Tres páginas de resultados por código postal
+TIPOS = ['Piso', 'Ático', 'Dúplex', 'Estudio', 'Chalet adosado']
+PLANTAS = ['Bajo', '1ª planta', '2ª planta', '3ª planta', '5ª planta', 'Entresuelo']
+CERTIFICADOS = list('ABCDEFG') + ['En trámite']
+
+
+# Función para cargar una plantilla de 'fixtures'
+def cargar_plantilla(nombre):
+    with open(os.path.join(DIR_FIXTURES, nombre), encoding='utf-8') as f:
+        return Template(f.read())
+
+PLANTILLA_BUSQUEDA = cargar_plantilla('busqueda.html')
+PLANTILLA_ANUNCIO = cargar_plantilla('anuncio.html')
+PLANTILLA_SIN_RESULTADOS = cargar_plantilla('busqueda_vacia.html')
+
+# Función para calcular las referencias de los anuncios de un código postal
+def referencias_zona(codigo_postal, total=ANUNCIOS_POR_ZONA):
+    return [f"{codigo_postal}{i:04d}" for i in range(1, total + 1)]
+
+# Función para construir la ruta de la ficha de un anuncio
+def ruta_anuncio(referencia):
+    return f"/es/comprar/vivienda/obra-nueva/madrid-capital/{referencia[:5]}/{referencia}"
+
+# Función para generar el HTML de una página de resultados
+def pagina_busqueda(codigo_postal, pagina, total=ANUNCIOS_POR_ZONA, por_pagina=configuracion.ANUNCIOS_POR_PAGINA):
+    if not total:
+        return PLANTILLA_SIN_RESULTADOS.substitute(codigo_postal=codigo_postal)
+    referencias = referencias_zona(codigo_postal, total)[(pagina - 1) * por_pagina:pagina * por_pagina]
+    articulos = ''.join(f'<article><a href="{ruta_anuncio(referencia)}?from=list">{referencia}</a>{tarjeta(referencia)}</article>'
+                        for referencia in referencias)
+    contador = f"{total:,}".replace(',', '.')  # La web muestra '1.234'
+    return PLANTILLA_BUSQUEDA.substitute(codigo_postal=codigo_postal, contador=contador, articulos=articulos)
+
+# Función para calcular los valores de un anuncio
+def valores_anuncio(referencia):
+    semilla = zlib.crc32(referencia.encode())  # Valores fijos por referencia
+    return {
+        'referencia': referencia, 'precio': f"{150_000 + semilla % 850 * 1000:,} €".replace(',', '.'),
+        'area': f"{40 + semilla % 160} m²", 'dormitorios': f"{1 + semilla % 5} habs.", 'planta': PLANTAS[semilla % len(PLANTAS)],
+        'tipo': TIPOS[semilla % len(TIPOS)], 'img': f"/img/{referencia}.jpg", 'promotora': f"Promotora {semilla % 40}",
+        'certificado': CERTIFICADOS[semilla % len(CERTIFICADOS)],
+    }
+
+# Función para generar la tarjeta de un anuncio en la página de resultados
+def tarjeta(referencia):
+    valores = valores_anuncio(referencia)
+    return (f'<div class="re-CardPackPremium-info"><span class="re-CardPrice">{valores["precio"]}</span><ul>'
+            f'<li class="re-CardFeaturesWithIcons-feature-icon re-CardFeaturesWithIcons-feature-icon--rooms">{valores["dormitorios"]}</li>'
+            f'<li class="re-CardFeaturesWithIcons-feature-icon re-CardFeaturesWithIcons-feature-icon--surface">{valores["area"]}</li>'
+            f'</ul></div>')
+
+# Función para generar el HTML de la ficha de un anuncio
+def pagina_anuncio(referencia):
+    return PLANTILLA_ANUNCIO.substitute(valores_anuncio(referencia))
+
+
+class ManejadorFixtures(BaseHTTPRequestHandler):
+    """Sirve las páginas de búsqueda, las fichas y las imágenes del sitio de pruebas."""
+    retardo = 0.0  # Segundos de latencia simulada por respuesta
+    total = ANUNCIOS_POR_ZONA
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        segmentos = partes.path.rstrip('/').split('/')
+        query = parse_qs(partes.query)
+        if 'zipCode' in query and ('l' in segmentos[-2:]):
+            pagina = int(segmentos[-1]) if segmentos[-1].isdigit() else 1
+            tipo, cuerpo = 'text/html; charset=utf-8', pagina_busqueda(query['zipCode'][0], pagina, self.total).encode('utf-8')
+        elif partes.path.startswith('/img/'):
+            tipo, cuerpo = 'image/jpeg', b'\xff\xd8\xff' + b'\0' * 2048
+        elif segmentos[-1].isdigit():
+            tipo, cuerpo = 'text/html; charset=utf-8', pagina_anuncio(segmentos[-1]).encode('utf-8')
+        else:
+            self.send_error(404)
+            return
+        if self.retardo:
+            time.sleep(self.retardo)
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class SitioFixtures:
+    """Servidor del sitio de pruebas en un hilo, en un puerto libre de 127.0.0.1."""
+
+    def __init__(self, retardo=0.0, total=ANUNCIOS_POR_ZONA):
+        manejador = type('Manejador', (ManejadorFixtures,), {'retardo': retardo, 'total': total})
+        self.total = total
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), manejador)
+        self._servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._servidor.server_address[1]}"
+
+    def busquedas(self, codigos_postales):
+        """URLs de inicio con el mismo formato que 'start_urls.csv'."""
+        return [f"{self.url}/es/comprar/viviendas/madrid-capital/obra-nueva/l?constructionTypeIds=1&zipCode={cp}"
+                for cp in codigos_postales]
+
+    def anuncios(self, codigos_postales):
+        """[(código postal, URL)] de todos los anuncios, como los lee anuncios_v2.py de 'links_anuncios.csv'."""
+        return [(cp, f"{self.url}{ruta_anuncio(referencia)}?from=list")
+                for cp in codigos_postales for referencia in referencias_zona(cp, self.total)]
+
+    def __enter__(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -0,0 +1,134 @@
+"""
+Definición declarativa de los campos que se extraen de cada anuncio.
+
+FUNCIONAMIENTO:
+1. CAMPOS_ANUNCIO describe cada campo una sola vez:
+   - 'xpath' o 'css': selector del elemento (si no hay selector el campo toma siempre el valor por defecto).
+   - 'atributo': atributo a leer (por ejemplo 'src'); si no se indica se lee el texto visible.
+   - 'defecto': valor que se usa cuando el elemento no existe.
+2. extraer_campos() evalúa todos los selectores dentro del navegador con un único execute_script
+   y devuelve un diccionario {campo: valor}, en lugar de hacer una llamada al WebDriver por campo.
+3. CAMPOS_TARJETA describe los campos que ya muestra la tarjeta de cada anuncio en la página de
+   resultados (precio, dormitorios, superficie), con XPaths relativos al <article>. huella_tarjeta()
+   resume esos campos en un hash para saber si el anuncio ha cambiado sin abrir su ficha.
+
+USO:
+Para añadir un campo nuevo basta con añadir una entrada a CAMPOS_ANUNCIO.
+"""
+
+from metricas import obtener_metricas
+import hashlib
+import json
+
+NO_DISPONIBLE = 'No disponible'
+
+# Campos de la ficha del anuncio
+CAMPOS_ANUNCIO = {
+    'promotora': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[2]/section[1]/div/div/div/div/div[2]/div[1]/h4'},
+    'zonas_comunes': {},
+    'certificado_energetico': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[4]/div[1]/div/div/span[3]'},
+    'direccion': {},
+    'dormitorios': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[2]/div/div/span[2]'},
+    'area': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[4]/div/div/span[2]'},
+    'planta': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[5]/div/div/span[2]'},
+    'caracteristicas': {},
+    'fecha_actualizacion': {},
+    'img': {'xpath': '//*[@id="App"]/div[1]/main/div[2]/section/figure[1]/img', 'atributo': 'src'},
+    'tipo': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[2]/div/div/div/div[1]/div[1]/div/div/span[2]'},
+    'precio': {'xpath': '//*[@id="App"]/div[1]/main/div[3]/div[1]/div[1]/div/section[1]/div/div[2]/div[1]/span'},
+}
+
+# Campos de la tarjeta del anuncio en la página de resultados (XPaths relativos al <article>)
+CAMPOS_TARJETA = {
+    'precio': {'xpath': './/*[contains(@class, "re-CardPrice")]'},
+    'dormitorios': {'xpath': './/*[contains(@class, "re-CardFeaturesWithIcons-feature-icon--rooms")]'},
+    'area': {'xpath': './/*[contains(@class, "re-CardFeaturesWithIcons-feature-icon--surface")]'},
+}
+
+# Contador de anuncios de la página de búsqueda y aviso que la web muestra cuando no hay resultados
+XPATH_CONTADOR = '//h2[@class="re-SearchPage-counterTitle"]'
+XPATH_SIN_RESULTADOS = '//*[contains(@class, "re-SearchNoResults")]'
+
+# Columnas de cada registro de anuncio, en el orden en que se guardan
+COLUMNAS_ANUNCIO = [
+    'fecha', 'referencia', 'promotora', 'zonas_comunes', 'certificado_energetico', 'codigo_postal',
+    'direccion', 'dormitorios', 'area', 'planta', 'caracteristicas', 'fecha_actualizacion', 'url', 'img', 'tipo', 'precio'
+]
+
+# Encabezados del CSV 'datos/anuncios.csv' para cada columna
+ENCABEZADOS_CSV = dict(zip(COLUMNAS_ANUNCIO, [
+    'Fecha', 'Referencia', 'Promotora', 'Zonas comunes', 'Certificado energético', 'Código postal',
+    'Dirección', 'Dormitorios', 'Área', 'Planta', 'Características', 'Fecha de actualización', 'URL', 'Imagen', 'Tipo', 'Precio'
+]))
+
+# Script que evalúa todos los campos en el navegador y devuelve un diccionario
+SCRIPT_CAMPOS = """
+var campos = arguments[0];
+var resultado = {};
+Object.keys(campos).forEach(function (nombre) {
+    var campo = campos[nombre];
+    var elemento = null;
+    if (campo.xpath) {
+        elemento = document.evaluate(campo.xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } else if (campo.css) {
+        elemento = document.querySelector(campo.css);
+    }
+    if (!elemento) {
+        resultado[nombre] = null;
+    } else if (campo.atributo) {
+        var valor = elemento[campo.atributo];
+        resultado[nombre] = (valor === undefined || valor === null) ? elemento.getAttribute(campo.atributo) : String(valor);
+    } else {
+        resultado[nombre] = elemento.innerText.trim();
+    }
+});
+return resultado;
+"""
+
+# Función para obtener la referencia de un anuncio a partir de su URL
+def referencia_anuncio(url):
+    """Devuelve la referencia del anuncio (último tramo de la URL, sin la query)."""
+    return url_anuncio_canonica(url).rstrip("/").split("/")[-1]
+
+# Función para quitar los parámetros de seguimiento de la URL de un anuncio
+def url_anuncio_canonica(url):
+    """'.../183930550?from=list' -> '.../183930550' (la ficha es la misma sin la query)."""
+    return url.split("?")[0].split("#")[0]
+
+# Función para leer el número del contador de anuncios de una búsqueda
+def leer_contador(texto):
+    """'1.234 viviendas en venta' -> 1234; 0 si el texto no empieza por un número."""
+    numero = texto.strip().split(" ")[0].replace('.', '')
+    return int(numero) if numero.isdigit() else 0
+
+# Función para calcular la huella de la tarjeta de un anuncio
+def huella_tarjeta(tarjeta, campos=CAMPOS_TARJETA):
+    """Hash de los campos de la tarjeta, o None si la tarjeta no tiene ninguno (no se puede comparar)."""
+    valores = [' '.join(tarjeta[nombre].split()) if tarjeta.get(nombre) else None for nombre in campos]  # Igual en Selenium y HTTP
+    if all(valor is None for valor in valores):
+        return None
+    return hashlib.sha1(json.dumps(valores, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+# Función para montar el registro completo de un anuncio
+def construir_registro(campos, url, cd_postal, fecha):
+    """Completa los campos extraídos con los datos del enlace y los ordena según COLUMNAS_ANUNCIO."""
+    datos = dict(campos)
+    datos['fecha'] = fecha
+    datos['referencia'] = referencia_anuncio(url)
+    datos['codigo_postal'] = cd_postal
+    datos['url'] = url
+    metricas = obtener_metricas()
+    metricas.contar('anuncios')
+    for nombre, campo in CAMPOS_ANUNCIO.items():  # Campos con selector que la ficha no tenía
+        if (campo.get('xpath') or campo.get('css')) and datos.get(nombre) in (None, NO_DISPONIBLE):
+            metricas.contar('campos_ausentes', campo=nombre)
+    return {columna: datos[columna] for columna in COLUMNAS_ANUNCIO}
+
+# Función para extraer todos los campos con una sola llamada al navegador
+def extraer_campos(driver, campos=CAMPOS_ANUNCIO):
+    """Devuelve {campo: valor} evaluando todos los selectores en un único execute_script."""
+    valores = driver.execute_script(SCRIPT_CAMPOS, campos)
+    return {
+        nombre: valores.get(nombre) if valores.get(nombre) is not None else campo.get('defecto', NO_DISPONIBLE)
+        for nombre, campo in campos.items()
+    }
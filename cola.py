@@ -0,0 +1,284 @@
+"""
+Cola de tareas persistente en SQLite para conectar las etapas del pipeline (pipeline.py).
+
+FUNCIONAMIENTO:
+1. Cada tarea pertenece a una cola ('busquedas', 'paginas', 'anuncios') y tiene una clave única
+   dentro de ella (la URL de búsqueda o la referencia del anuncio). Encolar la misma clave dos veces
+   no la duplica.
+2. tomar() pasa las tareas de 'pendiente' a 'en_curso' en una sola transacción, así que dos hilos
+   nunca reciben la misma tarea.
+3. completar() las marca como 'hecha'; fallar() las devuelve a 'pendiente' hasta MAX_INTENTOS y
+   después las deja como 'fallida'. Con la clase de fallo (fallos.py), la tarea no se vuelve a tomar
+   hasta pasada la espera de su clase, que se duplica en cada intento, y al quedar 'fallida' se anota
+   en 'datos/fallidos.jsonl'.
+4. Como todo queda en disco, si la ejecución se interrumpe, reanudar() devuelve a 'pendiente' las
+   tareas que el trabajador había dejado 'en_curso' y el pipeline sigue donde lo dejó.
+5. Cada tarea tomada queda alquilada (lease) al trabajador que la toma durante DURACION_LEASE
+   segundos. El trabajador renueva sus alquileres con latido(); si deja de hacerlo (proceso o
+   máquina caídos) el alquiler caduca y otro trabajador puede tomar la tarea. Varios procesos pueden
+   compartir la misma base de datos (coordinador.py).
+6. guardar_resultados() guarda los anuncios extraídos por referencia (una fila por referencia, la
+   última gana) y completa sus tareas en la misma transacción, así que repetir una tarea no duplica
+   resultados.
+7. registrar_tarjetas() y sin_cambios() hacen lo mismo que en indice_vistos.py para los trabajadores
+   remotos: guardar_resultados() copia la huella de la última tarjeta vista del anuncio y sin_cambios()
+   dice qué anuncios no han cambiado desde que se guardaron.
+
+USO:
+    cola = ColaPersistente()
+    cola.poner('anuncios', referencia, [codigo_postal, url])
+    for referencia, link in cola.tomar('anuncios'):
+        ...
+        cola.completar('anuncios', [referencia])
+"""
+
+from fallos import espera_reintento, intentos_maximos, registrar_fallido
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import configuracion
+
+PENDIENTE, EN_CURSO, HECHA, FALLIDA = 'pendiente', 'en_curso', 'hecha', 'fallida'
+
+
+class ColaPersistente:
+    """Colas de tareas con estado guardado en SQLite, compartidas por los hilos del pipeline."""
+
+    def __init__(self, ruta=configuracion.RUTA_COLA, max_intentos=configuracion.MAX_INTENTOS_TAREA,
+                 duracion_lease=configuracion.DURACION_LEASE, wal=True):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self.max_intentos = max_intentos
+        self.duracion_lease = duracion_lease
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, timeout=60, check_same_thread=False)
+        # WAL no funciona en discos de red: en almacenamiento compartido se usa el diario clásico
+        self._conexion.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS tareas (
+                id INTEGER PRIMARY KEY,
+                cola TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                carga TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                actualizada TEXT NOT NULL,
+                trabajador TEXT,
+                caduca REAL,
+                disponible REAL,
+                UNIQUE (cola, clave)
+            );
+            CREATE INDEX IF NOT EXISTS tareas_estado ON tareas (cola, estado, id);
+            CREATE TABLE IF NOT EXISTS resultados (
+                referencia TEXT PRIMARY KEY,
+                codigo_postal TEXT,
+                guardado TEXT NOT NULL,
+                trabajador TEXT,
+                datos TEXT NOT NULL,
+                huella TEXT,
+                exportado TEXT
+            );
+            CREATE INDEX IF NOT EXISTS resultados_cp ON resultados (codigo_postal);
+            CREATE TABLE IF NOT EXISTS tarjetas (
+                referencia TEXT PRIMARY KEY,
+                huella TEXT NOT NULL,
+                vista TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def poner_varias(self, cola, tareas):
+        """Encola [(clave, carga)] y devuelve cuántas eran nuevas."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            antes = self._conexion.total_changes
+            self._conexion.executemany(
+                "INSERT OR IGNORE INTO tareas (cola, clave, carga, actualizada) VALUES (?, ?, ?, ?)",
+                [(cola, clave, json.dumps(carga), ahora) for clave, carga in tareas])
+            return self._conexion.total_changes - antes
+
+    def poner(self, cola, clave, carga):
+        """Encola una tarea; devuelve False si la clave ya estaba en la cola."""
+        return self.poner_varias(cola, [(clave, carga)]) == 1
+
+    def tomar(self, cola, cantidad=1, trabajador='local'):
+        """
+        Alquila al trabajador hasta 'cantidad' tareas pendientes (o con el alquiler caducado) y
+        devuelve [(clave, carga)].
+        """
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            # BEGIN IMMEDIATE bloquea la escritura antes de leer: otro proceso no puede tomar las mismas tareas
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                filas = self._conexion.execute(
+                    "SELECT id, clave, carga FROM tareas WHERE cola = ? AND ((estado = ? AND (disponible IS NULL OR disponible <= ?)) "
+                    "OR (estado = ? AND caduca < ?)) ORDER BY id LIMIT ?",
+                    (cola, PENDIENTE, time.time(), EN_CURSO, time.time(), cantidad)).fetchall()
+                self._conexion.executemany(
+                    "UPDATE tareas SET estado = ?, trabajador = ?, caduca = ?, actualizada = ? WHERE id = ?",
+                    [(EN_CURSO, trabajador, time.time() + self.duracion_lease, ahora, fila[0]) for fila in filas])
+                self._conexion.commit()
+            except BaseException:
+                self._conexion.rollback()
+                raise
+        return [(clave, json.loads(carga)) for _, clave, carga in filas]
+
+    def latido(self, trabajador):
+        """Renueva los alquileres de todas las tareas en curso del trabajador; devuelve cuántas son."""
+        with self._lock, self._conexion:
+            return self._conexion.execute("UPDATE tareas SET caduca = ? WHERE estado = ? AND trabajador = ?",
+                                          (time.time() + self.duracion_lease, EN_CURSO, trabajador)).rowcount
+
+    def completar(self, cola, claves):
+        """Marca las tareas como hechas."""
+        self._actualizar(cola, claves, "estado = 'hecha'")
+
+    def fallar(self, cola, claves, clase=None, error=None):
+        """
+        Devuelve las tareas a la cola, o las marca como fallidas si agotan los intentos. Con la clase de
+        fallo (fallos.py) cada tarea espera antes de volver a tomarse y los intentos son los de su clase;
+        las que se marcan como fallidas se anotan en el archivo de fallidos.
+        """
+        if clase is None:
+            self._actualizar(cola, claves, f"intentos = intentos + 1, "
+                                           f"estado = CASE WHEN intentos + 1 >= {int(self.max_intentos)} THEN 'fallida' ELSE 'pendiente' END")
+            return
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        fallidas = []
+        with self._lock, self._conexion:
+            for clave in claves:
+                fila = self._conexion.execute("SELECT carga, intentos FROM tareas WHERE cola = ? AND clave = ?", (cola, clave)).fetchone()
+                if fila is None:
+                    continue
+                intentos = fila[1] + 1
+                estado = FALLIDA if intentos >= intentos_maximos(clase) else PENDIENTE
+                self._conexion.execute("UPDATE tareas SET intentos = ?, estado = ?, disponible = ?, actualizada = ? WHERE cola = ? AND clave = ?",
+                                       (intentos, estado, time.time() + espera_reintento(clase, intentos), ahora, cola, clave))
+                if estado == FALLIDA:
+                    fallidas.append((clave, json.loads(fila[0]), intentos))
+        for clave, carga, intentos in fallidas:
+            registrar_fallido(cola, clave, carga, clase, intentos, error)
+
+    def liberar(self, cola, claves):
+        """Devuelve las tareas a 'pendiente' sin contar un intento (por ejemplo, al parar por un bloqueo)."""
+        self._actualizar(cola, claves, "estado = 'pendiente'")
+
+    def _actualizar(self, cola, claves, asignacion):
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            self._conexion.executemany(f"UPDATE tareas SET {asignacion}, actualizada = ? WHERE cola = ? AND clave = ?",
+                                       [(ahora, cola, clave) for clave in claves])
+
+    def contar(self, cola, estados=(PENDIENTE, EN_CURSO)):
+        """Número de tareas de la cola en los estados indicados (por defecto, las que quedan por hacer)."""
+        marcadores = ','.join('?' * len(estados))
+        with self._lock:
+            return self._conexion.execute(
+                f"SELECT COUNT(*) FROM tareas WHERE cola = ? AND estado IN ({marcadores})", (cola, *estados)).fetchone()[0]
+
+    def resumen(self):
+        """{cola: {estado: número de tareas}}."""
+        with self._lock:
+            filas = self._conexion.execute("SELECT cola, estado, COUNT(*) FROM tareas GROUP BY cola, estado").fetchall()
+        resumen = {}
+        for cola, estado, numero in filas:
+            resumen.setdefault(cola, {})[estado] = numero
+        return resumen
+
+    def guardar_resultados(self, registros, trabajador=None):
+        """Guarda los registros por referencia (sin duplicados) y completa sus tareas de 'anuncios'."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                "INSERT INTO resultados (referencia, codigo_postal, guardado, trabajador, datos, huella) "
+                "VALUES (?, ?, ?, ?, ?, (SELECT huella FROM tarjetas WHERE referencia = ?)) ON CONFLICT(referencia) DO UPDATE SET "
+                "codigo_postal = excluded.codigo_postal, guardado = excluded.guardado, "
+                "trabajador = excluded.trabajador, datos = excluded.datos, huella = excluded.huella, exportado = NULL",
+                [(datos['referencia'], datos.get('codigo_postal'), ahora, trabajador, json.dumps(datos, default=str),
+                  datos['referencia']) for datos in registros])
+            self._conexion.executemany(
+                "UPDATE tareas SET estado = 'hecha', actualizada = ? WHERE cola = 'anuncios' AND clave = ?",
+                [(ahora, datos['referencia']) for datos in registros])
+
+    def vigentes(self, referencias, ttl_dias=configuracion.TTL_VISTOS_DIAS):
+        """Referencias con un resultado guardado hace menos de ttl_dias (mismo uso que IndiceVistos.vigentes)."""
+        limite = (datetime.datetime.now() - datetime.timedelta(days=ttl_dias)).isoformat(timespec='seconds')
+        referencias = list(referencias)
+        vigentes = set()
+        for i in range(0, len(referencias), 500):  # Límite de parámetros por consulta de SQLite
+            lote = referencias[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            with self._lock:
+                filas = self._conexion.execute(
+                    f"SELECT referencia FROM resultados WHERE guardado > ? AND referencia IN ({marcadores})",
+                    [limite, *lote]).fetchall()
+            vigentes.update(fila[0] for fila in filas)
+        return vigentes
+
+    def registrar_tarjetas(self, huellas):
+        """Guarda la huella de la última tarjeta vista de cada referencia ({referencia: huella})."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                "INSERT INTO tarjetas VALUES (?, ?, ?) ON CONFLICT(referencia) DO UPDATE SET huella = excluded.huella, vista = excluded.vista",
+                [(referencia, huella, ahora) for referencia, huella in huellas.items() if huella])
+
+    def sin_cambios(self, referencias, ttl_dias=configuracion.TTL_HUELLA_DIAS):
+        """Referencias guardadas hace menos de ttl_dias cuya tarjeta no ha cambiado (mismo uso que IndiceVistos.sin_cambios)."""
+        limite = (datetime.datetime.now() - datetime.timedelta(days=ttl_dias)).isoformat(timespec='seconds')
+        referencias = list(referencias)
+        iguales = set()
+        for i in range(0, len(referencias), 500):
+            lote = referencias[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            with self._lock:
+                filas = self._conexion.execute(
+                    f"SELECT r.referencia FROM resultados r JOIN tarjetas t ON t.referencia = r.referencia "
+                    f"WHERE r.huella = t.huella AND r.guardado > ? AND r.referencia IN ({marcadores})", [limite, *lote]).fetchall()
+            iguales.update(fila[0] for fila in filas)
+        return iguales
+
+    def resultados(self, lote=1000, sin_exportar=False):
+        """
+        Genera los registros guardados con guardar_resultados(), por lotes; con sin_exportar=True solo
+        los que no se han exportado desde que se guardaron (marcar_exportados).
+        """
+        filtro = " AND exportado IS NULL" if sin_exportar else ""
+        ultimo = ''
+        while True:
+            with self._lock:
+                filas = self._conexion.execute(
+                    f"SELECT referencia, datos FROM resultados WHERE referencia > ?{filtro} ORDER BY referencia LIMIT ?",
+                    (ultimo, lote)).fetchall()
+            if not filas:
+                return
+            ultimo = filas[-1][0]
+            yield from (json.loads(datos) for _, datos in filas)
+
+    def marcar_exportados(self, referencias):
+        """Marca los resultados como exportados para que la siguiente exportación no los repita."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            self._conexion.executemany("UPDATE resultados SET exportado = ? WHERE referencia = ?",
+                                       [(ahora, referencia) for referencia in referencias])
+
+    def reanudar(self, trabajador='local'):
+        """
+        Devuelve a 'pendiente' las tareas que el trabajador dejó 'en_curso' en una ejecución interrumpida
+        (y las de alquiler caducado); las alquiladas por otros trabajadores vivos no se tocan.
+        """
+        with self._lock, self._conexion:
+            return self._conexion.execute(
+                "UPDATE tareas SET estado = ? WHERE estado = ? AND (trabajador = ? OR trabajador IS NULL OR caduca < ?)",
+                (PENDIENTE, EN_CURSO, trabajador, time.time())).rowcount
+
+    def vaciar(self):
+        """Borra todas las tareas (para empezar una ejecución nueva)."""
+        with self._lock, self._conexion:
+            self._conexion.execute("DELETE FROM tareas")
+
+    def cerrar(self):
+        """Cierra la conexión con la cola."""
+        self._conexion.close()
@@ -0,0 +1,128 @@
+"""
+Configuración compartida por los scripts del scraper.
+
+Centraliza los parámetros que antes estaban repetidos en cada script (ruta de ChromeDriver,
+agentes de usuario, número de navegadores...) para poder ajustarlos en un único sitio.
+"""
+
+import os
+
+# Ruta del ejecutable de ChromeDriver
+RUTA_CHROMEDRIVER = os.environ.get('INMO_CHROMEDRIVER', 'chromedriver/chromedriver.exe')
+
+# Agentes de usuario que se rotan para evitar detección
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+]
+
+# Pool de drivers
+NUM_DRIVERS = int(os.environ.get('INMO_NUM_DRIVERS', os.cpu_count() or 1))  # Sesiones de Chrome abiertas a la vez
+MAX_PAGINAS_POR_DRIVER = int(os.environ.get('INMO_MAX_PAGINAS_POR_DRIVER', 50))  # Páginas antes de reciclar una sesión
+INTENTOS_ARRANQUE_DRIVER = 2  # Intentos de arrancar la sesión que sustituye a una reciclada antes de reducir el pool
+
+# HTML de los anuncios
+GUARDAR_HTML = os.environ.get('INMO_GUARDAR_HTML', '0') == '1'  # Guardar driver.page_source de cada anuncio
+DIR_HTML = 'datos/html'  # Directorio donde se guardan las páginas
+
+# Archivo de páginas descargadas (archivo_paginas.py)
+ARCHIVAR_PAGINAS = os.environ.get('INMO_ARCHIVAR_PAGINAS', '1') == '1'  # Guardar búsquedas y anuncios en el archivo
+DIR_ARCHIVO = 'datos/archivo'  # Segmentos comprimidos e índice
+
+# Índice de anuncios ya extraídos (indice_vistos.py)
+RUTA_INDICE_VISTOS = 'datos/indice_vistos.sqlite'
+TTL_VISTOS_DIAS = int(os.environ.get('INMO_TTL_VISTOS_DIAS', 7))  # Días antes de volver a extraer un anuncio
+TTL_HUELLA_DIAS = int(os.environ.get('INMO_TTL_HUELLA_DIAS', 30))  # Días sin volver a abrir un anuncio cuya tarjeta no cambia
+TROZO_ENLACES = int(os.environ.get('INMO_TROZO_ENLACES', 5000))  # Enlaces que se leen y procesan de cada vez
+
+# Historial de precios (historial_precios.py)
+HISTORIAL_PRECIOS = os.environ.get('INMO_HISTORIAL_PRECIOS', '1') == '1'  # Registrar los cambios de cada anuncio al guardarlo
+RUTA_HISTORIAL_PRECIOS = 'datos/historial_precios.sqlite'
+
+# Escritura de anuncios (escritor_anuncios.py)
+RUTA_ANUNCIOS_CSV = 'datos/anuncios.csv'
+RUTA_CHECKPOINT = 'datos/anuncios.checkpoint'  # Referencias guardadas por la ejecución en curso
+VOLCAR_CADA_N = int(os.environ.get('INMO_VOLCAR_CADA_N', 20))  # Registros en buffer antes de escribir
+VOLCAR_CADA_SEGUNDOS = int(os.environ.get('INMO_VOLCAR_CADA_SEGUNDOS', 60))  # Segundos máximos entre volcados
+
+# Almacenamiento de anuncios (almacenamiento.py)
+FORMATO_SALIDA = os.environ.get('INMO_FORMATO_SALIDA', 'csv')  # 'csv', 'parquet' o 'sqlite'
+DIR_PARQUET = 'datos/anuncios_parquet'  # Dataset particionado por fecha y código postal
+RUTA_ANUNCIOS_SQLITE = 'datos/anuncios.sqlite'
+
+# Modo de descarga (fetch_http.py)
+MODO_FETCH = os.environ.get('INMO_MODO_FETCH', 'selenium')  # 'http' prueba primero sin navegador; 'selenium' solo navegador
+CONCURRENCIA_POR_HOST = int(os.environ.get('INMO_CONCURRENCIA_POR_HOST', 4))  # Peticiones HTTP simultáneas por host
+TIMEOUT_HTTP = 30  # Segundos máximos por petición HTTP
+
+# Fotos de los anuncios (imagenes.py)
+DIR_IMAGENES = 'datos/imagenes'  # Originales por hash de contenido, miniaturas e índice
+CONCURRENCIA_IMAGENES = int(os.environ.get('INMO_CONCURRENCIA_IMAGENES', 16))  # Descargas simultáneas en total
+REINTENTOS_IMAGEN = 3  # Intentos por imagen ante errores de red, 429 o 5xx
+ESPERA_REINTENTO_IMAGEN = 1.0  # Segundos antes del primer reintento (se duplica en cada uno)
+TAMANO_MINIATURA = (320, 240)  # Ancho y alto fijos de las miniaturas
+
+# Ritmo de peticiones (planificador.py)
+RUTA_ROBOTS = 'robots.txt'  # robots.txt incluido en el repositorio (Crawl-delay)
+PETICIONES_POR_SEGUNDO_HOST = float(os.environ.get('INMO_PETICIONES_POR_SEGUNDO_HOST', 0.2))  # Una cada 5 s por host
+RAFAGA_HOST = 1  # Peticiones seguidas permitidas sin esperar
+FACTOR_BACKOFF = 2.0  # Al detectar un bloqueo el intervalo entre peticiones se multiplica por este factor
+BACKOFF_MAXIMO = 32.0  # Intervalo máximo respecto al base
+FACTOR_RECUPERACION = 1.1  # Cada página correcta acelera el ritmo hasta volver al base
+
+# robots.txt (validar_urls.py)
+ORIGEN_ROBOTS = os.environ.get('INMO_ORIGEN_ROBOTS', RUTA_ROBOTS)  # Ruta local o 'https://www.fotocasa.es/robots.txt'
+USER_AGENT_ROBOTS = '*'  # Grupo de reglas que se aplica a nuestro rastreador
+TTL_ROBOTS_SEGUNDOS = 24 * 60 * 60  # Tiempo que se reutiliza el robots.txt cargado
+
+# Perfil del navegador (pool_drivers.py)
+PERFIL_NAVEGADOR = os.environ.get('INMO_PERFIL_NAVEGADOR', 'completo')  # 'completo' o 'ligero'
+
+# Scroll guiado por condiciones (navegacion.py)
+ANUNCIOS_POR_PAGINA = 30  # Anuncios que muestra cada página de resultados
+MAX_PAGINAS_BUSQUEDA = 100  # Páginas de resultados que se recorren como máximo por búsqueda
+DOM_ESTABLE_MS = 800  # Milisegundos sin cambios en el DOM para dar la página por cargada
+INTERVALO_SCROLL = 0.25  # Segundos entre pasos de scroll
+LIMITE_SCROLL_SEGUNDOS = 30  # Plazo máximo de scroll por página
+
+# Perfiles persistentes y consentimiento de cookies (pool_drivers.py, navegacion.py)
+PERFILES_PERSISTENTES = os.environ.get('INMO_PERFILES_PERSISTENTES', '1') == '1'  # Un perfil de Chrome por hueco del pool
+DIR_PERFILES = 'datos/perfiles'
+
+# Recuento de anuncios por código postal (numero_anuncios.py)
+RUTA_CACHE_CONTADORES = 'datos/contadores.json'  # Último contador leído de cada código postal
+TTL_CONTADORES_HORAS = float(os.environ.get('INMO_TTL_CONTADORES_HORAS', 24))  # Horas que se reutiliza un contador
+RUTA_CONTADORES_CSV = 'datos/contadores.csv'  # Tabla por código postal para planificar el rastreo
+ESPERA_CONTADOR = 5  # Segundos máximos de espera del contador en la página
+
+# Pipeline por etapas (pipeline.py, cola.py)
+RUTA_COLA = 'datos/cola_pipeline.sqlite'
+RUTA_CHECKPOINT_PIPELINE = 'datos/pipeline.checkpoint'
+MAX_INTENTOS_TAREA = 3  # Intentos de una tarea antes de marcarla como fallida
+TRABAJADORES_ETAPA = {'busquedas': 1, 'paginas': 2, 'anuncios': NUM_DRIVERS}  # Navegadores por etapa
+MAX_ANUNCIOS_EN_COLA = 500  # Las etapas de búsqueda esperan si hay más anuncios pendientes (contrapresión)
+ESPERA_COLA_VACIA = 1.0  # Segundos entre consultas cuando una etapa no tiene trabajo
+
+# Fallos, reintentos y cortacircuitos (fallos.py)
+RUTA_REINTENTOS = 'datos/reintentos.sqlite'  # Páginas pendientes de reintento entre ejecuciones
+RUTA_FALLIDOS = 'datos/fallidos.jsonl'  # Páginas que agotan sus intentos (dead letter)
+# Segundos antes del primer reintento según la clase de fallo; se duplican en cada intento
+ESPERA_FALLO = {'bloqueo': 120, 'timeout': 30, 'sin_estructura': 600, 'driver_caido': 5, 'red': 60, 'otro': 60}
+INTENTOS_FALLO = {'bloqueo': 5, 'timeout': 4, 'sin_estructura': 2, 'driver_caido': 4, 'red': 5, 'otro': 3}  # Intentos por clase
+ESPERA_FALLO_MAXIMA = 3600  # Tope de la espera entre reintentos
+LIMITE_REINTENTOS_SEGUNDOS = int(os.environ.get('INMO_LIMITE_REINTENTOS', 1800))  # Espera máxima a los reintentos al final de una ejecución
+UMBRAL_CIRCUITO = 3  # Bloqueos seguidos de un host que abren su circuito
+PAUSA_CIRCUITO = int(os.environ.get('INMO_PAUSA_CIRCUITO', 300))  # Segundos de pausa al abrirse; se duplica en cada apertura
+PAUSA_CIRCUITO_MAXIMA = 3600
+APERTURAS_CIRCUITO = 4  # Aperturas seguidas sin ninguna página correcta antes de dejar el host para la siguiente ejecución
+
+# Reparto entre varias máquinas (coordinador.py)
+DURACION_LEASE = 300  # Segundos que una tarea queda alquilada a un trabajador sin latido
+INTERVALO_LATIDO = 60  # Segundos entre renovaciones de los alquileres
+URL_COORDINADOR = os.environ.get('INMO_COORDINADOR', RUTA_COLA)  # 'http://host:8765' o ruta a la cola en disco compartido
+PUERTO_COORDINADOR = 8765
+
+# Métricas (metricas.py)
+RUTA_METRICAS = os.environ.get('INMO_METRICAS', 'datos/metricas.jsonl') or None  # INMO_METRICAS='' para no escribir eventos
+PUERTO_METRICAS = int(os.environ.get('INMO_PUERTO_METRICAS', '0'))  # 0: sin endpoint /metrics
@@ -0,0 +1,196 @@
+"""
+Coordinador y trabajadores para repartir el rastreo entre varias máquinas.
+
+FUNCIONAMIENTO:
+1. La cola persistente (cola.py) es el coordinador. Se puede compartir de dos formas:
+   - Como archivo SQLite en un disco compartido: cada trabajador abre la misma ruta.
+   - Como un pequeño servicio HTTP ('servir'): los trabajadores llaman a sus métodos con JSON
+     (ClienteCola tiene la misma interfaz que ColaPersistente).
+   URL_COORDINADOR (INMO_COORDINADOR) indica cuál usar: una URL 'http://...' o una ruta.
+2. 'sembrar' encola las búsquedas de 'start_urls.csv', una tarea por código postal.
+3. Cada 'trabajador' ejecuta el pipeline (pipeline.py) contra el coordinador: alquila tareas con su
+   nombre, renueva los alquileres con un latido y, si el trabajador muere, sus tareas caducan a los
+   DURACION_LEASE segundos y las toma otro.
+4. Los anuncios se guardan en el coordinador por referencia (guardar_resultados), así que una tarea
+   repetida por un alquiler caducado no duplica resultados. 'exportar' escribe en el formato
+   configurado (almacenamiento.py) los que no se han exportado desde que se guardaron, así que
+   repetirlo no duplica filas. Con HISTORIAL_PRECIOS también los registra en el historial de precios
+   (historial_precios.py), ya que los trabajadores no lo escriben.
+
+USO:
+    python coordinador.py servir [puerto]       # En la máquina coordinadora
+    python coordinador.py sembrar
+    python coordinador.py trabajador [nombre]   # En cada máquina (o varios procesos en una)
+    python coordinador.py estado
+    python coordinador.py exportar
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.request import Request, urlopen
+from functools import partial
+from cola import ColaPersistente
+from almacenamiento import guardar_anuncios
+from archivo_paginas import ArchivoPaginas
+from historial_precios import HistorialPrecios
+from metricas import obtener_metricas
+import json
+import os
+import socket
+import sys
+import configuracion
+
+# Métodos de la cola que se pueden llamar por HTTP
+METODOS_REMOTOS = ['poner_varias', 'tomar', 'latido', 'completar', 'fallar', 'liberar', 'contar', 'resumen',
+                   'guardar_resultados', 'vigentes', 'registrar_tarjetas', 'sin_cambios']
+
+
+class ManejadorCola(BaseHTTPRequestHandler):
+    """POST /<metodo> con {"args": [...], "kwargs": {...}} -> {"resultado": ...}."""
+    cola = None  # ColaPersistente que atiende el servidor
+
+    def do_POST(self):
+        metodo = self.path.strip('/')
+        if metodo not in METODOS_REMOTOS:
+            self.send_error(404, f"Método desconocido: {metodo}")
+            return
+        try:
+            peticion = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            resultado = getattr(self.cola, metodo)(*peticion.get('args', []), **peticion.get('kwargs', {}))
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        if isinstance(resultado, set):
+            resultado = sorted(resultado)
+        cuerpo = json.dumps({'resultado': resultado}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ClienteCola:
+    """Acceso por HTTP a la cola del coordinador, con la misma interfaz que ColaPersistente."""
+
+    def __init__(self, url, timeout=configuracion.TIMEOUT_HTTP):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _llamar(self, metodo, *args, **kwargs):
+        cuerpo = json.dumps({'args': args, 'kwargs': kwargs}, default=str).encode('utf-8')
+        peticion = Request(f"{self.url}/{metodo}", data=cuerpo, headers={'Content-Type': 'application/json'})
+        with urlopen(peticion, timeout=self.timeout) as respuesta:
+            return json.loads(respuesta.read())['resultado']
+
+    def __getattr__(self, metodo):
+        if metodo not in METODOS_REMOTOS:
+            raise AttributeError(metodo)
+        return partial(self._llamar, metodo)
+
+    def tomar(self, cola, cantidad=1, trabajador='local'):
+        return [tuple(tarea) for tarea in self._llamar('tomar', cola, cantidad, trabajador)]
+
+    def vigentes(self, referencias, ttl_dias=configuracion.TTL_VISTOS_DIAS):
+        return set(self._llamar('vigentes', list(referencias), ttl_dias))
+
+    def sin_cambios(self, referencias, ttl_dias=configuracion.TTL_HUELLA_DIAS):
+        return set(self._llamar('sin_cambios', list(referencias), ttl_dias))
+
+    def cerrar(self):
+        pass
+
+
+# Función para conectar con el coordinador
+def conectar(destino=configuracion.URL_COORDINADOR):
+    """ClienteCola si el destino es una URL; ColaPersistente sobre la ruta (disco compartido) si no."""
+    if destino.startswith(('http://', 'https://')):
+        return ClienteCola(destino)
+    return ColaPersistente(destino, wal=False)  # WAL no es seguro en discos de red
+
+# Función para servir la cola por HTTP
+def servir(puerto=configuracion.PUERTO_COORDINADOR, ruta=configuracion.RUTA_COLA):
+    """Atiende a los trabajadores hasta que se interrumpe el proceso."""
+    ManejadorCola.cola = ColaPersistente(ruta)
+    servidor = ThreadingHTTPServer(('0.0.0.0', puerto), ManejadorCola)
+    print(f"Coordinador escuchando en el puerto {puerto} ({ruta})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        ManejadorCola.cola.cerrar()
+
+# Función para ejecutar un trabajador
+def trabajador(nombre=None, destino=configuracion.URL_COORDINADOR):
+    """Ejecuta el pipeline alquilando las tareas del coordinador; devuelve True si no quedó trabajo."""
+    from pipeline import Pipeline  # Importa Selenium: solo hace falta en los trabajadores
+    nombre = nombre or f"{socket.gethostname()}-{os.getpid()}"
+    cola = conectar(destino)
+    archivo = ArchivoPaginas() if configuracion.ARCHIVAR_PAGINAS else None
+    pipeline = Pipeline(cola, None, archivo, trabajador=nombre, guardar=partial(cola.guardar_resultados, trabajador=nombre),
+                        ruta_checkpoint=os.path.join('datos', f'trabajador_{nombre}.checkpoint'))
+    print(f"Trabajador {nombre} conectado a {destino}")
+    completo = False
+    try:
+        completo = pipeline.ejecutar()
+    finally:
+        pipeline.escritor.terminar(completo)
+        cola.cerrar()
+        obtener_metricas().imprimir_resumen()
+    return completo
+
+# Función para exportar los resultados del coordinador
+def exportar(formato=configuracion.FORMATO_SALIDA, lote=1000, destino=configuracion.URL_COORDINADOR):
+    """
+    Escribe en el almacenamiento configurado los anuncios guardados en el coordinador que aún no se han
+    exportado, y los marca para que repetir la exportación no los duplique. Con HISTORIAL_PRECIOS los
+    registra también en el historial de precios.
+    """
+    if destino.startswith(('http://', 'https://')):
+        raise ValueError("exportar se ejecuta en la máquina coordinadora, con la ruta de la cola")
+    cola = ColaPersistente(destino)
+    historial = HistorialPrecios() if configuracion.HISTORIAL_PRECIOS else None
+
+    def volcar(registros):
+        guardar_anuncios(registros, formato)
+        if historial:
+            historial.registrar(registros)
+        cola.marcar_exportados([datos['referencia'] for datos in registros])
+        return len(registros)
+
+    total, registros = 0, []
+    try:
+        for datos in cola.resultados(lote, sin_exportar=True):
+            registros.append(datos)
+            if len(registros) >= lote:
+                total, registros = total + volcar(registros), []
+        if registros:
+            total += volcar(registros)
+    finally:
+        cola.cerrar()
+        if historial:
+            historial.cerrar()
+    print(f"{total} anuncios exportados en formato {formato}")
+
+def main():
+    orden = sys.argv[1] if len(sys.argv) > 1 else 'estado'
+    if orden == 'servir':
+        servir(int(sys.argv[2]) if len(sys.argv) > 2 else configuracion.PUERTO_COORDINADOR)
+    elif orden == 'sembrar':
+        from pipeline import sembrar
+        sembrar(conectar())
+    elif orden == 'trabajador':
+        trabajador(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif orden == 'exportar':
+        exportar()
+    elif orden == 'estado':
+        print(conectar().resumen())
+    else:
+        print(__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Escritura incremental de los anuncios extraídos, con punto de control para reanudar.
+
+FUNCIONAMIENTO:
+1. Los registros se acumulan en un buffer y se vuelcan cada N registros o cada T segundos (se comprueba
+   al recibir cada registro), además de al terminar.
+2. Cada volcado escribe las filas con el esquema correcto en el formato configurado (CSV, Parquet o
+   SQLite, ver almacenamiento.py) y después añade sus referencias al archivo de punto de control.
+3. Si la ejecución se interrumpe, el punto de control queda en disco: la siguiente ejecución lee las
+   referencias ya guardadas y las salta, reanudando donde se quedó.
+4. Al terminar la ejecución completa se borra el punto de control.
+
+USO:
+    with EscritorAnuncios() as escritor:
+        pendientes = [link for link in links if referencia(link) not in escritor.procesados()]
+        for datos in ...:
+            escritor.escribir(datos)
+"""
+
+import os
+import threading
+import time
+import configuracion
+from almacenamiento import guardar_anuncios
+from metricas import obtener_metricas
+
+
+class EscritorAnuncios:
+    """Buffer de registros que se vuelca al almacenamiento cada N registros o T segundos."""
+
+    def __init__(self, formato=configuracion.FORMATO_SALIDA, ruta=None, ruta_checkpoint=configuracion.RUTA_CHECKPOINT,
+                 cada_n=configuracion.VOLCAR_CADA_N, cada_segundos=configuracion.VOLCAR_CADA_SEGUNDOS, al_volcar=None,
+                 guardar=None):
+        self.formato = formato  # 'csv', 'parquet' o 'sqlite' (almacenamiento.py)
+        self.ruta = ruta
+        self.guardar = guardar  # Destino alternativo del lote (p. ej. el coordinador); por defecto guardar_anuncios
+        self.ruta_checkpoint = ruta_checkpoint
+        self.cada_n = cada_n
+        self.cada_segundos = cada_segundos
+        self.al_volcar = al_volcar  # Se llama con los registros ya guardados (p. ej. para marcarlos en el índice)
+        self._buffer = []
+        self._ultimo_volcado = time.monotonic()
+        self._lock = threading.RLock()  # Varios hilos pueden escribir a la vez (pipeline.py)
+
+    def procesados(self):
+        """Referencias guardadas por una ejecución anterior que no llegó a terminar."""
+        if not os.path.exists(self.ruta_checkpoint):
+            return set()
+        with open(self.ruta_checkpoint, encoding='utf-8') as f:
+            return {linea.strip() for linea in f if linea.strip()}
+
+    def escribir(self, datos):
+        """Añade un registro al buffer y lo vuelca si toca."""
+        with self._lock:
+            self._buffer.append(datos)
+            if len(self._buffer) >= self.cada_n or time.monotonic() - self._ultimo_volcado >= self.cada_segundos:
+                self.volcar()
+
+    def volcar(self):
+        """Escribe el buffer en el almacenamiento y registra sus referencias en el punto de control."""
+        with self._lock:
+            self._ultimo_volcado = time.monotonic()
+            if not self._buffer:
+                return
+            registros, self._buffer = self._buffer, []
+            with obtener_metricas().tramo('escritura', registros=len(registros)):
+                if self.guardar:
+                    self.guardar(registros)
+                else:
+                    guardar_anuncios(registros, self.formato, self.ruta)
+            with open(self.ruta_checkpoint, 'a', encoding='utf-8') as f:
+                f.writelines(f"{datos['referencia']}\n" for datos in registros)
+            if self.al_volcar:
+                self.al_volcar(registros)
+
+    def terminar(self, completo=True):
+        """Vuelca lo pendiente; si la ejecución ha terminado entera borra el punto de control."""
+        self.volcar()
+        if completo and os.path.exists(self.ruta_checkpoint):
+            os.remove(self.ruta_checkpoint)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.terminar(completo=exc_type is None)
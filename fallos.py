@@ -0,0 +1,398 @@
+"""
+Clasificación de fallos, cola persistente de reintentos y cortacircuitos por host.
+
+FUNCIONAMIENTO:
+1. clasificar() asigna a cada excepción una clase de fallo:
+   - 'bloqueo': la web devuelve la página de bloqueo (PaginaBloqueada).
+   - 'timeout': vence una espera de Selenium (por ejemplo la de '#App') o de la red.
+   - 'sin_estructura': la página carga pero no tiene la estructura esperada (no se pueden extraer los datos).
+   - 'driver_caido': el navegador o ChromeDriver han dejado de responder.
+   - 'red': errores de conexión o de DNS ('net::ERR_...').
+   - 'otro': cualquier otra excepción.
+2. ColaReintentos guarda en SQLite ('datos/reintentos.sqlite') las páginas fallidas con su clase, sus
+   intentos y la hora del siguiente intento. La espera empieza en ESPERA_FALLO[clase] y se duplica en
+   cada intento (hasta ESPERA_FALLO_MAXIMA). Al agotar INTENTOS_FALLO[clase], la página se anota en el
+   archivo de fallidos ('datos/fallidos.jsonl') y sale de la cola.
+3. Cortacircuitos pausa un host cuando devuelve UMBRAL_CIRCUITO bloqueos seguidos: durante
+   PAUSA_CIRCUITO segundos (el doble en cada nueva apertura) ningún hilo ni corrutina le hace
+   peticiones: lo comparten navegacion.abrir_pagina (esperar) y fetch_http.descargar (esperar_async,
+   sin bloquear el bucle de eventos), así que los bloqueos por HTTP y por Selenium cuentan juntos.
+   Pasada la pausa, una sola petición de prueba decide si el circuito se cierra o vuelve a abrirse.
+   Tras APERTURAS_CIRCUITO aperturas sin ninguna página correcta se lanza CircuitoAbierto y el host
+   se deja para la siguiente ejecución.
+4. mapear_con_reintentos() sustituye a pool.mapear() en los scripts: un fallo ya no detiene la
+   ejecución, la página pasa a la cola de reintentos y se vuelve a intentar en la misma ejecución
+   (mientras no se supere LIMITE_REINTENTOS_SEGUNDOS) o en la siguiente, que empieza por las páginas
+   que quedaron pendientes.
+
+USO:
+    for link, datos in mapear_con_reintentos(pool, procesar_anuncio, links, 'anuncios', clave=lambda link: link[1]):
+        ...
+    python fallos.py            # Resumen de la cola de reintentos
+"""
+
+from selenium.common.exceptions import (TimeoutException, NoSuchElementException, StaleElementReferenceException,
+                                        WebDriverException)
+from urllib.parse import urlsplit
+from pool_drivers import PaginaBloqueada
+from metricas import obtener_metricas
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import configuracion
+
+CLASES_FALLO = ['bloqueo', 'timeout', 'sin_estructura', 'driver_caido', 'red', 'otro']
+
+
+# Excepción para las páginas que cargan sin la estructura esperada
+class EstructuraAusente(Exception):
+    """La página no tiene los elementos de los que se extraen los datos."""
+
+
+# Excepción que lanza el cortacircuitos cuando un host sigue bloqueado tras varias pausas
+class CircuitoAbierto(PaginaBloqueada):
+    """El host sigue bloqueado después de APERTURAS_CIRCUITO pausas."""
+
+
+# Función para clasificar un fallo
+def clasificar(error):
+    """Devuelve la clase de fallo (CLASES_FALLO) de la excepción."""
+    if isinstance(error, PaginaBloqueada):
+        return 'bloqueo'
+    if isinstance(error, (TimeoutException, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (EstructuraAusente, NoSuchElementException, StaleElementReferenceException)):
+        return 'sin_estructura'
+    if isinstance(error, WebDriverException):
+        return 'red' if 'net::ERR_' in str(error.msg) else 'driver_caido'
+    if type(error).__module__.split('.')[0] == 'urllib3':  # Conexión con ChromeDriver perdida
+        return 'driver_caido'
+    if isinstance(error, OSError) or type(error).__module__.split('.')[0] == 'aiohttp':
+        return 'red'
+    return 'otro'
+
+# Función para calcular la espera antes de un reintento
+def espera_reintento(clase, intentos):
+    """Segundos hasta el siguiente intento después de 'intentos' fallos de la clase."""
+    espera = configuracion.ESPERA_FALLO.get(clase, configuracion.ESPERA_FALLO['otro']) * 2 ** max(0, intentos - 1)
+    return min(espera, configuracion.ESPERA_FALLO_MAXIMA)
+
+# Función para saber cuántos intentos tiene una clase de fallo
+def intentos_maximos(clase):
+    return configuracion.INTENTOS_FALLO.get(clase, configuracion.INTENTOS_FALLO['otro'])
+
+_lock_fallidos = threading.Lock()
+
+# Función para anotar una página en el archivo de fallidos
+def registrar_fallido(etapa, clave, carga, clase, intentos, error, ruta=configuracion.RUTA_FALLIDOS):
+    """Añade la página al archivo de fallidos (una línea JSON por página)."""
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    linea = json.dumps({'fecha': datetime.datetime.now().isoformat(timespec='seconds'), 'etapa': etapa, 'clave': clave,
+                        'carga': carga, 'clase': clase, 'intentos': intentos, 'error': error}, ensure_ascii=False)
+    with _lock_fallidos, open(ruta, 'a', encoding='utf-8') as f:
+        f.write(linea + '\n')
+    obtener_metricas().contar('fallidos', clase=clase)
+    print(f"Fallo definitivo ({clase}) tras {intentos} intentos: {clave}")
+
+
+class ColaReintentos:
+    """Páginas fallidas pendientes de reintento, guardadas entre ejecuciones."""
+
+    def __init__(self, ruta=configuracion.RUTA_REINTENTOS, ruta_fallidos=configuracion.RUTA_FALLIDOS):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self.ruta_fallidos = ruta_fallidos
+        self._lock = threading.Lock()  # Los hilos del pool registran sus fallos a la vez
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS reintentos (
+                etapa TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                carga TEXT NOT NULL,
+                clase TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                proximo REAL NOT NULL,
+                error TEXT,
+                actualizado TEXT NOT NULL,
+                PRIMARY KEY (etapa, clave)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS reintentos_proximo ON reintentos (etapa, proximo);
+        """)
+
+    def registrar(self, etapa, clave, carga, error):
+        """
+        Anota un fallo de la página. Devuelve (clase, segundos hasta el reintento), o (clase, None) si
+        ha agotado sus intentos y ha pasado al archivo de fallidos.
+        """
+        clase = clasificar(error)
+        mensaje = f"{type(error).__name__}: {str(error)}"[:500]
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            fila = self._conexion.execute("SELECT intentos FROM reintentos WHERE etapa = ? AND clave = ?", (etapa, clave)).fetchone()
+            intentos = (fila[0] if fila else 0) + 1
+            if intentos >= intentos_maximos(clase):
+                self._conexion.execute("DELETE FROM reintentos WHERE etapa = ? AND clave = ?", (etapa, clave))
+                espera = None
+            else:
+                espera = espera_reintento(clase, intentos)
+                self._conexion.execute("INSERT OR REPLACE INTO reintentos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       (etapa, clave, json.dumps(carga), clase, intentos, time.time() + espera, mensaje, ahora))
+        if espera is None:
+            registrar_fallido(etapa, clave, carga, clase, intentos, mensaje, self.ruta_fallidos)
+        return clase, espera
+
+    def aplazar(self, etapa, clave, carga, segundos=0):
+        """Deja la página para más tarde sin contar un intento (por ejemplo, con el host en pausa)."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conexion:
+            self._conexion.execute(
+                "INSERT INTO reintentos (etapa, clave, carga, clase, proximo, actualizado) VALUES (?, ?, ?, 'bloqueo', ?, ?) "
+                "ON CONFLICT(etapa, clave) DO UPDATE SET proximo = excluded.proximo, actualizado = excluded.actualizado",
+                (etapa, clave, json.dumps(carga), time.time() + segundos, ahora))
+
+    def completar(self, etapa, claves):
+        """Quita de la cola las páginas que ya se han procesado."""
+        with self._lock, self._conexion:
+            self._conexion.executemany("DELETE FROM reintentos WHERE etapa = ? AND clave = ?", [(etapa, clave) for clave in claves])
+
+    def listos(self, etapa):
+        """Cargas de las páginas de la etapa cuyo reintento ya toca."""
+        with self._lock:
+            filas = self._conexion.execute("SELECT carga FROM reintentos WHERE etapa = ? AND proximo <= ? ORDER BY proximo",
+                                           (etapa, time.time())).fetchall()
+        return [json.loads(carga) for carga, in filas]
+
+    def proxima(self, etapa):
+        """Segundos hasta el siguiente reintento de la etapa (0 si ya toca), o None si no queda ninguno."""
+        with self._lock:
+            proximo = self._conexion.execute("SELECT MIN(proximo) FROM reintentos WHERE etapa = ?", (etapa,)).fetchone()[0]
+        return None if proximo is None else max(0.0, proximo - time.time())
+
+    def contar(self, etapa):
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM reintentos WHERE etapa = ?", (etapa,)).fetchone()[0]
+
+    def resumen(self):
+        """{etapa: {clase: número de páginas pendientes}}."""
+        with self._lock:
+            filas = self._conexion.execute("SELECT etapa, clase, COUNT(*) FROM reintentos GROUP BY etapa, clase").fetchall()
+        resumen = {}
+        for etapa, clase, numero in filas:
+            resumen.setdefault(etapa, {})[clase] = numero
+        return resumen
+
+    def cerrar(self):
+        """Cierra la cola de reintentos."""
+        self._conexion.close()
+
+
+class Circuito:
+    """Estado del cortacircuitos de un host."""
+
+    def __init__(self):
+        self.bloqueos = 0  # Bloqueos seguidos desde la última página correcta
+        self.aperturas = 0  # Aperturas seguidas sin ninguna página correcta
+        self.abierto_hasta = 0.0  # Fin de la pausa (0: circuito cerrado)
+        self.probando = False  # Hay una petición de prueba en curso tras la pausa
+
+
+class Cortacircuitos:
+    """Pausa los hosts que devuelven bloqueos seguidos y los reanuda con una petición de prueba."""
+
+    def __init__(self, umbral=configuracion.UMBRAL_CIRCUITO, pausa=configuracion.PAUSA_CIRCUITO,
+                 pausa_maxima=configuracion.PAUSA_CIRCUITO_MAXIMA, max_aperturas=configuracion.APERTURAS_CIRCUITO):
+        self.umbral = umbral
+        self.pausa = pausa
+        self.pausa_maxima = pausa_maxima
+        self.max_aperturas = max_aperturas
+        self._circuitos = {}
+        self._condicion = threading.Condition()
+
+    def _circuito(self, url):
+        host = urlsplit(str(url)).netloc
+        if host not in self._circuitos:
+            self._circuitos[host] = Circuito()
+        return self._circuitos[host]
+
+    def _comprobar(self, url):
+        """
+        Segundos que faltan para que el host salga de la pausa (0: la petición puede pasar; None: esperar
+        a la petición de prueba en curso). Lanza CircuitoAbierto si el host se da por perdido.
+        """
+        circuito = self._circuito(url)
+        if circuito.aperturas >= self.max_aperturas:
+            raise CircuitoAbierto(url)
+        if not circuito.abierto_hasta:
+            return 0
+        restante = circuito.abierto_hasta - time.monotonic()
+        if restante > 0:
+            return restante
+        if circuito.probando:
+            return None
+        circuito.probando = True  # Semiabierto: solo esta petición pasa hasta saber si sigue bloqueado
+        return 0
+
+    def esperar(self, url):
+        """Bloquea el hilo mientras el circuito del host esté abierto; lanza CircuitoAbierto si el host se da por perdido."""
+        with self._condicion:
+            while (restante := self._comprobar(url)) != 0:
+                self._condicion.wait(restante)
+
+    async def esperar_async(self, url, intervalo=1.0):
+        """Versión para corrutinas de esperar: no bloquea el bucle de eventos mientras el host está en pausa."""
+        while True:
+            with self._condicion:
+                restante = self._comprobar(url)
+            if restante == 0:
+                return
+            await asyncio.sleep(min(restante, intervalo) if restante is not None else intervalo)
+
+    def en_pausa(self, url):
+        """True si el circuito del host se ha abierto y su pausa aún no ha terminado."""
+        with self._condicion:
+            return self._circuito(url).abierto_hasta > time.monotonic()
+
+    def registrar_bloqueo(self, url):
+        """El host ha devuelto la página de bloqueo; abre el circuito al llegar al umbral (o si falla la prueba)."""
+        with self._condicion:
+            circuito = self._circuito(url)
+            if circuito.abierto_hasta > time.monotonic():  # Peticiones que salieron antes de abrirse
+                return
+            circuito.bloqueos += 1
+            if circuito.probando or circuito.bloqueos >= self.umbral:
+                circuito.aperturas += 1
+                circuito.bloqueos = 0
+                circuito.probando = False
+                pausa = min(self.pausa * 2 ** (circuito.aperturas - 1), self.pausa_maxima)
+                circuito.abierto_hasta = time.monotonic() + pausa
+                obtener_metricas().contar('circuito_abierto')
+                if circuito.aperturas < self.max_aperturas:
+                    print(f"Host {urlsplit(str(url)).netloc} en pausa {pausa:.0f} s tras varios bloqueos")
+                self._condicion.notify_all()
+
+    def registrar_exito(self, url):
+        """Página correcta: cerrar el circuito del host."""
+        with self._condicion:
+            circuito = self._circuito(url)
+            if circuito.bloqueos or circuito.abierto_hasta or circuito.probando:
+                circuito.__init__()
+                self._condicion.notify_all()
+
+    def liberar(self, url):
+        """La petición de prueba ha fallado por otro motivo: dejar pasar otra."""
+        with self._condicion:
+            circuito = self._circuito(url)
+            if circuito.probando:
+                circuito.probando = False
+                self._condicion.notify_all()
+
+
+_cortacircuitos = None
+_lock_cortacircuitos = threading.Lock()
+
+# Función para obtener el cortacircuitos compartido por todo el proceso
+def obtener_cortacircuitos():
+    """Devuelve la instancia única de Cortacircuitos, creándola la primera vez."""
+    global _cortacircuitos
+    with _lock_cortacircuitos:
+        if _cortacircuitos is None:
+            _cortacircuitos = Cortacircuitos()
+        return _cortacircuitos
+
+# Función para saber si una etapa tiene reintentos que ya tocan
+def hay_reintentos(etapa, ruta=configuracion.RUTA_REINTENTOS):
+    """True si quedan páginas de la etapa cuyo reintento ya toca (para no arrancar el pool sin trabajo)."""
+    reintentos = ColaReintentos(ruta)
+    try:
+        return bool(reintentos.listos(etapa))
+    finally:
+        reintentos.cerrar()
+
+# Función para procesar elementos con el pool reintentando los fallos
+def mapear_con_reintentos(pool, funcion, elementos, etapa, clave=str, requerido=False, reintentos=None,
+                          limite=configuracion.LIMITE_REINTENTOS_SEGUNDOS, trozo=configuracion.TROZO_ENLACES):
+    """
+    Genera (elemento, resultado) de cada elemento procesado con funcion(driver, elemento), en el orden
+    en que terminan las rondas. Primero se repiten los pendientes de ejecuciones anteriores y después
+    los elementos pedidos, leídos de 'trozo' en 'trozo' (acepta un iterador sin cargarlo entero). Los
+    fallos pasan a la cola de reintentos de la etapa y se repiten cuando toca, mientras no se superen
+    'limite' segundos. Con requerido=True un resultado None cuenta como fallo 'sin_estructura'.
+    Si un host se da por perdido, sus elementos quedan aplazados y se lanza CircuitoAbierto.
+    """
+    propia = reintentos is None
+    reintentos = reintentos or ColaReintentos()
+    metricas = obtener_metricas()
+
+    def protegida(driver, elemento):
+        try:
+            resultado = funcion(driver, elemento)
+            if requerido and resultado is None:
+                raise EstructuraAusente(clave(elemento))
+            return resultado, None
+        except Exception as e:  # El fallo se registra en el hilo principal
+            return None, e
+
+    def ronda(lote):
+        abierto = None
+        for elemento, (resultado, error) in zip(lote, pool.mapear(protegida, lote)):
+            if error is None:
+                reintentos.completar(etapa, [clave(elemento)])
+                yield elemento, resultado
+            elif isinstance(error, CircuitoAbierto):
+                abierto = error
+                reintentos.aplazar(etapa, clave(elemento), elemento)
+            else:
+                clase, espera = reintentos.registrar(etapa, clave(elemento), elemento, error)
+                metricas.contar('fallos', clase=clase)
+                logging.error(f"Fallo '{clase}' en {clave(elemento)}: {str(error)}")
+                if espera is not None:
+                    print(f"Fallo '{clase}' en {clave(elemento)}: reintento en {espera:.0f} s")
+        if abierto:
+            print(f"Host bloqueado tras varias pausas: {reintentos.contar(etapa)} páginas quedan para la siguiente ejecución")
+            raise abierto
+
+    try:
+        fin = time.monotonic() + limite
+
+        # Primera ronda: los reintentos pendientes de ejecuciones anteriores y los elementos pedidos, por trozos
+        anteriores = reintentos.listos(etapa)
+        if anteriores:
+            print(f"{len(anteriores)} reintentos pendientes de ejecuciones anteriores en '{etapa}'")
+            yield from ronda(anteriores)
+        repetidos = {clave(elemento) for elemento in anteriores}
+        elementos = (elemento for elemento in elementos if clave(elemento) not in repetidos)
+        while lote := list(itertools.islice(elementos, trozo)):
+            yield from ronda(lote)
+
+        # Siguientes rondas cuando toque el primer reintento, si caben en el límite
+        while True:
+            espera = reintentos.proxima(etapa)
+            if espera is None or time.monotonic() + espera > fin:
+                break
+            time.sleep(espera)
+            yield from ronda(reintentos.listos(etapa))
+        pendientes = reintentos.contar(etapa)
+        if pendientes:
+            print(f"{pendientes} páginas de '{etapa}' quedan en la cola de reintentos para la siguiente ejecución")
+    finally:
+        if propia:
+            reintentos.cerrar()
+
+def main():
+    reintentos = ColaReintentos()
+    try:
+        resumen = reintentos.resumen()
+        for etapa, clases in sorted(resumen.items()):
+            print(etapa, ', '.join(f"{clase}: {numero}" for clase, numero in sorted(clases.items())))
+        if not resumen:
+            print("No hay reintentos pendientes")
+    finally:
+        reintentos.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Descarga ligera por HTTP, sin navegador, para las páginas que no necesitan JavaScript.
+
+FUNCIONAMIENTO:
+1. Usa un único cliente HTTP asíncrono (aiohttp) con un pool de conexiones compartido y un límite de
+   peticiones simultáneas por host (CONCURRENCIA_POR_HOST). Cada petición espera su turno en el
+   planificador compartido (planificador.py) y pasa por el mismo cortacircuitos por host que Selenium
+   (fallos.py): no sale mientras el host está en pausa, y los bloqueos y las páginas correctas abren
+   y cierran el circuito igual que en navegacion.abrir_pagina.
+2. Fichas de anuncio: descarga el HTML y aplica las mismas definiciones de CAMPOS_ANUNCIO con lxml
+   (parser_offline.py). Si el HTML del servidor no trae los campos, los busca en el estado JSON
+   embebido en la página (RUTAS_ESTADO). El resultado tiene el mismo esquema que obtener_datos_anuncio.
+3. Páginas de búsqueda: lee el contador y los links de los artículos del HTML, con los campos de su
+   tarjeta (CAMPOS_TARJETA), igual que links_anuncios.obtener_links.
+4. Si una página no se puede extraer por esta vía (bloqueo, host dado por perdido, error HTTP o faltan
+   los campos obligatorios) se devuelve None y el script la procesa después con Selenium, que aplaza
+   las de un host con el circuito abierto (fallos.mapear_con_reintentos).
+
+USO:
+    for link, datos in obtener_anuncios(links):
+        if datos is None:
+            ...  # Procesar con Selenium
+
+Para las páginas que lo permiten, el coste por anuncio pasa de decenas de segundos a menos de uno.
+"""
+
+from urllib.parse import urljoin
+from lxml import html
+from campos_anuncio import (CAMPOS_TARJETA, NO_DISPONIBLE, XPATH_CONTADOR, XPATH_SIN_RESULTADOS, construir_registro,
+                            leer_contador, referencia_anuncio)
+from parser_offline import extraer_campos_html
+from planificador import obtener_planificador
+from fallos import CircuitoAbierto, obtener_cortacircuitos
+from metricas import obtener_metricas
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import random
+import re
+import aiohttp
+import configuracion
+
+# Campos sin los que la extracción por HTTP se considera fallida
+CAMPOS_OBLIGATORIOS = ['precio']
+
+# Estado JSON que la web incrusta en la página y rutas de cada campo dentro de él
+PATRON_ESTADO = re.compile(r'window\.__INITIAL_PROPS__\s*=\s*JSON\.parse\((".*?")\);?\s*</script>', re.S)
+RUTAS_ESTADO = {
+    'precio': ['realEstate', 'price'],
+    'dormitorios': ['realEstate', 'features', 'rooms'],
+    'area': ['realEstate', 'features', 'surface'],
+    'planta': ['realEstate', 'features', 'floor'],
+    'tipo': ['realEstate', 'propertyType'],
+    'promotora': ['realEstate', 'advertiser', 'name'],
+    'certificado_energetico': ['realEstate', 'energyCertificate', 'rating'],
+}
+
+
+# Función para crear la sesión HTTP compartida
+def crear_sesion(concurrencia_por_host=configuracion.CONCURRENCIA_POR_HOST, limite=0):
+    """Sesión aiohttp con pool de conexiones, límite de conexiones por host y total (0: sin límite)."""
+    conector = aiohttp.TCPConnector(limit=limite, limit_per_host=concurrencia_por_host)
+    cabeceras = {'User-Agent': random.choice(configuracion.USER_AGENTS), 'Accept-Language': 'es-ES,es;q=0.9'}
+    return aiohttp.ClientSession(connector=conector, headers=cabeceras,
+                                 timeout=aiohttp.ClientTimeout(total=configuracion.TIMEOUT_HTTP))
+
+# Función para descargar una página
+async def descargar(sesion, url):
+    """Devuelve el HTML de la URL, o None si la respuesta no es válida o el host está dado por perdido."""
+    metricas = obtener_metricas()
+    cortacircuitos = obtener_cortacircuitos()
+    try:
+        # Muchas corrutinas esperan turno a la vez: si el circuito se abre mientras tanto, volver a esperar
+        while True:
+            await cortacircuitos.esperar_async(url)  # Host en pausa tras varios bloqueos seguidos
+            with metricas.tramo('espera_turno'):
+                await obtener_planificador().esperar_turno_async(url)  # Mismo ritmo por host que Selenium
+            if not cortacircuitos.en_pausa(url):
+                break
+    except CircuitoAbierto:
+        return None
+    try:
+        with metricas.tramo('descarga_http'):
+            async with sesion.get(url) as respuesta:
+                metricas.contar('paginas', modo='http')
+                if respuesta.status != 200:
+                    logging.error(f"HTTP {respuesta.status} en {url}")
+                    cortacircuitos.liberar(url)  # Si era la petición de prueba, dejar pasar otra
+                    return None
+                return await respuesta.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"Error HTTP en {url}: {str(e)}")
+        cortacircuitos.liberar(url)
+        return None
+    except BaseException:
+        cortacircuitos.liberar(url)
+        raise
+
+# Función para comprobar si el HTML es la página de bloqueo
+def pagina_bloqueada(documento):
+    """Misma comprobación que en Selenium: la página de bloqueo tiene un h1 directo y no tiene #App."""
+    return bool(documento.xpath('//html/body/div/h1')) and not documento.xpath('//*[@id="App"]')
+
+# Función para leer el estado JSON embebido
+def leer_estado(contenido):
+    """Devuelve el estado JSON incrustado en la página, o None si no lo tiene."""
+    coincidencia = PATRON_ESTADO.search(contenido)
+    if not coincidencia:
+        return None
+    try:
+        return json.loads(json.loads(coincidencia.group(1)))  # Cadena JSON dentro de JSON.parse("...")
+    except ValueError:
+        return None
+
+# Función para completar los campos con el estado embebido
+def completar_con_estado(campos, estado):
+    """Rellena los campos que el HTML no trae con los valores del estado JSON."""
+    for nombre, ruta in RUTAS_ESTADO.items():
+        if campos.get(nombre) != NO_DISPONIBLE:
+            continue
+        valor = estado
+        for clave in ruta:
+            valor = valor.get(clave) if isinstance(valor, dict) else None
+        if valor not in (None, ''):
+            campos[nombre] = str(valor)
+    return campos
+
+# Función para extraer un anuncio del HTML descargado
+def extraer_anuncio(contenido, url, cd_postal, fecha=None):
+    """Devuelve el registro del anuncio, o None si faltan los campos obligatorios."""
+    documento = html.document_fromstring(contenido)
+    if pagina_bloqueada(documento):
+        obtener_metricas().contar('bloqueos', modo='http')
+        obtener_planificador().registrar_bloqueo(url)
+        obtener_cortacircuitos().registrar_bloqueo(url)  # Pausar el host si los bloqueos se repiten
+        return None
+    obtener_planificador().registrar_exito(url)
+    obtener_cortacircuitos().registrar_exito(url)
+    with obtener_metricas().tramo('extraccion', modo='http'):
+        campos = extraer_campos_html(documento)
+    if any(campos[nombre] == NO_DISPONIBLE for nombre in CAMPOS_OBLIGATORIOS):
+        estado = leer_estado(contenido)
+        if estado:
+            completar_con_estado(campos, estado)
+    if any(campos[nombre] == NO_DISPONIBLE for nombre in CAMPOS_OBLIGATORIOS):
+        return None
+    fecha = fecha or datetime.datetime.today().strftime('%d-%m-%Y')
+    return construir_registro(campos, url, cd_postal, fecha)
+
+# Función para leer la tarjeta de un anuncio de la página de resultados
+def leer_tarjeta(articulo, website):
+    """{'href', campos de CAMPOS_TARJETA} del <article>, o None si no tiene link."""
+    href = articulo.xpath('./a/@href')
+    if not href:
+        return None
+    tarjeta = {'href': urljoin(website, href[0])}
+    for nombre, campo in CAMPOS_TARJETA.items():
+        elementos = articulo.xpath(campo['xpath'])
+        tarjeta[nombre] = ' '.join(''.join(elementos[0].itertext()).split()) if elementos else None
+    return tarjeta
+
+# Función para extraer el contador y las tarjetas de una página de búsqueda
+def extraer_busqueda(contenido, website):
+    """Devuelve (contador, tarjetas) de la página de resultados, o None si no se puede leer."""
+    documento = html.document_fromstring(contenido)
+    if pagina_bloqueada(documento):
+        obtener_metricas().contar('bloqueos', modo='http')
+        obtener_planificador().registrar_bloqueo(website)
+        obtener_cortacircuitos().registrar_bloqueo(website)  # Pausar el host si los bloqueos se repiten
+        return None
+    obtener_planificador().registrar_exito(website)
+    obtener_cortacircuitos().registrar_exito(website)
+    contador = documento.xpath(XPATH_CONTADOR)
+    if not contador:
+        return (0, []) if documento.xpath(XPATH_SIN_RESULTADOS) else None
+    tarjetas = [leer_tarjeta(articulo, website) for articulo in documento.xpath('//section[@class="re-SearchResult"]/article')]
+    return leer_contador(''.join(contador[-1].itertext())), [tarjeta for tarjeta in tarjetas if tarjeta]
+
+# Función para descargar y extraer un anuncio
+async def _obtener_anuncio(sesion, link, archivo):
+    contenido = await descargar(sesion, link[1])
+    if contenido is None:
+        return link, None
+    if archivo:
+        archivo.guardar('anuncio', link[1], contenido, referencia=referencia_anuncio(link[1]), codigo_postal=link[0])
+    return link, extraer_anuncio(contenido, link[1], link[0])
+
+# Función para descargar y extraer una página de búsqueda
+async def _obtener_busqueda(sesion, website, archivo):
+    contenido = await descargar(sesion, website)
+    if contenido is None:
+        return website, None
+    if archivo:
+        archivo.guardar('busqueda', website, contenido, codigo_postal=website.split("zipCode=")[1])
+    return website, extraer_busqueda(contenido, website)
+
+async def _ejecutar(corrutina, elementos, archivo):
+    async with crear_sesion() as sesion:
+        return await asyncio.gather(*(corrutina(sesion, elemento, archivo) for elemento in elementos))
+
+# Función para obtener anuncios por HTTP
+def obtener_anuncios(links, archivo=None, lote=200):
+    """
+    Genera (link, registro o None) para cada (código postal, URL), procesando los links por lotes;
+    acepta un iterador y solo lee el lote en curso.
+    """
+    links = iter(links)
+    while True:
+        bloque = list(itertools.islice(links, lote))
+        if not bloque:
+            return
+        yield from asyncio.run(_ejecutar(_obtener_anuncio, bloque, archivo))
+
+# Función para obtener páginas de búsqueda por HTTP
+def obtener_busquedas(websites, archivo=None):
+    """Devuelve [(website, (contador, links) o None)] para cada URL de búsqueda."""
+    return asyncio.run(_ejecutar(_obtener_busqueda, list(websites), archivo))
@@ -0,0 +1,230 @@
+"""
+Historial de precios (y de los demás campos que pueden cambiar) de cada anuncio, en SQLite.
+
+FUNCIONAMIENTO:
+1. registrar() recibe los registros extraídos (mismo esquema que 'datos/anuncios.csv'), normaliza los
+   campos seguidos (normalizacion.py: precio en euros, superficie, habitaciones, planta, certificado
+   y tipo) y solo escribe una fila por (referencia, fecha de captura) cuando alguno de esos campos es
+   distinto del estado anterior del anuncio. Un anuncio capturado a diario durante años sin cambios
+   ocupa una fila.
+2. La tabla 'vistos' guarda para cada referencia su código postal y la primera y la última captura,
+   para saber hasta cuándo estuvo publicado cada precio.
+3. Índices: la clave primaria (referencia, fecha) sirve para la trayectoria de un anuncio, y hay
+   índices por (codigo_postal, fecha) y por fecha para las consultas por zona y por periodo.
+4. Consultas:
+   - trayectoria(referencia): precios (y demás campos) del anuncio, en orden de fecha.
+   - bajadas(desde): bajadas de precio desde una fecha, con el precio anterior y el nuevo.
+   - medianas_ponderadas(desde, hasta): mediana del precio por código postal ponderando cada precio
+     por los días que estuvo publicado dentro del periodo.
+5. importar_csv() carga el histórico de 'datos/anuncios.csv' por trozos. anuncios_v2.py y pipeline.py
+   registran cada lote al volcarlo (HISTORIAL_PRECIOS).
+
+USO:
+    python historial_precios.py importar
+    python historial_precios.py trayectoria 183930550
+    python historial_precios.py bajadas 2024-11-01 [codigo_postal]
+    python historial_precios.py medianas 2024-11-01 [2024-11-30]
+"""
+
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import pandas as pd
+import configuracion
+from campos_anuncio import COLUMNAS_ANUNCIO, ENCABEZADOS_CSV
+from normalizacion import normalizar_anuncios
+
+# Campos seguidos: columna del historial -> columna de normalizar_anuncios()
+CAMPOS_SEGUIDOS = {
+    'precio': 'precio_eur',
+    'superficie': 'superficie_m2',
+    'habitaciones': 'habitaciones',
+    'planta': 'planta_num',
+    'certificado': 'certificado_letra',
+    'tipo': 'tipo',
+}
+
+
+# Función para pasar un valor de pandas a SQLite
+def valor_sqlite(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    return valor.item() if hasattr(valor, 'item') else valor  # Tipos de numpy -> tipos de Python
+
+# Función para calcular la mediana ponderada
+def mediana_ponderada(valores, pesos):
+    """Valor en el que el peso acumulado (ordenando por valor) alcanza la mitad del total; None sin peso."""
+    pares = sorted((valor, peso) for valor, peso in zip(valores, pesos) if peso > 0)
+    total = sum(peso for _, peso in pares)
+    if not total:
+        return None
+    acumulado = 0
+    for valor, peso in pares:
+        acumulado += peso
+        if acumulado >= total / 2:
+            return valor
+
+
+class HistorialPrecios:
+    """Cambios de precio y de los campos seguidos por referencia y fecha de captura."""
+
+    def __init__(self, ruta=configuracion.RUTA_HISTORIAL_PRECIOS):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self._lock = threading.Lock()  # El escritor del pipeline registra desde sus hilos
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS cambios (
+                referencia TEXT NOT NULL,
+                fecha TEXT NOT NULL,
+                codigo_postal TEXT,
+                precio REAL,
+                superficie REAL,
+                habitaciones INTEGER,
+                planta INTEGER,
+                certificado TEXT,
+                tipo TEXT,
+                PRIMARY KEY (referencia, fecha)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS cambios_cp_fecha ON cambios(codigo_postal, fecha);
+            CREATE INDEX IF NOT EXISTS cambios_fecha ON cambios(fecha);
+            CREATE TABLE IF NOT EXISTS vistos (
+                referencia TEXT PRIMARY KEY,
+                codigo_postal TEXT,
+                primera TEXT NOT NULL,
+                ultima TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS vistos_cp ON vistos(codigo_postal);
+        """)
+
+    def _estado(self, referencia, fecha):
+        """Valores de los campos seguidos vigentes en la fecha, o None si el anuncio no se había visto."""
+        fila = self._conexion.execute(
+            f"SELECT {', '.join(CAMPOS_SEGUIDOS)} FROM cambios WHERE referencia = ? AND fecha <= ? ORDER BY fecha DESC LIMIT 1",
+            (referencia, fecha)).fetchone()
+        return tuple(fila) if fila else None
+
+    def registrar(self, registros):
+        """Guarda los cambios de un lote de registros; devuelve cuántas filas nuevas se han escrito."""
+        df = pd.DataFrame(registros, columns=COLUMNAS_ANUNCIO)
+        if df.empty:
+            return 0
+        normalizados = normalizar_anuncios(df[['precio', 'area', 'dormitorios', 'planta', 'certificado_energetico']])
+        historial = pd.DataFrame({columna: normalizados[origen] if origen in normalizados else df[origen]
+                                  for columna, origen in CAMPOS_SEGUIDOS.items()})
+        historial['certificado'] = historial['certificado'].astype(object)
+        historial.insert(0, 'referencia', df['referencia'].astype(str))
+        historial.insert(1, 'fecha', pd.to_datetime(df['fecha'], format='%d-%m-%Y').dt.strftime('%Y-%m-%d'))
+        historial.insert(2, 'codigo_postal', df['codigo_postal'].astype(str))
+        historial = historial.sort_values(['referencia', 'fecha'], kind='stable')
+
+        nuevas = 0
+        with self._lock, self._conexion:
+            anteriores = {}  # Último estado de cada referencia dentro del lote
+            for fila in historial.itertuples(index=False):
+                valores = tuple(valor_sqlite(getattr(fila, campo)) for campo in CAMPOS_SEGUIDOS)
+                anterior = anteriores[fila.referencia] if fila.referencia in anteriores else self._estado(fila.referencia, fila.fecha)
+                if valores != anterior:
+                    self._conexion.execute("INSERT OR REPLACE INTO cambios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                           (fila.referencia, fila.fecha, fila.codigo_postal, *valores))
+                    nuevas += 1
+                anteriores[fila.referencia] = valores
+                self._conexion.execute(
+                    "INSERT INTO vistos VALUES (?, ?, ?, ?) ON CONFLICT(referencia) DO UPDATE SET "
+                    "codigo_postal = excluded.codigo_postal, primera = MIN(primera, excluded.primera), "
+                    "ultima = MAX(ultima, excluded.ultima)", (fila.referencia, fila.codigo_postal, fila.fecha, fila.fecha))
+        return nuevas
+
+    def importar_csv(self, ruta=configuracion.RUTA_ANUNCIOS_CSV, trozo=50_000):
+        """Registra el histórico del CSV de anuncios leyéndolo por trozos; devuelve las filas nuevas."""
+        nuevas = 0
+        columnas = {encabezado: columna for columna, encabezado in ENCABEZADOS_CSV.items()}
+        for df in pd.read_csv(ruta, dtype=str, chunksize=trozo):
+            nuevas += self.registrar(df.rename(columns=columnas).to_dict('records'))
+        return nuevas
+
+    def trayectoria(self, referencia):
+        """DataFrame con las fechas en que cambió el anuncio y sus valores desde cada una."""
+        with self._lock:
+            return pd.read_sql_query("SELECT * FROM cambios WHERE referencia = ? ORDER BY fecha", self._conexion,
+                                     params=(str(referencia),))
+
+    def bajadas(self, desde, codigos_postales=None):
+        """DataFrame de las bajadas de precio desde la fecha: referencia, código postal, fecha, precio anterior y nuevo."""
+        filtro, parametros = '', [str(desde)]
+        if codigos_postales:
+            filtro = f" AND codigo_postal IN ({','.join('?' * len(codigos_postales))})"
+            parametros += [str(cp) for cp in codigos_postales]
+        consulta = f"""
+            SELECT referencia, codigo_postal, fecha, anterior AS precio_anterior, precio,
+                   precio - anterior AS diferencia, ROUND(100.0 * (precio - anterior) / anterior, 2) AS porcentaje
+            FROM (
+                SELECT referencia, codigo_postal, fecha, precio,
+                       LAG(precio) OVER (PARTITION BY referencia ORDER BY fecha) AS anterior
+                FROM cambios
+                WHERE referencia IN (SELECT referencia FROM cambios WHERE fecha >= ?{filtro})
+            )
+            WHERE fecha >= ? AND precio < anterior
+            ORDER BY fecha, referencia
+        """
+        with self._lock:
+            return pd.read_sql_query(consulta, self._conexion, params=[*parametros, str(desde)])
+
+    def medianas_ponderadas(self, desde, hasta=None, codigos_postales=None):
+        """
+        {código postal: mediana del precio} en el periodo [desde, hasta]. Cada precio pesa los días que
+        estuvo publicado dentro del periodo: desde su fecha hasta el siguiente cambio o la última captura.
+        """
+        desde = datetime.date.fromisoformat(str(desde))
+        hasta = datetime.date.fromisoformat(str(hasta)) if hasta else datetime.date.today()
+        filtro, parametros = '', [desde.isoformat(), hasta.isoformat()]
+        if codigos_postales:
+            filtro = f" AND v.codigo_postal IN ({','.join('?' * len(codigos_postales))})"
+            parametros += [str(cp) for cp in codigos_postales]
+        consulta = f"""
+            SELECT v.codigo_postal, c.fecha, c.precio,
+                   LEAD(c.fecha) OVER (PARTITION BY c.referencia ORDER BY c.fecha) AS siguiente, v.ultima
+            FROM vistos v JOIN cambios c ON c.referencia = v.referencia
+            WHERE v.ultima >= ? AND v.primera <= ?{filtro}
+        """
+        with self._lock:
+            filas = self._conexion.execute(consulta, parametros).fetchall()
+        fin_periodo = hasta + datetime.timedelta(days=1)
+        por_cp = {}
+        for cd_postal, fecha, precio, siguiente, ultima in filas:
+            if precio is None:
+                continue
+            inicio = max(datetime.date.fromisoformat(fecha), desde)
+            fin = datetime.date.fromisoformat(siguiente) if siguiente else datetime.date.fromisoformat(ultima) + datetime.timedelta(days=1)
+            dias = (min(fin, fin_periodo) - inicio).days
+            if dias > 0:
+                valores, pesos = por_cp.setdefault(cd_postal, ([], []))
+                valores.append(precio)
+                pesos.append(dias)
+        return {cd_postal: mediana_ponderada(valores, pesos) for cd_postal, (valores, pesos) in sorted(por_cp.items())}
+
+    def cerrar(self):
+        """Cierra el historial."""
+        self._conexion.close()
+
+def main():
+    orden = sys.argv[1] if len(sys.argv) > 1 else ''
+    historial = HistorialPrecios()
+    try:
+        if orden == 'importar':
+            print(f"{historial.importar_csv()} cambios registrados desde {configuracion.RUTA_ANUNCIOS_CSV}")
+        elif orden == 'trayectoria' and len(sys.argv) > 2:
+            print(historial.trayectoria(sys.argv[2]).to_string(index=False))
+        elif orden == 'bajadas' and len(sys.argv) > 2:
+            print(historial.bajadas(sys.argv[2], sys.argv[3:] or None).to_string(index=False))
+        elif orden == 'medianas' and len(sys.argv) > 2:
+            for cd_postal, mediana in historial.medianas_ponderadas(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None).items():
+                print(f"{cd_postal}: {mediana:,.0f} €")
+        else:
+            print(__doc__)
+    finally:
+        historial.cerrar()
+
+if __name__ == "__main__":
+    main()
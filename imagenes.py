@@ -0,0 +1,264 @@
+"""
+Descarga de las fotos de los anuncios, guardadas por hash de contenido y con miniaturas.
+
+FUNCIONAMIENTO:
+1. leer_imagenes() toma la columna 'img' de los anuncios guardados en el formato configurado
+   (FORMATO_SALIDA, almacenamiento.py) y descarta los valores que no son URLs.
+2. Un índice SQLite ('datos/imagenes/indice.sqlite') guarda, por URL, la referencia del anuncio, el
+   hash SHA-256 del contenido, la ruta del archivo, su extensión y el estado. Las URLs ya descargadas (o que la web
+   ha dado por inexistentes) se saltan, así que la etapa se puede interrumpir y reanudar.
+3. Las descargas comparten una sesión aiohttp (fetch_http.crear_sesion) con un límite total
+   (CONCURRENCIA_IMAGENES) y por host (CONCURRENCIA_POR_HOST). Los errores de red, 429 y 5xx se
+   reintentan hasta REINTENTOS_IMAGEN veces, con una espera que se duplica en cada intento.
+4. El cuerpo de cada respuesta se escribe por trozos en un archivo temporal mientras se calcula su
+   hash, sin cargar la imagen en memoria. Después se mueve a 'originales/ab/<hash>'; si ese archivo
+   ya existe (la misma foto en otro anuncio, aunque el servidor la haya enviado con otro Content-Type)
+   se borra el temporal. La ruta depende solo del hash: la extensión se deduce de los primeros bytes
+   del contenido (o del Content-Type si no se reconocen) y se guarda en el índice como dato.
+5. Las miniaturas de TAMANO_MINIATURA se generan con Pillow en un pool de procesos mientras siguen las
+   descargas, en 'miniaturas/ab/<hash>.jpg', solo para los contenidos que todavía no la tienen
+   (también los descargados por una ejecución interrumpida antes de crear su miniatura).
+
+Las fotos se sirven desde el CDN de la web, no desde las páginas, así que no pasan por el
+planificador: solo se limita el número de conexiones simultáneas por host.
+
+USO:
+    python imagenes.py [formato]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from fetch_http import crear_sesion
+from almacenamiento import leer_anuncios_parquet
+from campos_anuncio import ENCABEZADOS_CSV
+from metricas import obtener_metricas
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import uuid
+import aiohttp
+import pandas as pd
+import configuracion
+
+HECHA, FALLIDA, DESCARTADA = 'hecha', 'fallida', 'descartada'  # DESCARTADA: 404/410, no se reintenta
+EXTENSIONES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif', 'image/avif': '.avif'}
+TAMANO_TROZO = 64 * 1024  # Bytes que se leen y escriben de cada vez
+
+# Primeros bytes de cada formato de imagen -> extensión
+FIRMAS = [
+    (lambda cabecera: cabecera.startswith(b'\xff\xd8\xff'), '.jpg'),
+    (lambda cabecera: cabecera.startswith(b'\x89PNG\r\n\x1a\n'), '.png'),
+    (lambda cabecera: cabecera[:6] in (b'GIF87a', b'GIF89a'), '.gif'),
+    (lambda cabecera: cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP', '.webp'),
+    (lambda cabecera: cabecera[4:12] in (b'ftypavif', b'ftypavis'), '.avif'),
+]
+
+
+# Función para leer las URLs de las fotos de los anuncios guardados
+def leer_imagenes(formato=configuracion.FORMATO_SALIDA):
+    """Devuelve {url: referencia} de las fotos de los anuncios guardados en el formato indicado."""
+    if formato == 'csv':
+        df = pd.read_csv(configuracion.RUTA_ANUNCIOS_CSV, usecols=[ENCABEZADOS_CSV['referencia'], ENCABEZADOS_CSV['img']], dtype=str)
+        df.columns = ['referencia', 'img']
+    elif formato == 'parquet':
+        df = leer_anuncios_parquet(columnas=['referencia', 'img'])
+    elif formato == 'sqlite':
+        with sqlite3.connect(configuracion.RUTA_ANUNCIOS_SQLITE) as conexion:
+            df = pd.read_sql_query("SELECT referencia, img FROM anuncios", conexion)
+    else:
+        raise ValueError(f"Formato de salida desconocido: {formato}")
+    df = df[df['img'].astype(str).str.match(r'https?://')]
+    return dict(zip(df['img'].astype(str), df['referencia'].astype(str)))
+
+# Función para deducir la extensión de una imagen
+def extension_imagen(cabecera, content_type=None):
+    """Extensión según los primeros bytes del contenido; si no se reconocen, según el Content-Type."""
+    for coincide, extension in FIRMAS:
+        if coincide(cabecera):
+            return extension
+    return EXTENSIONES.get(content_type, '.bin')
+
+# Función para generar la miniatura de una imagen (se ejecuta en el pool de procesos)
+def crear_miniatura(origen, destino, tamano=configuracion.TAMANO_MINIATURA):
+    """Guarda en destino una miniatura JPEG de tamaño fijo (recortada al centro); devuelve False si falla."""
+    from PIL import Image, ImageOps  # Dependencia opcional, solo para las miniaturas
+    try:
+        with Image.open(origen) as imagen:
+            miniatura = ImageOps.fit(imagen.convert('RGB'), tamano)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+        miniatura.save(temporal, 'JPEG', quality=85)
+        os.replace(temporal, destino)
+        return True
+    except OSError as e:  # Archivo que no es una imagen o formato no soportado
+        logging.error(f"No se pudo crear la miniatura de {origen}: {str(e)}")
+        return False
+
+
+class AlmacenImagenes:
+    """Fotos guardadas por hash de contenido, con un índice de URLs descargadas."""
+
+    def __init__(self, directorio=configuracion.DIR_IMAGENES, tamano_miniatura=configuracion.TAMANO_MINIATURA):
+        self.directorio = directorio
+        self.tamano_miniatura = tamano_miniatura
+        os.makedirs(os.path.join(directorio, 'temporal'), exist_ok=True)
+        self._conexion = sqlite3.connect(os.path.join(directorio, 'indice.sqlite'))
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS imagenes (
+                url TEXT PRIMARY KEY,
+                referencia TEXT,
+                hash TEXT,
+                ruta TEXT,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                actualizada TEXT NOT NULL,
+                extension TEXT
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS imagenes_hash ON imagenes(hash);
+            CREATE INDEX IF NOT EXISTS imagenes_referencia ON imagenes(referencia);
+        """)
+
+    def pendientes(self, imagenes):
+        """Filtra {url: referencia} quitando las URLs ya descargadas o descartadas."""
+        urls = list(imagenes)
+        hechas = set()
+        for i in range(0, len(urls), 500):  # Límite de parámetros por consulta de SQLite
+            lote = urls[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            filas = self._conexion.execute(
+                f"SELECT url FROM imagenes WHERE estado IN (?, ?) AND url IN ({marcadores})", [HECHA, DESCARTADA, *lote]).fetchall()
+            hechas.update(fila[0] for fila in filas)
+        return {url: referencia for url, referencia in imagenes.items() if url not in hechas}
+
+    def ruta_original(self, hash_contenido):
+        return os.path.join(self.directorio, 'originales', hash_contenido[:2], hash_contenido)
+
+    def ruta_miniatura(self, hash_contenido):
+        return os.path.join(self.directorio, 'miniaturas', hash_contenido[:2], hash_contenido + '.jpg')
+
+    def sin_miniatura(self):
+        """Genera (hash, ruta) de los contenidos descargados que todavía no tienen miniatura."""
+        for hash_contenido, ruta in self._conexion.execute(
+                "SELECT hash, MIN(ruta) FROM imagenes WHERE estado = ? GROUP BY hash", (HECHA,)).fetchall():
+            if not os.path.exists(self.ruta_miniatura(hash_contenido)):
+                yield hash_contenido, ruta
+
+    def registrar(self, url, referencia, estado, hash_contenido=None, ruta=None, extension=None):
+        """Guarda el resultado de la descarga de una URL."""
+        ahora = datetime.datetime.now().isoformat(timespec='seconds')
+        with self._conexion:
+            self._conexion.execute(
+                "INSERT INTO imagenes (url, referencia, hash, ruta, estado, intentos, actualizada, extension) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?) ON CONFLICT(url) DO UPDATE SET referencia = excluded.referencia, "
+                "hash = excluded.hash, ruta = excluded.ruta, estado = excluded.estado, intentos = intentos + 1, "
+                "actualizada = excluded.actualizada, extension = excluded.extension",
+                (url, referencia, hash_contenido, ruta, estado, ahora, extension))
+
+    async def _guardar_cuerpo(self, respuesta):
+        """
+        Escribe el cuerpo por trozos en un temporal y lo mueve a su ruta por hash; devuelve
+        (hash, ruta, extensión, nueva).
+        """
+        temporal = os.path.join(self.directorio, 'temporal', uuid.uuid4().hex)
+        resumen = hashlib.sha256()
+        cabecera = b''
+        try:
+            with open(temporal, 'wb') as f:
+                async for trozo in respuesta.content.iter_chunked(TAMANO_TROZO):
+                    if len(cabecera) < 16:
+                        cabecera += trozo[:16 - len(cabecera)]
+                    resumen.update(trozo)
+                    f.write(trozo)
+            hash_contenido = resumen.hexdigest()
+            extension = extension_imagen(cabecera, respuesta.content_type)
+            ruta = self.ruta_original(hash_contenido)
+            if os.path.exists(ruta):  # Mismo contenido ya guardado desde otra URL
+                return hash_contenido, ruta, extension, False
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            os.replace(temporal, ruta)
+            return hash_contenido, ruta, extension, True
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    async def descargar(self, sesion, url, referencia, reintentos=configuracion.REINTENTOS_IMAGEN,
+                        espera=configuracion.ESPERA_REINTENTO_IMAGEN):
+        """Descarga una imagen con reintentos; devuelve (hash, ruta, nueva) o None si no se pudo."""
+        metricas = obtener_metricas()
+        for intento in range(reintentos):
+            try:
+                with metricas.tramo('descarga_imagen'):
+                    async with sesion.get(url) as respuesta:
+                        if respuesta.status in (404, 410):
+                            logging.error(f"HTTP {respuesta.status} en la imagen {url}")
+                            self.registrar(url, referencia, DESCARTADA)
+                            return None
+                        if respuesta.status == 200:
+                            hash_contenido, ruta, extension, nueva = await self._guardar_cuerpo(respuesta)
+                            self.registrar(url, referencia, HECHA, hash_contenido, ruta, extension)
+                            metricas.contar('imagenes', nueva=nueva)
+                            return hash_contenido, ruta, nueva
+                        error = f"HTTP {respuesta.status}"
+                        if respuesta.status != 429 and respuesta.status < 500:
+                            break  # Otros errores del cliente no se arreglan reintentando
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            if intento + 1 < reintentos:
+                await asyncio.sleep(espera * 2 ** intento)
+        logging.error(f"No se pudo descargar la imagen {url}: {error}")
+        self.registrar(url, referencia, FALLIDA)
+        return None
+
+    async def _descargar_lote(self, imagenes):
+        async with crear_sesion(limite=configuracion.CONCURRENCIA_IMAGENES) as sesion:
+            return await asyncio.gather(*(self.descargar(sesion, url, referencia) for url, referencia in imagenes))
+
+    def descargar_todas(self, imagenes, procesos=None, lote=500):
+        """
+        Descarga {url: referencia} saltando lo ya descargado y genera las miniaturas que faltan.
+        Devuelve {'descargadas', 'repetidas', 'fallidas', 'miniaturas'}.
+        """
+        pendientes = list(self.pendientes(imagenes).items())
+        print(f"{len(imagenes) - len(pendientes)} imágenes ya descargadas, {len(pendientes)} pendientes")
+        resumen = {'descargadas': 0, 'repetidas': 0, 'fallidas': 0, 'miniaturas': 0}
+        miniaturas = []
+        encargadas = set()
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            for hash_contenido, ruta in self.sin_miniatura():  # Pendientes de una ejecución anterior
+                encargadas.add(hash_contenido)
+                miniaturas.append(executor.submit(crear_miniatura, ruta, self.ruta_miniatura(hash_contenido), self.tamano_miniatura))
+            for i in range(0, len(pendientes), lote):  # Por lotes: memoria acotada con miles de URLs
+                for resultado in asyncio.run(self._descargar_lote(pendientes[i:i + lote])):
+                    if resultado is None:
+                        resumen['fallidas'] += 1
+                        continue
+                    hash_contenido, ruta, nueva = resultado
+                    resumen['descargadas' if nueva else 'repetidas'] += 1
+                    destino = self.ruta_miniatura(hash_contenido)
+                    if hash_contenido not in encargadas and not os.path.exists(destino):
+                        encargadas.add(hash_contenido)
+                        miniaturas.append(executor.submit(crear_miniatura, ruta, destino, self.tamano_miniatura))
+            resumen['miniaturas'] = sum(1 for futuro in miniaturas if futuro.result())
+        return resumen
+
+    def cerrar(self):
+        """Cierra el índice."""
+        self._conexion.close()
+
+def main():
+    formato = sys.argv[1] if len(sys.argv) > 1 else configuracion.FORMATO_SALIDA
+    imagenes = leer_imagenes(formato)
+    almacen = AlmacenImagenes()
+    try:
+        resumen = almacen.descargar_todas(imagenes)
+    finally:
+        almacen.cerrar()
+    print(f"{resumen['descargadas']} imágenes nuevas, {resumen['repetidas']} repetidas por contenido, "
+          f"{resumen['fallidas']} fallidas, {resumen['miniaturas']} miniaturas creadas")
+    obtener_metricas().imprimir_resumen()
+
+if __name__ == "__main__":
+    main()
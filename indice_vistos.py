@@ -0,0 +1,151 @@
+"""
+Índice persistente de los anuncios ya extraídos.
+
+FUNCIONAMIENTO:
+1. Guarda en SQLite ('datos/indice_vistos.sqlite') una fila por referencia con la fecha de la última
+   extracción y un hash del resultado.
+2. filtrar_pendientes() recibe los enlaces por lotes y devuelve solo los que no se han extraído nunca
+   o cuya última extracción es más antigua que el TTL configurado. Las referencias repetidas en el
+   archivo de enlaces se descartan con una tabla temporal de SQLite, así que la memoria no crece con
+   el tamaño del archivo.
+3. marcar() actualiza la referencia después de extraerla.
+4. registrar_tarjetas() guarda la huella de la última tarjeta vista de cada anuncio en la página de
+   resultados (campos_anuncio.huella_tarjeta). marcar() copia esa huella junto a la extracción, y
+   sin_cambios() devuelve los anuncios cuya tarjeta no ha cambiado desde que se extrajeron, que
+   filtrar_pendientes() también descarta (hasta TTL_HUELLA_DIAS). En un rastreo diario la mayoría de
+   los anuncios no cambian, así que solo se abren las fichas nuevas o modificadas.
+
+USO:
+Permite que anuncios_v2.py haga un rastreo incremental diario visitando solo los anuncios nuevos,
+caducados o con cambios en la tarjeta, en lugar de repetir todos los enlaces de 'links_anuncios.csv'.
+"""
+
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import configuracion
+
+
+# Función para calcular el hash de un registro
+def hash_registro(datos, ignorar=('fecha',)):
+    """Hash estable del registro, sin los campos que cambian en cada captura."""
+    contenido = json.dumps({k: v for k, v in datos.items() if k not in ignorar}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+class IndiceVistos:
+    """Referencia -> fecha de la última extracción y hash del resultado."""
+
+    def __init__(self, ruta=configuracion.RUTA_INDICE_VISTOS):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self._lock = threading.Lock()  # Los hilos del pipeline comparten el índice
+        self._ejecuciones = itertools.count(1)  # Numeración de las tablas temporales de filtrar_pendientes
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS vistos (
+                referencia TEXT PRIMARY KEY,
+                fecha TEXT NOT NULL,
+                hash TEXT,
+                huella TEXT
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS tarjetas (
+                referencia TEXT PRIMARY KEY,
+                huella TEXT NOT NULL,
+                fecha TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def vigentes(self, referencias, ttl_dias=configuracion.TTL_VISTOS_DIAS):
+        """Devuelve el subconjunto de referencias extraídas hace menos de ttl_dias."""
+        limite = (datetime.date.today() - datetime.timedelta(days=ttl_dias)).isoformat()
+        referencias = list(referencias)
+        vigentes = set()
+        for i in range(0, len(referencias), 500):  # Límite de parámetros por consulta de SQLite
+            lote = referencias[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            with self._lock:
+                filas = self._conexion.execute(
+                    f"SELECT referencia FROM vistos WHERE fecha > ? AND referencia IN ({marcadores})", [limite, *lote]).fetchall()
+            vigentes.update(fila[0] for fila in filas)
+        return vigentes
+
+    def sin_cambios(self, referencias, ttl_dias=configuracion.TTL_HUELLA_DIAS):
+        """Subconjunto de referencias extraídas hace menos de ttl_dias cuya tarjeta no ha cambiado desde entonces."""
+        limite = (datetime.date.today() - datetime.timedelta(days=ttl_dias)).isoformat()
+        referencias = list(referencias)
+        iguales = set()
+        for i in range(0, len(referencias), 500):
+            lote = referencias[i:i + 500]
+            marcadores = ','.join('?' * len(lote))
+            with self._lock:
+                filas = self._conexion.execute(
+                    f"SELECT v.referencia FROM vistos v JOIN tarjetas t ON t.referencia = v.referencia "
+                    f"WHERE v.huella = t.huella AND v.fecha > ? AND v.referencia IN ({marcadores})", [limite, *lote]).fetchall()
+            iguales.update(fila[0] for fila in filas)
+        return iguales
+
+    def registrar_tarjetas(self, huellas, fecha=None):
+        """Guarda la huella de la última tarjeta vista de cada referencia ({referencia: huella})."""
+        fecha = (fecha or datetime.date.today()).isoformat()
+        with self._lock, self._conexion:
+            self._conexion.executemany(
+                "INSERT INTO tarjetas VALUES (?, ?, ?) ON CONFLICT(referencia) DO UPDATE SET huella = excluded.huella, fecha = excluded.fecha",
+                [(referencia, huella, fecha) for referencia, huella in huellas.items() if huella])
+
+    def filtrar_pendientes(self, enlaces, clave, ttl_dias=configuracion.TTL_VISTOS_DIAS, lote=1000):
+        """
+        Genera los enlaces cuya referencia (clave(enlace)) no está vigente en el índice ni tiene la
+        misma tarjeta que cuando se extrajo.
+        Procesa los enlaces por lotes, así que acepta un iterador y no los carga todos en memoria; las
+        referencias ya generadas se guardan en una tabla temporal de SQLite en lugar de en un conjunto.
+        """
+        enlaces = iter(enlaces)
+        encolados = f"encolados_{next(self._ejecuciones)}"  # Evita repetir una referencia que aparece varias veces en el archivo
+        with self._lock:
+            self._conexion.execute(f"CREATE TEMP TABLE {encolados} (referencia TEXT PRIMARY KEY) WITHOUT ROWID")
+        try:
+            while True:
+                bloque = list(itertools.islice(enlaces, lote))
+                if not bloque:
+                    return
+                referencias = {clave(enlace) for enlace in bloque}
+                omitir = self.vigentes(referencias, ttl_dias) | self.sin_cambios(referencias)
+                nuevos = []
+                with self._lock, self._conexion:
+                    for enlace in bloque:
+                        referencia = clave(enlace)
+                        if referencia not in omitir and self._conexion.execute(
+                                f"INSERT OR IGNORE INTO {encolados} VALUES (?)", (referencia,)).rowcount:
+                            nuevos.append(enlace)
+                yield from nuevos
+        finally:
+            with self._lock:
+                try:
+                    self._conexion.execute(f"DROP TABLE IF EXISTS temp.{encolados}")
+                except sqlite3.ProgrammingError:  # El índice ya está cerrado y la tabla temporal con él
+                    pass
+
+    def hash(self, referencia):
+        """Devuelve el hash del último resultado de la referencia, o None si no se ha visto."""
+        with self._lock:
+            fila = self._conexion.execute("SELECT hash FROM vistos WHERE referencia = ?", (referencia,)).fetchone()
+        return fila[0] if fila else None
+
+    def marcar(self, referencia, hash_resultado=None, fecha=None):
+        """Registra la extracción de una referencia, con la huella de su última tarjeta vista."""
+        fecha = (fecha or datetime.date.today()).isoformat()
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO vistos (referencia, fecha, hash, huella) "
+                "VALUES (?, ?, ?, (SELECT huella FROM tarjetas WHERE referencia = ?)) ON CONFLICT(referencia) "
+                "DO UPDATE SET fecha = excluded.fecha, hash = excluded.hash, huella = excluded.huella",
+                (referencia, fecha, hash_resultado, referencia))
+            self._conexion.commit()
+
+    def cerrar(self):
+        """Cierra el índice."""
+        self._conexion.close()
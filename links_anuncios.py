@@ -2,135 +2,289 @@
 Este script utiliza Selenium para automatizar la navegación en Fotocasa y extraer enlaces de anuncios.
 
 FUNCIONAMIENTO:
-1. Lee un archivo CSV ('start_urls.csv') que contiene las URLs de búsqueda.
-2. Para cada URL:
-   - Inicializa un navegador Chrome en modo incógnito y, opcionalmente, en modo sin interfaz gráfica (headless).
-   - Usa agentes de usuario aleatorios y técnicas para evitar detección.
-   - Accede a la página y espera aleatoriamente para simular comportamiento humano.
-   - Verifica si la página está bloqueada y detiene el proceso si es necesario.
-   - Espera a que la página cargue completamente y cierra pop-ups si aparecen.
-   - Obtiene el número total de anuncios disponibles en la página.
+1. Lee un archivo CSV ('start_urls.csv') que contiene las URLs de búsqueda y descarta las no permitidas por robots.txt.
+2. Reparte las URLs entre un pool de navegadores Chrome ya arrancados (pool_drivers.py), en modo incógnito
+   y sin interfaz gráfica (headless), con agentes de usuario aleatorios y técnicas para evitar detección.
+   Para cada URL:
+   - Espera su turno en el planificador y accede a la página.
+   - Verifica si la página está bloqueada; las páginas bloqueadas o que fallan pasan a la cola de
+     reintentos (fallos.py) y el resto sigue adelante. Si el host se bloquea varias veces seguidas se
+     pausa y se reanuda solo.
+   - Espera a que la página cargue y acepta las cookies solo si el aviso está presente.
+   - Obtiene el número total de anuncios disponibles en la búsqueda.
    - Si hay anuncios:
-     - Hace scroll hasta el final de la página para cargar todos los anuncios.
-     - Extrae los enlaces de cada anuncio y los almacena en una lista.
-     - Guarda los enlaces en un archivo CSV ('links_anuncios.csv'), junto con la fecha y el código postal extraído de la URL.
-3. Espera un tiempo aleatorio entre iteraciones para reducir el riesgo de bloqueo.
-4. Cierra el navegador al finalizar.
+     - Hace scroll solo hasta que se han cargado los anuncios de la página (navegacion.py).
+     - Extrae los enlaces de todos los anuncios con una única llamada a execute_script, junto con los
+       campos de su tarjeta (CAMPOS_TARJETA: precio, dormitorios, superficie), y avisa si faltan o
+       sobran anuncios respecto al contador de la página.
+     - Archiva la página de resultados comprimida en 'datos/archivo' (archivo_paginas.py).
+     - Guarda los enlaces en un archivo CSV ('links_anuncios.csv'), junto con la fecha y el código postal extraído de la URL,
+       sin la query de seguimiento y descartando los que robots.txt no permite (validar_urls.py).
+       Detrás del enlace se guardan la huella y los campos de la tarjeta, y la huella se registra en el
+       índice de vistos (indice_vistos.py) para que anuncios_v2.py solo abra las fichas nuevas o con
+       cambios en la tarjeta.
+   Con MODO_FETCH='http' las búsquedas se leen primero sin navegador (fetch_http.py) y solo las que
+   no se pueden extraer así pasan al pool de Chrome.
+   Con el contador de la primera página se calcula cuántas páginas tiene la búsqueda
+   (ANUNCIOS_POR_PAGINA por página, hasta MAX_PAGINAS_BUSQUEDA), se generan sus URLs ('.../l/2?...')
+   hasta la primera que robots.txt no permite y se reparten entre los workers igual que las primeras
+   páginas. Los links de todas las páginas se unen por código postal y se guardan sin repetidos.
+   El robots.txt incluido prohíbe las páginas 2 en adelante ('/*/l/2*' ... '/*/l/39*'), así que con
+   él solo se recorre la primera página de cada búsqueda (como mucho ANUNCIOS_POR_PAGINA anuncios por
+   código postal); la paginación solo se aplica con un robots.txt (ORIGEN_ROBOTS) que las permita.
+3. Cada petición espera su turno en el planificador central (planificador.py), que limita el ritmo por host
+   según la configuración y el robots.txt y lo reduce si detecta un bloqueo.
+4. Cierra los navegadores del pool al finalizar.
 
 USO:
 Este script es útil para realizar web scraping en Fotocasa de manera automatizada, recopilando enlaces de anuncios de viviendas sin ser detectado fácilmente.
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from time import sleep
-import random
+from pool_drivers import PoolDrivers, PaginaBloqueada
+from fallos import mapear_con_reintentos, hay_reintentos
+from archivo_paginas import ArchivoPaginas
+from functools import partial
+from fetch_http import obtener_busquedas
+from validar_urls import obtener_politica
+from campos_anuncio import CAMPOS_TARJETA, XPATH_CONTADOR, huella_tarjeta, leer_contador, referencia_anuncio, url_anuncio_canonica
+from indice_vistos import IndiceVistos
+from navegacion import abrir_pagina, cargar_articulos
+from metricas import obtener_metricas
 import datetime
+import math
+import re
 import pandas as pd
+import configuracion
 
-# Función para evitar bloqueos
-def esperar_aleatoriamente(min_seg=5, max_seg=15):
-    tiempo = random.randint(min_seg, max_seg)
-    sleep(tiempo)
+# Script que devuelve la posición, el href y los campos de la tarjeta de todos los anuncios de la página de resultados
+SCRIPT_LINKS = """
+var campos = arguments[0];
+return Array.from(document.querySelectorAll('section.re-SearchResult > article')).map(function (article, i) {
+    var a = article.querySelector(':scope > a');
+    var tarjeta = {posicion: i + 1, href: a ? a.href : null};
+    Object.keys(campos).forEach(function (nombre) {
+        var elemento = document.evaluate(campos[nombre].xpath, article, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        tarjeta[nombre] = elemento ? elemento.innerText.trim() : null;
+    });
+    return tarjeta;
+});
+"""
 
-# Leer el archivo de csv
-pd.set_option('display.max_colwidth', None)
-df = pd.read_csv('datos/start_urls.csv', header=None)[0]
-for website in df:
-    print(website)
-    # Inicializar el driver
-    options = Options()
-    options.add_argument('--incognito')
-    options.add_argument('--headless')  # Opcional: Ejecutar sin interfaz gráfica
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    service = Service('chromedriver/chromedriver.exe')
-    # Rotar agentes de usuario para evitar detección
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    ]
-    options.add_argument(f'user-agent={random.choice(user_agents)}')
-    # Inicializar el driver
-    driver = webdriver.Chrome(service=service, options=options)
-    esperar_aleatoriamente()  # Esperar antes de interactuar
-
-    # Ingresar a la pagina
-    driver.get(str(website))
-    esperar_aleatoriamente()  # Esperar antes de interactuar
-    driver.maximize_window() # Maximizar la ventana
-    
+# Función para extraer los links de todos los anuncios
+def extraer_links(driver):
+    """Devuelve [{'posicion': n, 'href': url, campo de la tarjeta: valor}] de todos los anuncios en un único execute_script."""
+    return driver.execute_script(SCRIPT_LINKS, CAMPOS_TARJETA)
 
-    # Verificar si la pagina esta bloqueada
-    bloqueo = driver.find_elements(By.XPATH, '//html/body/div/h1') if driver.find_elements(By.XPATH, '//html/body/div/h1') else 0
-    if bloqueo != 0:
-        print("Pagina bloqueada")
-        driver.quit()
-        break
+# Función para comparar los links obtenidos con el contador de la página
+def comprobar_links(website, links, counter):
+    """Avisa si faltan o sobran anuncios respecto al contador 're-SearchPage-counterTitle'."""
+    sin_link = [link['posicion'] for link in links if not link['href']]
+    if sin_link:
+        print(f"Anuncios sin link en {website}, posiciones: {sin_link}")
+    encontrados = len(links) - len(sin_link)
+    if encontrados < counter:
+        print(f"Faltan {counter - encontrados} anuncios de {counter} en {website}")
+    elif encontrados > counter:
+        print(f"Sobran {encontrados - counter} anuncios respecto al contador ({counter}) en {website}")
 
-    # Esperar a que cargue la pagina
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
-    
-    # Espera a que el popup sea visible y cierra el popup
-    try:
-        close_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-agree-button"]'))
-        )
-        close_button.click()
-    except Exception as e:
-        print("No se pudo cerrar el popup:", e)
+# Función para obtener el número de página de una URL de búsqueda
+def numero_pagina(website):
+    """'.../l/3?zipCode=...' -> 3; la primera página no lleva número ('.../l?zipCode=...')."""
+    coincidencia = re.search(r'/l/(\d+)(?:[/?#]|$)', website)
+    return int(coincidencia.group(1)) if coincidencia else 1
+
+# Función para generar la URL de una página de resultados
+def url_pagina(website, pagina):
+    """Inserta el número de página tras '/l' conservando la query de la búsqueda."""
+    if pagina == 1:
+        return website
+    ruta, separador, query = website.partition('?')
+    return f"{ruta.rstrip('/')}/{pagina}{separador}{query}"
+
+# Función para calcular cuántas páginas de resultados tiene una búsqueda
+def numero_paginas(counter, por_pagina=configuracion.ANUNCIOS_POR_PAGINA, maximo=configuracion.MAX_PAGINAS_BUSQUEDA):
+    """Páginas según el contador (al menos la primera, como mucho 'maximo')."""
+    return min(max(1, math.ceil(counter / por_pagina)), maximo)
+
+# Función para generar las páginas de una búsqueda a partir del contador
+def paginas_busqueda(website, counter, por_pagina=configuracion.ANUNCIOS_POR_PAGINA,
+                     maximo=configuracion.MAX_PAGINAS_BUSQUEDA, politica=None):
+    """
+    URLs de las páginas de resultados de la búsqueda (la primera es la propia URL). Con una política de
+    robots.txt se detiene en la primera página que no permite: las siguientes no se generan.
+    """
+    urls = [website]
+    for pagina in range(2, numero_paginas(counter, por_pagina, maximo) + 1):
+        url = url_pagina(website, pagina)
+        if politica and not politica.permitida(url):
+            break
+        urls.append(url)
+    return urls
+
+# Función para obtener los links de una URL de búsqueda
+def obtener_links(driver, website, archivo=None):
+    """Devuelve (contador, tarjetas) de una página de resultados; cada tarjeta es {'href', campos de CAMPOS_TARJETA}."""
+    print(website)
+
+    # Esperar el turno, ingresar a la pagina, comprobar el bloqueo y aceptar las cookies
+    abrir_pagina(driver, website)
+    metricas = obtener_metricas()
     
     # Obtener el numero de anuncios     
-    nauncios = driver.find_elements(By.XPATH, '//h2[@class="re-SearchPage-counterTitle"]') if driver.find_elements(By.XPATH, '//h2[@class="re-SearchPage-counterTitle"]') else 0
-    if nauncios == 0:
-        counter = 0
-    else:
-        for n in nauncios:
-            counter = n.text.split(" ")[0]
+    contadores = driver.find_elements(By.XPATH, XPATH_CONTADOR)
+    counter = leer_contador(contadores[-1].text) if contadores else 0  # '1.234' -> 1234
     print(counter)
 
     # Obtener los links de los anuncios
-    links = []
-    if int(counter) == 0: # Si no hay anuncios
+    if counter == 0: # Si no hay anuncios
         print("No se encontraron anuncios")
-        esperar_aleatoriamente(1, 5)  # Esperar antes de seguir
-        driver.quit()
-        continue # Continuar con el siguiente website
-        
-    else:    
-        # Hacer scroll hasta el final de la pagina
-        height = driver.execute_script("return Math.max( document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight );")
-        for e in range(0, height, 700):
-            driver.execute_script('window.scrollTo(0, {});'.format(e))
-            esperar_aleatoriamente(1, 5)  # Esperar antes de seguir
-        
-        for i in range(1, int(counter)+1): # Obtener los links de los anuncios
-            try:
-                link = driver.find_element(By.XPATH, '//section[@class="re-SearchResult"]/article[{}]/a'.format(i)) # Obtener el link
-                links.append(link.get_attribute('href'))
-                esperar_aleatoriamente()  # Esperar antes de seguir
-            except:
-                print("No se pudo obtener el link")
-
-            print(links)
-        
-        cd_postal = website.split("zipCode=")[1] # Obtener el codigo postal
-        fecha = datetime.datetime.now().strftime("%Y-%m-%d") # Obtener la fecha actual
-
-        # Guardar los links en un archivo csv
-        links_df = pd.DataFrame(links, columns=['links'])
-        links_df.insert(0, 'fecha', fecha)
-        links_df.insert(1, 'codigo_postal', cd_postal)
+        return counter, []
+
+    # Anuncios que debe mostrar esta página según el contador
+    por_pagina = configuracion.ANUNCIOS_POR_PAGINA
+    esperados = max(0, min(por_pagina, counter - (numero_pagina(website) - 1) * por_pagina))
+
+    # Hacer scroll hasta que se hayan cargado los anuncios de la pagina
+    with metricas.tramo('scroll'):
+        cargar_articulos(driver, esperados)
+
+    # Archivar la página de resultados
+    if archivo:
+        archivo.guardar('busqueda', website, driver.page_source, codigo_postal=website.split("zipCode=")[1])
+
+    # Obtener todos los links de los anuncios con una sola llamada al navegador
+    with metricas.tramo('extraccion'):
+        links = extraer_links(driver)
+    comprobar_links(website, links, esperados)
+    links = [link for link in links if link['href']]
+    print(f"{len(links)} links obtenidos")
+    return counter, links
+
+# Función para guardar los links de una URL de búsqueda
+def guardar_links(website, tarjetas, indice=None):
+    """
+    Añade los links al CSV junto con la fecha, el código postal de la URL y los campos y la huella de
+    la tarjeta, registra las huellas en el índice y devuelve las tarjetas guardadas (con 'huella').
+    """
+    # Quitar la query de seguimiento ('?from=list'), los repetidos y lo que robots.txt no permite
+    canonicos = {}
+    for tarjeta in tarjetas:
+        canonicos.setdefault(url_anuncio_canonica(tarjeta['href']), tarjeta)
+    permitidos = obtener_politica().filtrar(canonicos)
+    if len(permitidos) < len(canonicos):
+        print(f"{len(canonicos) - len(permitidos)} links descartados por robots.txt")
+    tarjetas = [{**canonicos[link], 'href': link, 'huella': huella_tarjeta(canonicos[link])} for link in permitidos]
+    cd_postal = website.split("zipCode=")[1] # Obtener el codigo postal
+    fecha = datetime.datetime.now().strftime("%Y-%m-%d") # Obtener la fecha actual
+
+    # Registrar la última tarjeta vista de cada anuncio
+    if indice:
+        indice.registrar_tarjetas({referencia_anuncio(tarjeta['href']): tarjeta['huella'] for tarjeta in tarjetas})
+
+    # Guardar los links en un archivo csv
+    links_df = pd.DataFrame([[tarjeta['href'], tarjeta['huella'], *(tarjeta.get(nombre) for nombre in CAMPOS_TARJETA)]
+                             for tarjeta in tarjetas], columns=['links', 'huella', *CAMPOS_TARJETA])
+    links_df.insert(0, 'fecha', fecha)
+    links_df.insert(1, 'codigo_postal', cd_postal)
+    with obtener_metricas().tramo('escritura_links'):
         links_df.to_csv('datos/links_anuncios.csv', mode='a', index=False, header=False)
-        print("Links guardados")
+    print("Links guardados")
+    return tarjetas
 
-        esperar_aleatoriamente(60, 90)  # Esperar antes de seguir
-    
-    # Cerrar el driver
-    driver.quit()
\ No newline at end of file
+# Función para recorrer páginas de búsqueda
+def recorrer_paginas(websites, archivo, pool, etapa='busquedas', resultados=None):
+    """
+    Devuelve ({website: (contador, links)}, bloqueada) de las páginas indicadas: primero por HTTP si
+    MODO_FETCH='http' y después con el pool de navegadores (pool() lo crea la primera vez que hace falta).
+    Las páginas que fallan con el navegador pasan a la cola de reintentos de la etapa (fallos.py), y las
+    que quedaron pendientes en ejecuciones anteriores se recorren también. Con 'resultados' se rellena
+    ese diccionario a medida que termina cada página, así que lo recorrido no se pierde si hay un error.
+    """
+    resultados = {} if resultados is None else resultados
+    # Modo HTTP: leer las búsquedas sin navegador y dejar para Selenium solo las que no se puedan
+    if configuracion.MODO_FETCH == 'http':
+        pendientes = []
+        for website, resultado in obtener_busquedas(websites, archivo):
+            if resultado is None:
+                pendientes.append(website)
+                continue
+            counter, links = resultado
+            por_pagina = configuracion.ANUNCIOS_POR_PAGINA
+            esperados = max(0, min(por_pagina, counter - (numero_pagina(website) - 1) * por_pagina))
+            comprobar_links(website, [{'posicion': i, **tarjeta} for i, tarjeta in enumerate(links, 1)], esperados)
+            resultados[website] = resultado
+        websites = pendientes
+
+    # Repartir las páginas entre las sesiones del pool, reintentando las que fallan
+    if websites or hay_reintentos(etapa):
+        try:
+            for website, resultado in mapear_con_reintentos(pool(), partial(obtener_links, archivo=archivo), websites, etapa):
+                resultados[website] = resultado
+        except PaginaBloqueada as e:  # CircuitoAbierto: el host sigue bloqueado tras varias pausas
+            print("Pagina bloqueada, las pendientes quedan para la siguiente ejecución:", e)
+            return resultados, True
+    return resultados, False
+
+# Función para guardar los links recogidos, unidos por código postal
+def guardar_por_codigo_postal(primeras, resto):
+    """Une los links de las primeras páginas y del resto por código postal y los guarda (guardar_links quita los repetidos)."""
+    por_codigo_postal = {}
+    for website, (counter, links) in primeras.items():
+        grupo = por_codigo_postal.setdefault(website.split("zipCode=")[1], {'website': website, 'contador': 0, 'links': []})
+        grupo['contador'] += counter
+        grupo['links'].extend(links)
+    for pagina, (_, links) in resto.items():  # También las páginas reintentadas de ejecuciones anteriores
+        grupo = por_codigo_postal.setdefault(pagina.split("zipCode=")[1], {'website': pagina, 'contador': 0, 'links': []})
+        grupo['links'].extend(links)
+    indice = IndiceVistos()
+    try:
+        for grupo in por_codigo_postal.values():
+            distintos = len({tarjeta['href'] for tarjeta in grupo['links']})
+            if distintos < grupo['contador']:
+                print(f"{distintos} de {grupo['contador']} anuncios recogidos para {grupo['website']}")
+            if grupo['links']:
+                guardar_links(grupo['website'], grupo['links'], indice)
+    finally:
+        indice.cerrar()
+
+def main():
+    # Leer el archivo de csv
+    pd.set_option('display.max_colwidth', None)
+    df = pd.read_csv('datos/start_urls.csv', header=None)[0]
+
+    archivo = ArchivoPaginas() if configuracion.ARCHIVAR_PAGINAS else None
+    politica = obtener_politica()
+    websites = politica.filtrar(df)  # Descartar las URLs que robots.txt no permite
+
+    # El pool de navegadores solo se arranca si alguna página lo necesita
+    drivers = []
+    def pool():
+        if not drivers:
+            drivers.append(PoolDrivers(headless=True))
+        return drivers[0]
+
+    primeras, resto = {}, {}
+    try:
+        # Primera página de cada búsqueda: contador y primeros links
+        _, bloqueada = recorrer_paginas(websites, archivo, pool, resultados=primeras)
+
+        # Resto de páginas según el contador (hasta la primera que robots.txt no permite), repartidas entre los workers
+        paginas, descartadas = [], 0
+        for website, (counter, _) in primeras.items():
+            siguientes = paginas_busqueda(website, counter, politica=politica)[1:]
+            paginas += siguientes
+            descartadas += numero_paginas(counter) - 1 - len(siguientes)
+        if descartadas:
+            print(f"{descartadas} páginas de resultados no permitidas por robots.txt")
+        if not bloqueada:
+            recorrer_paginas(paginas, archivo, pool, etapa='paginas', resultados=resto)
+    finally:
+        if drivers:
+            drivers[0].cerrar()
+        # Guardar lo recorrido aunque la ejecución termine con un error o se interrumpa
+        guardar_por_codigo_postal(primeras, resto)
+        obtener_metricas().imprimir_resumen()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Métricas de tiempo y contadores de la ejecución.
+
+FUNCIONAMIENTO:
+1. tramo(nombre) mide cuánto tarda un bloque de código (arranque del driver, driver.get, comprobación
+   de bloqueo, aviso de cookies, scroll, extracción, escritura...). Si el bloque lanza una excepción
+   de timeout (TimeoutException de Selenium, asyncio.TimeoutError) se cuenta en 'timeouts'.
+2. contar(nombre) suma contadores: páginas, anuncios, bloqueos, campos ausentes...
+3. Cada tramo y cada contador se escribe como una línea JSON en RUTA_METRICAS (si está configurada).
+4. Con PUERTO_METRICAS se publica además /metrics en formato de texto de Prometheus.
+5. imprimir_resumen() muestra al final de la ejecución, por tramo, el número de mediciones, el total y
+   los percentiles p50/p95, y los contadores.
+
+USO:
+    metricas = obtener_metricas()
+    with metricas.tramo('get'):
+        driver.get(url)
+    metricas.contar('paginas')
+    ...
+    metricas.imprimir_resumen()
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+import configuracion
+
+
+# Función para calcular un percentil de una lista de valores
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal; None si no hay valores."""
+    if not valores:
+        return None
+    valores = sorted(valores)
+    posicion = (len(valores) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
+# Función para saber si una excepción es un timeout
+def es_timeout(excepcion):
+    return isinstance(excepcion, TimeoutError) or type(excepcion).__name__ == 'TimeoutException'
+
+
+class Metricas:
+    """Duraciones por tramo y contadores, compartidos por todos los hilos del proceso."""
+
+    def __init__(self, ruta=configuracion.RUTA_METRICAS):
+        self.ruta = ruta  # Archivo JSON lines; None para no escribir eventos
+        self._lock = threading.Lock()
+        self._duraciones = {}  # tramo -> [segundos]
+        self._contadores = {}  # nombre -> cantidad
+        self._archivo = None
+        if ruta:
+            os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+            self._archivo = open(ruta, 'a', encoding='utf-8')
+
+    def _emitir(self, evento):
+        """Escribe un evento como línea JSON (con el lock tomado)."""
+        if self._archivo:
+            evento['ts'] = round(time.time(), 3)
+            self._archivo.write(json.dumps(evento, ensure_ascii=False) + '\n')
+            self._archivo.flush()
+
+    @contextmanager
+    def tramo(self, nombre, **etiquetas):
+        """Mide la duración del bloque y la registra en el tramo 'nombre'."""
+        inicio = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            if es_timeout(e):
+                self.contar('timeouts', tramo=nombre)
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            with self._lock:
+                self._duraciones.setdefault(nombre, []).append(segundos)
+                evento = {'tipo': 'tramo', 'nombre': nombre, 'segundos': round(segundos, 4), **etiquetas}
+                if error:
+                    evento['error'] = error
+                self._emitir(evento)
+
+    def contar(self, nombre, cantidad=1, **etiquetas):
+        """Suma 'cantidad' al contador 'nombre'."""
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+            self._emitir({'tipo': 'contador', 'nombre': nombre, 'cantidad': cantidad, **etiquetas})
+
+    def resumen(self):
+        """{'tramos': {tramo: {n, total, p50, p95, max}}, 'contadores': {nombre: cantidad}}."""
+        with self._lock:
+            duraciones = {nombre: list(valores) for nombre, valores in self._duraciones.items()}
+            contadores = dict(self._contadores)
+        tramos = {
+            nombre: {'n': len(valores), 'total': sum(valores), 'p50': percentil(valores, 50),
+                     'p95': percentil(valores, 95), 'max': max(valores)}
+            for nombre, valores in duraciones.items()
+        }
+        return {'tramos': tramos, 'contadores': contadores}
+
+    def texto_prometheus(self):
+        """Métricas en el formato de texto de Prometheus."""
+        resumen = self.resumen()
+        lineas = ['# TYPE inmo_tramo_segundos summary']
+        for nombre, datos in sorted(resumen['tramos'].items()):
+            lineas.append(f'inmo_tramo_segundos{{tramo="{nombre}",quantile="0.5"}} {datos["p50"]:.6f}')
+            lineas.append(f'inmo_tramo_segundos{{tramo="{nombre}",quantile="0.95"}} {datos["p95"]:.6f}')
+            lineas.append(f'inmo_tramo_segundos_sum{{tramo="{nombre}"}} {datos["total"]:.6f}')
+            lineas.append(f'inmo_tramo_segundos_count{{tramo="{nombre}"}} {datos["n"]}')
+        lineas.append('# TYPE inmo_eventos_total counter')
+        for nombre, cantidad in sorted(resumen['contadores'].items()):
+            lineas.append(f'inmo_eventos_total{{evento="{nombre}"}} {cantidad}')
+        return '\n'.join(lineas) + '\n'
+
+    def servir_prometheus(self, puerto=configuracion.PUERTO_METRICAS):
+        """Publica /metrics en un hilo en segundo plano."""
+        metricas = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cuerpo = metricas.texto_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        servidor = ThreadingHTTPServer(('0.0.0.0', puerto), Manejador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        return servidor
+
+    def imprimir_resumen(self):
+        """Muestra los percentiles por tramo y los contadores, y guarda el resumen como evento."""
+        resumen = self.resumen()
+        if not resumen['tramos'] and not resumen['contadores']:
+            return resumen
+        print(f"{'tramo':<22}{'n':>8}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+        for nombre, datos in sorted(resumen['tramos'].items(), key=lambda item: -item[1]['total']):
+            print(f"{nombre:<22}{datos['n']:>8}{datos['total']:>10.1f}{datos['p50']:>9.3f}{datos['p95']:>9.3f}{datos['max']:>9.3f}")
+        for nombre, cantidad in sorted(resumen['contadores'].items()):
+            print(f"{nombre}: {cantidad}")
+        with self._lock:
+            self._emitir({'tipo': 'resumen', **resumen})
+        return resumen
+
+
+_metricas = None
+_lock_metricas = threading.Lock()
+
+# Función para obtener las métricas compartidas por todo el proceso
+def obtener_metricas():
+    """Devuelve la instancia única de Metricas, creándola (y publicando /metrics si hay puerto) la primera vez."""
+    global _metricas
+    with _lock_metricas:
+        if _metricas is None:
+            _metricas = Metricas()
+            if configuracion.PUERTO_METRICAS:
+                _metricas.servir_prometheus()
+        return _metricas
@@ -0,0 +1,162 @@
+"""
+Scroll guiado por condiciones para cargar el contenido dinámico de las páginas.
+
+FUNCIONAMIENTO:
+1. La primera llamada instala en la página un MutationObserver que anota la hora del último cambio del DOM.
+2. En cada paso se baja una pantalla y, en la misma llamada a execute_script, se cuentan los
+   elementos de cada selector objetivo (mismo formato {'xpath'} o {'css'} que CAMPOS_ANUNCIO).
+3. El scroll termina en cuanto:
+   - todos los selectores tienen al menos 'minimo' elementos (condición cumplida), o
+   - se ha llegado al final de la página y el DOM lleva DOM_ESTABLE_MS sin cambios, o
+   - vence el plazo máximo LIMITE_SCROLL_SEGUNDOS.
+   Entre pasos solo se espera INTERVALO_SCROLL segundos, de modo que el tiempo de scroll depende del
+   contenido que realmente falta y no de la altura de la página. El contenido que aparece al bajar
+   (la página crece) también se alcanza.
+
+El consentimiento de cookies se trata como estado de la sesión (aceptar_cookies): se comprueba sin
+esperas si la sesión ya lo tiene (en memoria o por la cookie de Didomi, que el perfil persistente
+conserva) y solo se pulsa el botón si el aviso está realmente en la página.
+
+abrir_pagina() reúne los pasos comunes de los scripts antes de extraer: pausa del host si su
+cortacircuitos está abierto (fallos.py), turno del planificador, driver.get, comprobación de la
+página de bloqueo, espera a '#App' y aviso de cookies, cada uno medido como un tramo de metricas.py.
+
+USO:
+    abrir_pagina(driver, url)
+    aceptar_cookies(driver)
+    scroll_hasta(driver, [{'xpath': '//section[@class="re-SearchResult"]/article'}], minimo=30)
+"""
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
+from pool_drivers import PaginaBloqueada
+from planificador import obtener_planificador
+from fallos import obtener_cortacircuitos
+from metricas import obtener_metricas
+import logging
+import threading
+import time
+import weakref
+import configuracion
+
+# Script de un paso de scroll: baja una pantalla y devuelve el estado de la página
+SCRIPT_SCROLL = """
+var selectores = arguments[0];
+if (!window.__inmoObservador) {
+    window.__inmoUltimoCambio = Date.now();
+    window.__inmoObservador = new MutationObserver(function () { window.__inmoUltimoCambio = Date.now(); });
+    window.__inmoObservador.observe(document.documentElement, {childList: true, subtree: true});
+}
+window.scrollBy(0, window.innerHeight);
+var altura = Math.max(document.body.scrollHeight, document.documentElement.scrollHeight);
+return {
+    final: window.scrollY + window.innerHeight >= altura - 2,
+    quieto_ms: Date.now() - window.__inmoUltimoCambio,
+    elementos: selectores.map(function (selector) {
+        if (selector.xpath) {
+            return document.evaluate(selector.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength;
+        }
+        return document.querySelectorAll(selector.css).length;
+    })
+};
+"""
+
+# Selector de los artículos de una página de resultados
+ARTICULOS_BUSQUEDA = {'xpath': '//section[@class="re-SearchResult"]/article'}
+
+# Aviso de cookies (Didomi) y cookie que guarda el consentimiento
+BOTON_CONSENTIMIENTO = '//*[@id="didomi-notice-agree-button"]'
+COOKIE_CONSENTIMIENTO = 'didomi_token'
+
+_con_consentimiento = weakref.WeakSet()  # Sesiones que ya han aceptado las cookies
+_lock_consentimiento = threading.Lock()
+
+
+# Función para aceptar el aviso de cookies una sola vez por sesión
+def aceptar_cookies(driver):
+    """
+    Acepta el aviso de cookies si está en la página, sin esperar a que aparezca.
+    Devuelve True si la sesión ya tiene el consentimiento.
+    """
+    with _lock_consentimiento:
+        if driver in _con_consentimiento:
+            return True
+    aceptado = bool(driver.get_cookie(COOKIE_CONSENTIMIENTO))  # Guardada en el perfil persistente
+    if not aceptado:
+        botones = driver.find_elements(By.XPATH, BOTON_CONSENTIMIENTO)  # Comprobación inmediata, sin timeout
+        if botones and botones[0].is_displayed():
+            try:
+                botones[0].click()
+                aceptado = True
+            except WebDriverException as e:
+                logging.error(f"No se pudo cerrar el aviso de cookies: {str(e)}")
+    if aceptado:
+        with _lock_consentimiento:
+            _con_consentimiento.add(driver)
+    return aceptado
+
+
+# Función para abrir una página y dejarla lista para extraer
+def abrir_pagina(driver, url, espera=10):
+    """
+    Espera a que el host no esté en pausa (fallos.py) y el turno del planificador, carga la URL, lanza
+    PaginaBloqueada si la web devuelve la página de bloqueo, espera a '#App' y acepta las cookies si hace falta.
+    """
+    planificador = obtener_planificador()
+    cortacircuitos = obtener_cortacircuitos()
+    metricas = obtener_metricas()
+    cortacircuitos.esperar(url)  # Host en pausa tras varios bloqueos seguidos
+    try:
+        with metricas.tramo('espera_turno'):
+            planificador.esperar_turno(url)
+        with metricas.tramo('get'):
+            driver.get(str(url))
+        metricas.contar('paginas')
+
+        # Verificar si la página está bloqueada
+        with metricas.tramo('comprobar_bloqueo'):
+            bloqueada = bool(driver.find_elements(By.XPATH, '//html/body/div/h1'))
+    except BaseException:
+        cortacircuitos.liberar(url)  # Si era la petición de prueba, dejar pasar otra
+        raise
+    if bloqueada:
+        metricas.contar('bloqueos')
+        planificador.registrar_bloqueo(url)  # Reducir el ritmo de peticiones al host
+        cortacircuitos.registrar_bloqueo(url)  # Pausar el host si los bloqueos se repiten
+        raise PaginaBloqueada(url)
+    planificador.registrar_exito(url)
+    cortacircuitos.registrar_exito(url)
+
+    # Esperar a que cargue la página
+    with metricas.tramo('espera_app'):
+        WebDriverWait(driver, espera).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
+
+    # Aceptar las cookies si el aviso está en la página (una sola vez por sesión)
+    with metricas.tramo('cookies'):
+        aceptar_cookies(driver)
+
+# Función para hacer scroll hasta que se cumpla una condición
+def scroll_hasta(driver, selectores=(), minimo=1, estable_ms=configuracion.DOM_ESTABLE_MS,
+                 intervalo=configuracion.INTERVALO_SCROLL, limite=configuracion.LIMITE_SCROLL_SEGUNDOS):
+    """
+    Baja por la página hasta que cada selector tenga 'minimo' elementos o, sin selectores (o si no
+    llegan), hasta el final con el DOM estable. Devuelve True si se cumplió la condición de los selectores.
+    """
+    selectores = [selector for selector in selectores if selector.get('xpath') or selector.get('css')]
+    fin = time.monotonic() + limite
+    while True:
+        estado = driver.execute_script(SCRIPT_SCROLL, selectores)
+        if selectores and all(n >= minimo for n in estado['elementos']):
+            return True
+        if estado['final'] and estado['quieto_ms'] >= estable_ms:
+            return False
+        if time.monotonic() >= fin:
+            return False
+        time.sleep(intervalo)
+
+# Función para cargar los artículos de una página de resultados
+def cargar_articulos(driver, contador):
+    """Scroll hasta que la página muestra los anuncios que le corresponden según el contador."""
+    return scroll_hasta(driver, [ARTICULOS_BUSQUEDA], minimo=min(contador, configuracion.ANUNCIOS_POR_PAGINA))
@@ -0,0 +1,93 @@
+"""
+Normalización vectorizada de los valores extraídos de los anuncios.
+
+FUNCIONAMIENTO:
+Los campos se extraen tal como aparecen en la página ("250.000 €", "85 m²", "3 habs.", "2ª planta", "E").
+normalizar_anuncios() recibe un DataFrame (o una lista de registros) y añade columnas numéricas:
+- precio_eur: precio en euros.
+- superficie_m2: superficie en metros cuadrados.
+- habitaciones: número de dormitorios.
+- planta_num: planta como entero (bajo y entresuelo = 0, sótano = -1).
+- certificado_letra: letra del certificado energético (A-G).
+
+Todas las conversiones usan operaciones de cadena de pandas sobre la columna completa. Como los valores
+se repiten mucho (habitaciones, plantas, certificados...), cada columna se convierte a categórica y solo
+se procesan sus valores distintos.
+
+Los valores que no se pueden interpretar no se descartan: quedan a NaN y se marcan en la columna
+'<columna>_invalido' (los 'No disponible' y vacíos no cuentan como inválidos).
+
+USO:
+    df = normalizar_anuncios(pd.read_csv('datos/anuncios.csv').rename(columns=...))
+"""
+
+import numpy as np
+import pandas as pd
+from campos_anuncio import NO_DISPONIBLE
+
+# Patrón de un número con separador de miles '.' y decimales ','
+PATRON_NUMERO = r'(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?)'
+
+# Plantas que no se escriben con número
+PLANTAS_TEXTO = {
+    'bajo': 0, 'baja': 0, 'planta baja': 0, 'entresuelo': 0, 'entreplanta': 0,
+    'principal': 1, 'sótano': -1, 'sotano': -1, 'semisótano': -1, 'semisotano': -1,
+}
+
+
+# Función para aplicar una conversión a los valores distintos de una columna
+def _por_categorias(serie, conversion):
+    """Aplica conversion() a las categorías de la serie y reparte el resultado a todas las filas."""
+    categorica = pd.Categorical(serie)
+    convertidas = conversion(pd.Series(categorica.categories, dtype='string')).to_numpy(dtype='float64', na_value=np.nan)
+    valores = np.full(len(categorica), np.nan)
+    codigos = categorica.codes
+    presentes = codigos >= 0
+    valores[presentes] = convertidas[codigos[presentes]]
+    return pd.Series(valores, index=serie.index)
+
+# Función para convertir cadenas con número a float
+def _numero(textos):
+    numero = textos.str.extract(PATRON_NUMERO, expand=False)
+    numero = numero.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(numero, errors='coerce')
+
+# Función para convertir la planta a entero
+def _planta(textos):
+    minusculas = textos.str.strip().str.lower()
+    numero = pd.to_numeric(minusculas.str.extract(r'(-?\d+)', expand=False), errors='coerce')
+    por_texto = minusculas.str.replace(r'\s*planta$', '', regex=True).map(PLANTAS_TEXTO)
+    por_texto = por_texto.where(por_texto.notna(), minusculas.map(PLANTAS_TEXTO))
+    return numero.fillna(por_texto.astype('float64'))
+
+# Función para extraer la letra del certificado energético
+def _letra_certificado(textos):
+    letra = textos.str.upper().str.extract(r'\b([A-G])\b', expand=False)
+    return letra.map({l: float(i) for i, l in enumerate('ABCDEFG')})
+
+# Función para saber qué valores faltan en origen
+def _ausente(textos):
+    textos = textos.str.strip()
+    return (textos.isna() | (textos == '') | (textos == NO_DISPONIBLE)).astype('float64')
+
+# Función para normalizar una columna y marcar los valores inválidos
+def _normalizar_columna(df, origen, destino, conversion):
+    valores = _por_categorias(df[origen], conversion)
+    df[destino] = valores
+    ausente = _por_categorias(df[origen], _ausente).fillna(1.0).astype(bool)  # Nulos en origen: ausentes
+    df[f'{destino}_invalido'] = valores.isna() & ~ausente
+
+# Función para normalizar un lote de anuncios
+def normalizar_anuncios(anuncios):
+    """Añade las columnas numéricas normalizadas y sus marcas de valor inválido."""
+    df = anuncios.copy() if isinstance(anuncios, pd.DataFrame) else pd.DataFrame(anuncios)
+    _normalizar_columna(df, 'precio', 'precio_eur', _numero)
+    _normalizar_columna(df, 'area', 'superficie_m2', _numero)
+    _normalizar_columna(df, 'dormitorios', 'habitaciones', _numero)
+    _normalizar_columna(df, 'planta', 'planta_num', _planta)
+    _normalizar_columna(df, 'certificado_energetico', 'certificado_letra', _letra_certificado)
+    df['habitaciones'] = df['habitaciones'].round().astype('Int64')
+    df['planta_num'] = df['planta_num'].round().astype('Int64')
+    indices = df['certificado_letra'].astype('Int64')
+    df['certificado_letra'] = pd.Categorical.from_codes(indices.fillna(-1).astype(int), categories=list('ABCDEFG'))
+    return df
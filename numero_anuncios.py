@@ -3,104 +3,179 @@ Este script utiliza Selenium para automatizar la navegación en sitios web y rec
 
 FUNCIONAMIENTO:
 1. Lee un archivo CSV ('start_urls.csv') que contiene las URLs de inicio.
-2. Para cada URL:
-   - Inicializa un navegador Chrome en modo incógnito con opciones para evitar detección.
-   - Usa agentes de usuario aleatorios para reducir el riesgo de bloqueo.
-   - Accede a la página y espera aleatoriamente para imitar el comportamiento humano.
-   - Verifica si la página está bloqueada y detiene el proceso si es necesario.
-   - Espera a que la página cargue completamente y cierra pop-ups si aparecen.
-   - Hace scroll hasta el final de la página para cargar todos los anuncios.
-   - Extrae y cuenta el número de anuncios presentes en la página.
-3. Al final, muestra el total de anuncios encontrados y cierra el navegador.
+2. Para cada código postal reutiliza el último contador leído si tiene menos de TTL_CONTADORES_HORAS
+   ('datos/contadores.json'), así que repetir la consulta es instantáneo.
+3. Los contadores que faltan se leen en paralelo, solo el contador y sin hacer scroll:
+   - Con MODO_FETCH='http' primero por HTTP (fetch_http.py), todas las búsquedas a la vez.
+   - El resto se reparte entre un pool de navegadores Chrome ya arrancados (pool_drivers.py), en modo
+     incógnito, con opciones para evitar detección y agentes de usuario aleatorios. Para cada URL:
+     - Espera su turno en el planificador central (planificador.py) y accede a la página.
+     - Verifica si la página está bloqueada; las que fallan se reintentan con espera creciente (fallos.py).
+     - Espera a que la página cargue y acepta las cookies solo si el aviso está presente.
+     - Lee el contador de anuncios de la cabecera (XPATH_CONTADOR de campos_anuncio.py) y lo convierte
+       a número. Solo cuenta 0 si la página muestra el aviso de búsqueda sin resultados; si no aparece
+       ninguno de los dos la URL se reintenta y no se guarda en la caché.
+4. Muestra y guarda en 'datos/contadores.csv' una tabla por código postal con el contador, las páginas
+   de resultados, las que permite robots.txt, los anuncios alcanzables y el trabajador asignado
+   (repartiendo los anuncios alcanzables entre los trabajadores indicados), y el total.
 
 USO:
+    python numero_anuncios.py [trabajadores]
+
 Este script es útil para realizar web scraping en Fotocasa de manera automatizada, minimizando la detección y bloqueos.
-Finalmente nos proporciona el número de anuncios encontrados en cada una de las URLs de inicio.
+Finalmente nos proporciona el número de anuncios encontrados en cada una de las URLs de inicio y permite
+planificar y repartir el rastreo completo entre varias máquinas (coordinador.py).
 """
 
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from time import sleep
-import random
+from pool_drivers import PoolDrivers, PaginaBloqueada
+from fallos import mapear_con_reintentos
+from validar_urls import obtener_politica
+from navegacion import abrir_pagina
+from campos_anuncio import XPATH_CONTADOR, XPATH_SIN_RESULTADOS, leer_contador
+from fetch_http import obtener_busquedas
+from links_anuncios import paginas_busqueda
+from metricas import obtener_metricas
+import datetime
+import json
+import os
+import sys
 import pandas as pd
+import configuracion
 
-# Función para evitar bloqueos
-def esperar_aleatoriamente(min_seg=5, max_seg=15):
-    tiempo = random.randint(min_seg, max_seg)
-    sleep(tiempo)
-
-# Leer el archivo de csv
-pd.set_option('display.max_colwidth', None)
-df = pd.read_csv('datos/start_urls.csv', header=None)[0]
-numero = 0
-for website in df:
+# Función para contar los anuncios de una URL de inicio
+def contar_anuncios(driver, website):
+    """
+    Devuelve el contador de anuncios que muestra la página de búsqueda, como número y sin hacer scroll.
+    Devuelve 0 solo si la página muestra el aviso de búsqueda sin resultados; si no aparece ni el
+    contador ni el aviso lanza TimeoutException, para que fallos.py reintente la URL sin guardarla.
+    """
     print(website)
-    # Inicializar el driver
-    options = Options()
-    options.add_argument('--incognito')
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    service = Service('chromedriver/chromedriver.exe')
-    # Rotar agentes de usuario para evitar detección
-    user_agents = [
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-    ]
-    options.add_argument(f'user-agent={random.choice(user_agents)}')
-    # Inicializar el driver
-    driver = webdriver.Chrome(service=service, options=options)
-
-    # Ingresar a la pagina
-    driver.get(str(website))
-    esperar_aleatoriamente()
-    driver.maximize_window() # Maximizar la ventana
-
-    # Verificar si la pagina esta bloqueada
-    bloqueo = driver.find_elements(By.XPATH, '//html/body/div/h1') if driver.find_elements(By.XPATH, '//html/body/div/h1') else 0
-    if bloqueo != 0:
-        print("Pagina bloqueada")
-        driver.quit()
-        break
-
-    # Esperar a que cargue la pagina
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*[@id="App"]')))
-    
-    # Espera a que el popup sea visible y cierra el popup
-    try:
-        close_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-agree-button"]'))
-        )
-        close_button.click()
-    except Exception as e:
-        print("No se pudo cerrar el popup:", e)
-
-    # Hacer scroll hasta el final de la pagina
-    height = driver.execute_script("return Math.max( document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight );")
-    for e in range(0, height, 700):
-        driver.execute_script('window.scrollTo(0, {});'.format(e))
-        esperar_aleatoriamente(1, 5) # Esperar a que cargue la pagina
-
-    # Obtener el numero de anuncios en la pagina  
-    nauncios = driver.find_elements(By.XPATH, '//*[@id="App"]/div[1]/div[3]/div/main/div/div[2]/div/h2') if driver.find_elements(By.XPATH, '//*[@id="App"]/div[1]/div[3]/div/main/div/div[2]/div/h2') else 0
-    
-    if nauncios == 0:
-        counter = 0
-    else:
-        for n in nauncios:
-            counter = n.text.split(" ")[0]
+
+    # Esperar el turno, ingresar a la pagina, comprobar el bloqueo y aceptar las cookies
+    abrir_pagina(driver, website)
+
+    # Leer solo el contador de la cabecera (o el aviso de búsqueda sin resultados)
+    with obtener_metricas().tramo('contador'):
+        WebDriverWait(driver, configuracion.ESPERA_CONTADOR).until(EC.any_of(
+            EC.presence_of_element_located((By.XPATH, XPATH_CONTADOR)),
+            EC.presence_of_element_located((By.XPATH, XPATH_SIN_RESULTADOS))))
+    contadores = driver.find_elements(By.XPATH, XPATH_CONTADOR)
+    counter = leer_contador(contadores[-1].text) if contadores else 0
     print(counter)
-    esperar_aleatoriamente()
+    return counter
+
+# Función para leer la caché de contadores
+def leer_cache(ruta=configuracion.RUTA_CACHE_CONTADORES):
+    """{código postal: {'website', 'contador', 'fecha'}} de la ejecución anterior."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+# Función para guardar la caché de contadores
+def guardar_cache(cache, ruta=configuracion.RUTA_CACHE_CONTADORES):
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(temporal, ruta)
+
+# Función para saber si un contador de la caché sigue vigente
+def vigente(entrada, website, ttl_horas=configuracion.TTL_CONTADORES_HORAS):
+    if not entrada or entrada.get('website') != website:
+        return False
+    edad = datetime.datetime.now() - datetime.datetime.fromisoformat(entrada['fecha'])
+    return edad < datetime.timedelta(hours=ttl_horas)
+
+# Función para obtener los contadores de las URLs de inicio
+def contar_busquedas(websites, ttl_horas=configuracion.TTL_CONTADORES_HORAS, ruta_cache=configuracion.RUTA_CACHE_CONTADORES):
+    """Devuelve {código postal: {'website', 'contador', 'fecha'}}, leyendo solo los que no están vigentes en la caché."""
+    cache = leer_cache(ruta_cache)
+    pendientes = [website for website in websites if not vigente(cache.get(website.split("zipCode=")[1]), website, ttl_horas)]
+    print(f"{len(websites) - len(pendientes)} contadores en caché, {len(pendientes)} por consultar")
+
+    def anotar(website, contador):
+        cache[website.split("zipCode=")[1]] = {'website': website, 'contador': contador,
+                                               'fecha': datetime.datetime.now().isoformat(timespec='seconds')}
+
+    try:
+        # Modo HTTP: leer los contadores sin navegador y dejar para Selenium solo los que no se puedan
+        if configuracion.MODO_FETCH == 'http' and pendientes:
+            restantes = []
+            for website, resultado in obtener_busquedas(pendientes):
+                if resultado is None:
+                    restantes.append(website)
+                else:
+                    anotar(website, resultado[0])
+            pendientes = restantes
+
+        # Repartir las URLs entre las sesiones del pool
+        if pendientes:
+            with PoolDrivers() as pool:
+                try:
+                    for website, contador in mapear_con_reintentos(pool, contar_anuncios, pendientes, 'contadores'):
+                        anotar(website, contador)
+                except PaginaBloqueada as e:  # CircuitoAbierto: el host sigue bloqueado tras varias pausas
+                    print("Pagina bloqueada:", e)
+    finally:
+        guardar_cache(cache, ruta_cache)  # Guardar también los contadores leídos antes de un bloqueo
+    return {website.split("zipCode=")[1]: cache[website.split("zipCode=")[1]]
+            for website in websites if website.split("zipCode=")[1] in cache}
+
+# Función para planificar el rastreo a partir de los contadores
+def planificar(contadores, trabajadores=1):
+    """
+    DataFrame por código postal con el contador, las páginas de resultados (todas y las permitidas por
+    robots.txt), los anuncios alcanzables y el trabajador asignado. Los códigos postales se reparten de
+    mayor a menor al trabajador con menos anuncios alcanzables asignados.
+    """
+    politica = obtener_politica()
+    filas = []
+    for cd_postal, entrada in contadores.items():
+        paginas = paginas_busqueda(entrada['website'], entrada['contador']) if entrada['contador'] else []
+        permitidas = politica.filtrar(paginas)
+        filas.append({
+            'codigo_postal': cd_postal, 'contador': entrada['contador'], 'paginas': len(paginas),
+            'paginas_permitidas': len(permitidas),
+            'anuncios_alcanzables': min(entrada['contador'], len(permitidas) * configuracion.ANUNCIOS_POR_PAGINA),
+            'fecha': entrada['fecha'], 'website': entrada['website'],
+        })
+    columnas = ['codigo_postal', 'contador', 'paginas', 'paginas_permitidas', 'anuncios_alcanzables', 'trabajador', 'fecha', 'website']
+    df = pd.DataFrame(filas, columns=[c for c in columnas if c != 'trabajador'])
+    df = df.sort_values('anuncios_alcanzables', ascending=False, kind='stable').reset_index(drop=True)
+    cargas = [0] * max(1, trabajadores)
+    asignados = []
+    for anuncios in df['anuncios_alcanzables']:
+        trabajador = cargas.index(min(cargas))
+        cargas[trabajador] += anuncios
+        asignados.append(trabajador + 1)
+    df['trabajador'] = asignados
+    return df[columnas]
+
+def main():
+    # Leer el archivo de csv
+    pd.set_option('display.max_colwidth', None)
+    trabajadores = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    df = pd.read_csv('datos/start_urls.csv', header=None)[0]
+    websites = obtener_politica().filtrar(df)  # Descartar las URLs que robots.txt no permite
+
+    # Contadores por código postal (caché o consulta en paralelo)
+    contadores = contar_busquedas(websites)
 
-    numero += counter
+    # Tabla por código postal para planificar el rastreo
+    plan = planificar(contadores, trabajadores)
+    plan.to_csv(configuracion.RUTA_CONTADORES_CSV, index=False)
+    print(plan.drop(columns=['website']).to_string(index=False))
+    if trabajadores > 1:
+        print(plan.groupby('trabajador')['anuncios_alcanzables'].sum().to_string())
 
-print("Total de anuncios en fotocasa:", numero)
+    print("Total de anuncios en fotocasa:", int(plan['contador'].sum()))
+    print("Anuncios alcanzables según robots.txt:", int(plan['anuncios_alcanzables'].sum()))
+    obtener_metricas().imprimir_resumen()
 
-# Cerar el driver
-driver.quit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
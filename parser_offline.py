@@ -0,0 +1,146 @@
+"""
+Este script repite la extracción de datos sobre el HTML guardado de los anuncios, sin abrir el navegador.
+
+FUNCIONAMIENTO:
+1. anuncios_v2.py guarda (si GUARDAR_HTML está activado) el driver.page_source de cada anuncio en
+   'datos/html', con una primera línea de metadatos (URL, código postal y fecha de captura).
+2. Este script recorre ese directorio y reparte los archivos entre un pool de procesos.
+3. Cada proceso aplica las mismas definiciones de CAMPOS_ANUNCIO (campos_anuncio.py) usando
+   XPaths de lxml compilados una sola vez por proceso.
+4. Los registros resultantes tienen el mismo esquema que obtener_datos_anuncio y se guardan en un CSV.
+
+También puede leer las fichas del archivo de páginas (archivo_paginas.py) con parsear_archivo_paginas(), que
+devuelve los registros por lotes.
+
+USO:
+    python parser_offline.py [directorio_html] [archivo_salida.csv]
+
+Permite corregir un selector y volver a extraer miles de anuncios en segundos sin volver a rastrear la web.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree, html
+from campos_anuncio import CAMPOS_ANUNCIO, COLUMNAS_ANUNCIO, NO_DISPONIBLE, construir_registro, referencia_anuncio
+from archivo_paginas import ArchivoPaginas
+import datetime
+import itertools
+import json
+import os
+import sys
+import pandas as pd
+import configuracion
+
+PREFIJO_METADATOS = '<!-- inmoscraper: '
+SUFIJO_METADATOS = ' -->\n'
+
+# Función para guardar el HTML de un anuncio
+def guardar_html(page_source, url, cd_postal, fecha, directorio=configuracion.DIR_HTML):
+    """Guarda el HTML con una primera línea de metadatos y devuelve la ruta del archivo."""
+    os.makedirs(directorio, exist_ok=True)
+    metadatos = json.dumps({'url': url, 'codigo_postal': cd_postal, 'fecha': fecha})
+    fecha_archivo = '-'.join(reversed(fecha.split('-')))  # dd-mm-aaaa -> aaaa-mm-dd para ordenar por nombre
+    ruta = os.path.join(directorio, f"{fecha_archivo}_{referencia_anuncio(url)}.html")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(PREFIJO_METADATOS + metadatos + SUFIJO_METADATOS)
+        f.write(page_source)
+    return ruta
+
+# Función para separar los metadatos del HTML guardado
+def leer_html(ruta):
+    """Devuelve (metadatos, html) de un archivo guardado con guardar_html."""
+    with open(ruta, encoding='utf-8') as f:
+        primera = f.readline()
+        contenido = f.read()
+    if not primera.startswith(PREFIJO_METADATOS):
+        raise ValueError(f"{ruta} no tiene metadatos de captura")
+    return json.loads(primera[len(PREFIJO_METADATOS):-len(SUFIJO_METADATOS)]), contenido
+
+# Función para compilar los selectores de los campos
+def compilar_campos(campos=CAMPOS_ANUNCIO):
+    """Compila una sola vez los XPaths (y selectores CSS) de cada campo."""
+    compilados = {}
+    for nombre, campo in campos.items():
+        if campo.get('xpath'):
+            compilados[nombre] = etree.XPath(campo['xpath'])
+        elif campo.get('css'):
+            from lxml.cssselect import CSSSelector  # Solo hace falta si algún campo usa CSS
+            compilados[nombre] = CSSSelector(campo['css'])
+        else:
+            compilados[nombre] = None
+    return compilados
+
+# XPaths compilados al importar el módulo, una vez por proceso
+XPATHS_CAMPOS = compilar_campos()
+
+# Función para extraer los campos de un documento HTML
+def extraer_campos_html(documento, campos=CAMPOS_ANUNCIO, compilados=None):
+    """Equivalente offline de campos_anuncio.extraer_campos sobre un árbol de lxml."""
+    compilados = compilados or XPATHS_CAMPOS
+    valores = {}
+    for nombre, campo in campos.items():
+        selector = compilados[nombre]
+        elementos = selector(documento) if selector is not None else []
+        valor = None
+        if elementos:
+            elemento = elementos[0]
+            if campo.get('atributo'):
+                valor = elemento.get(campo['atributo'])
+            else:
+                valor = ' '.join(''.join(elemento.itertext()).split())  # Texto visible con espacios normalizados
+        valores[nombre] = valor if valor is not None else campo.get('defecto', NO_DISPONIBLE)
+    return valores
+
+# Función para procesar un archivo HTML guardado
+def parsear_archivo(ruta):
+    """Devuelve el registro del anuncio guardado en ruta, o None si no se puede procesar."""
+    try:
+        metadatos, contenido = leer_html(ruta)
+        documento = html.document_fromstring(contenido)
+        campos = extraer_campos_html(documento)
+        return construir_registro(campos, metadatos['url'], metadatos['codigo_postal'], metadatos['fecha'])
+    except (ValueError, etree.ParserError) as e:
+        print(f"No se pudo procesar {ruta}: {e}")
+        return None
+
+# Función para procesar una captura del archivo de páginas
+def parsear_captura(captura, contenido):
+    """Devuelve el registro de una captura de ArchivoPaginas, o None si no se puede procesar."""
+    try:
+        documento = html.document_fromstring(contenido)
+        fecha = datetime.date.fromisoformat(captura['fecha']).strftime('%d-%m-%Y')
+        return construir_registro(extraer_campos_html(documento), captura['url'], captura['codigo_postal'], fecha)
+    except (ValueError, etree.ParserError) as e:
+        print(f"No se pudo procesar {captura['url']}: {e}")
+        return None
+
+# Función para procesar las fichas del archivo de páginas en un rango de fechas
+def parsear_archivo_paginas(desde=None, hasta=None, procesos=None, lote=256):
+    """
+    Genera, lote a lote, las listas de registros de las fichas archivadas entre dos fechas; solo hay
+    'lote' capturas en memoria a la vez.
+    """
+    capturas = ArchivoPaginas().iterar(desde, hasta, tipo='anuncio')
+    with ProcessPoolExecutor(max_workers=procesos) as executor:
+        while True:
+            bloque = list(itertools.islice(capturas, lote))
+            if not bloque:
+                break
+            yield [registro for registro in executor.map(parsear_captura, *zip(*bloque)) if registro]
+
+# Función para procesar todos los archivos de un directorio
+def parsear_directorio(directorio=configuracion.DIR_HTML, procesos=None):
+    """Extrae los registros de todos los HTML del directorio repartiéndolos entre procesos."""
+    rutas = sorted(os.path.join(directorio, nombre) for nombre in os.listdir(directorio) if nombre.endswith('.html'))
+    with ProcessPoolExecutor(max_workers=procesos) as executor:
+        registros = executor.map(parsear_archivo, rutas, chunksize=64)
+        return [registro for registro in registros if registro]
+
+def main():
+    directorio = sys.argv[1] if len(sys.argv) > 1 else configuracion.DIR_HTML
+    salida = sys.argv[2] if len(sys.argv) > 2 else 'datos/anuncios_offline.csv'
+    registros = parsear_directorio(directorio)
+    pd.DataFrame(registros, columns=COLUMNAS_ANUNCIO).to_csv(salida, index=False)
+    print(f"Se procesaron {len(registros)} anuncios desde {directorio}")
+
+if __name__ == "__main__":
+    main()
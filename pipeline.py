@@ -0,0 +1,219 @@
+"""
+Pipeline por etapas: búsquedas -> páginas de resultados -> anuncios, conectadas por una cola persistente.
+
+FUNCIONAMIENTO:
+1. Las URLs de 'start_urls.csv' permitidas por robots.txt se encolan en la etapa 'busquedas'.
+2. Cada etapa tiene sus propios hilos de trabajo (TRABAJADORES_ETAPA) que comparten un pool de
+   navegadores (pool_drivers.py) y toman tareas de su cola (cola.py):
+   - 'busquedas': abre la primera página de la búsqueda, lee el contador, encola el resto de páginas
+     en 'paginas' y publica los links de la primera página.
+   - 'paginas': abre cada página de resultados y publica sus links.
+   - 'anuncios': extrae cada ficha (procesar_anuncio de anuncios_v2.py) y la pasa al escritor.
+   Publicar los links es guardarlos en 'links_anuncios.csv' (como links_anuncios.py), registrar la
+   huella de su tarjeta y encolar en 'anuncios' los que no están vigentes en el índice de vistos ni
+   tienen la misma tarjeta que cuando se extrajeron, así que la extracción de anuncios empieza en
+   cuanto aparecen los links del primer código postal.
+3. Contrapresión: las etapas de búsqueda esperan mientras haya más de MAX_ANUNCIOS_EN_COLA anuncios
+   pendientes, para no adelantarse demasiado a la extracción.
+4. Un fallo no detiene el pipeline: se clasifica (fallos.py) y la tarea vuelve a la cola tras una
+   espera que depende de la clase de fallo y crece con cada intento; las que agotan sus intentos se
+   anotan en 'datos/fallidos.jsonl'. Si el host se bloquea varias veces seguidas, abrir_pagina lo pausa
+   y lo reanuda solo; el pipeline solo para si sigue bloqueado después de APERTURAS_CIRCUITO pausas.
+5. Una tarea de anuncio solo se da por hecha cuando su registro se ha volcado al almacenamiento
+   (y, con HISTORIAL_PRECIOS, registrado en el historial de precios de historial_precios.py).
+   Si la ejecución se interrumpe (o el host sigue bloqueado), la siguiente ejecución de
+   pipeline.py continúa con las tareas que quedaron en la cola.
+6. Las tareas tomadas quedan alquiladas al trabajador, que renueva los alquileres cada
+   INTERVALO_LATIDO segundos. La misma clase Pipeline hace de trabajador remoto en coordinador.py.
+
+USO:
+    python pipeline.py
+
+El tiempo desde el arranque hasta el primer anuncio guardado pasa a ser el de una búsqueda y una ficha,
+en lugar del de recorrer antes todas las búsquedas.
+"""
+
+from pool_drivers import PoolDrivers
+from fallos import CircuitoAbierto, EstructuraAusente, clasificar
+from links_anuncios import obtener_links, guardar_links, paginas_busqueda
+from anuncios_v2 import procesar_anuncio
+from campos_anuncio import referencia_anuncio
+from validar_urls import obtener_politica
+from archivo_paginas import ArchivoPaginas
+from indice_vistos import IndiceVistos, hash_registro
+from historial_precios import HistorialPrecios
+from escritor_anuncios import EscritorAnuncios
+from cola import ColaPersistente, PENDIENTE
+from metricas import obtener_metricas
+import logging
+import threading
+import time
+import pandas as pd
+import configuracion
+
+# Etapas del pipeline y etapas de las que recibe tareas cada una
+ETAPAS = {'busquedas': [], 'paginas': ['busquedas'], 'anuncios': ['busquedas', 'paginas']}
+
+
+class Pipeline:
+    """Ejecuta las etapas en paralelo sobre la cola persistente."""
+
+    def __init__(self, cola, indice, archivo=None, trabajadores=configuracion.TRABAJADORES_ETAPA, trabajador='local',
+                 guardar=None, ruta_checkpoint=configuracion.RUTA_CHECKPOINT_PIPELINE, historial=None):
+        self.cola = cola
+        self.indice = indice  # Sin índice local, la cola (que guarda los resultados) dice qué anuncios están vigentes
+        self.historial = historial  # Historial de precios donde se registran los anuncios guardados
+        self.trabajador = trabajador  # Nombre con el que se alquilan las tareas
+        self.escritor = EscritorAnuncios(ruta_checkpoint=ruta_checkpoint, al_volcar=self.marcar_guardados, guardar=guardar)
+        self.archivo = archivo
+        self.trabajadores = trabajadores
+        self.politica = obtener_politica()
+        self.parar = threading.Event()  # Se activa si el host sigue bloqueado tras varias pausas
+        self._terminadas = {etapa: threading.Event() for etapa in ETAPAS}
+        self._pool = None
+
+    def publicar_links(self, website, tarjetas):
+        """Guarda los links en el CSV y encola los anuncios nuevos, caducados o con cambios en la tarjeta."""
+        if not tarjetas:
+            return
+        vistos = self.indice or self.cola
+        tarjetas = guardar_links(website, tarjetas, vistos)
+        cd_postal = website.split("zipCode=")[1]
+        referencias = {referencia_anuncio(tarjeta['href']): tarjeta['href'] for tarjeta in tarjetas}
+        omitir = vistos.vigentes(referencias) | vistos.sin_cambios(referencias)
+        nuevos = self.cola.poner_varias('anuncios', [(referencia, [cd_postal, link]) for referencia, link in referencias.items()
+                                                     if referencia not in omitir])
+        print(f"{nuevos} anuncios encolados de {website}")
+
+    def _busqueda(self, driver, website):
+        counter, tarjetas = obtener_links(driver, website, self.archivo)
+        paginas = paginas_busqueda(website, counter, politica=self.politica)[1:]
+        self.cola.poner_varias('paginas', [(pagina, pagina) for pagina in paginas])
+        self.publicar_links(website, tarjetas)
+
+    def _pagina(self, driver, pagina):
+        _, tarjetas = obtener_links(driver, pagina, self.archivo)
+        self.publicar_links(pagina, tarjetas)
+
+    def _anuncio(self, driver, link):
+        datos = procesar_anuncio(driver, link, self.archivo)
+        if datos is None:
+            raise EstructuraAusente(f"No se pudieron extraer los datos de {link[1]}")
+        self.escritor.escribir(datos)  # La tarea se completa al volcar (marcar_guardados)
+
+    def marcar_guardados(self, registros):
+        """Callback del escritor: marcar en el índice, registrar en el historial y completar en la cola los anuncios ya guardados."""
+        if self.indice:
+            for datos in registros:
+                self.indice.marcar(datos['referencia'], hash_registro(datos))
+        if self.historial:
+            self.historial.registrar(registros)
+        self.cola.completar('anuncios', [datos['referencia'] for datos in registros])
+
+    def _sin_trabajo(self, etapa):
+        """True si las etapas anteriores han terminado y la cola de la etapa está vacía."""
+        return all(self._terminadas[anterior].is_set() for anterior in ETAPAS[etapa]) and self.cola.contar(etapa) == 0
+
+    def _trabajador(self, etapa):
+        """Bucle de un hilo de la etapa: toma tareas hasta que no queda trabajo o hay que parar."""
+        funcion = {'busquedas': self._busqueda, 'paginas': self._pagina, 'anuncios': self._anuncio}[etapa]
+        while not self.parar.is_set():
+            # Contrapresión: no generar más anuncios mientras la extracción va por detrás
+            if etapa != 'anuncios' and self.cola.contar('anuncios', (PENDIENTE,)) >= configuracion.MAX_ANUNCIOS_EN_COLA:
+                time.sleep(configuracion.ESPERA_COLA_VACIA)
+                continue
+            tareas = self.cola.tomar(etapa, 1, self.trabajador)
+            if not tareas:
+                if etapa == 'anuncios':
+                    self.escritor.volcar()  # Sin trabajo: guardar lo pendiente para completar sus tareas
+                if self._sin_trabajo(etapa):
+                    return
+                time.sleep(configuracion.ESPERA_COLA_VACIA)
+                continue
+            clave, carga = tareas[0]
+            try:
+                with self._pool.driver() as driver:
+                    funcion(driver, carga)
+                if etapa != 'anuncios':
+                    self.cola.completar(etapa, [clave])
+            except CircuitoAbierto as e:  # El host sigue bloqueado tras varias pausas: parar hasta la siguiente ejecución
+                print("Página bloqueada:", e)
+                self.cola.liberar(etapa, [clave])
+                self.parar.set()
+            except Exception as e:
+                # Bloqueos, timeouts, fichas sin datos, navegador caído o red: la tarea vuelve tras la espera de su clase
+                clase = clasificar(e)
+                logging.error(f"Error '{clase}' en la etapa {etapa} con {clave}: {str(e)}")
+                obtener_metricas().contar('fallos', clase=clase)
+                self.cola.fallar(etapa, [clave], clase, f"{type(e).__name__}: {str(e)}"[:500])
+
+    def _etapa(self, etapa):
+        """Arranca los hilos de la etapa y marca la etapa como terminada cuando acaban todos."""
+        hilos = [threading.Thread(target=self._trabajador, args=(etapa,), name=f'{etapa}-{i}')
+                 for i in range(self.trabajadores[etapa])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self._terminadas[etapa].set()
+
+    def _latidos(self, terminado):
+        """Renueva los alquileres de las tareas del trabajador hasta que termina la ejecución."""
+        while not terminado.wait(configuracion.INTERVALO_LATIDO):
+            try:
+                self.cola.latido(self.trabajador)
+            except Exception as e:  # Coordinador caído: se reintenta en el siguiente latido
+                logging.error(f"No se pudieron renovar los alquileres de {self.trabajador}: {str(e)}")
+
+    def ejecutar(self):
+        """Ejecuta todas las etapas hasta vaciar las colas o dar el host por bloqueado; devuelve True si ha terminado."""
+        terminado = threading.Event()
+        threading.Thread(target=self._latidos, args=(terminado,), daemon=True).start()
+        self._pool = PoolDrivers(tamano=sum(self.trabajadores[etapa] for etapa in ETAPAS))
+        try:
+            with self._pool:
+                etapas = [threading.Thread(target=self._etapa, args=(etapa,)) for etapa in ETAPAS]
+                for hilo in etapas:
+                    hilo.start()
+                for hilo in etapas:
+                    hilo.join()
+        finally:
+            terminado.set()
+        return not self.parar.is_set()
+
+# Función para encolar las búsquedas iniciales
+def sembrar(cola, ruta='datos/start_urls.csv'):
+    """Encola las URLs de inicio permitidas por robots.txt, una tarea por código postal."""
+    df = pd.read_csv(ruta, header=None)[0]
+    websites = obtener_politica().filtrar(df)  # Descartar las URLs que robots.txt no permite
+    nuevas = cola.poner_varias('busquedas', [(website.split("zipCode=")[1], website) for website in websites])
+    print(f"{nuevas} búsquedas encoladas")
+    return nuevas
+
+def main():
+    cola = ColaPersistente()
+    if any(cola.contar(etapa) for etapa in ETAPAS):
+        # Ejecución anterior sin terminar: seguir con las tareas de la cola
+        print(f"Reanudando el pipeline: {cola.reanudar()} tareas en curso vuelven a la cola, {cola.resumen()}")
+    else:
+        cola.vaciar()
+        sembrar(cola)
+
+    indice = IndiceVistos()
+    archivo = ArchivoPaginas() if configuracion.ARCHIVAR_PAGINAS else None
+    historial = HistorialPrecios() if configuracion.HISTORIAL_PRECIOS else None
+    pipeline = Pipeline(cola, indice, archivo, historial=historial)
+    completo = False
+    try:
+        completo = pipeline.ejecutar()
+    finally:
+        pipeline.escritor.terminar(completo)
+        print("Estado de las colas:", cola.resumen())
+        obtener_metricas().imprimir_resumen()
+        cola.cerrar()
+        indice.cerrar()
+        if historial:
+            historial.cerrar()
+
+if __name__ == "__main__":
+    main()
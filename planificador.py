@@ -0,0 +1,120 @@
+"""
+Planificador central del ritmo de peticiones por host.
+
+FUNCIONAMIENTO:
+1. Cada host tiene una cubeta de fichas (token bucket) que se rellena a PETICIONES_POR_SEGUNDO_HOST
+   fichas por segundo, hasta un máximo de RAFAGA_HOST fichas.
+2. El ritmo es el menor entre el configurado y el que marca el 'Crawl-delay' del robots.txt incluido
+   en el repositorio (si lo define para nuestro agente de usuario).
+3. Antes de cada petición, los hilos (esperar_turno) y las corrutinas (esperar_turno_async) reservan
+   una ficha y esperan justo lo necesario hasta su turno. Como la reserva es compartida, varios
+   hilos a la vez nunca superan el ritmo permitido.
+4. Cuando se detecta la página de bloqueo (registrar_bloqueo) el intervalo del host se multiplica por
+   FACTOR_BACKOFF (hasta BACKOFF_MAXIMO); cada página correcta (registrar_exito) lo va devolviendo
+   al ritmo base.
+
+USO:
+    planificador = obtener_planificador()
+    planificador.esperar_turno(url)
+    driver.get(url)
+
+Sustituye a las esperas aleatorias repartidas por los scripts: se avanza exactamente al ritmo permitido.
+"""
+
+from urllib.parse import urlsplit
+import asyncio
+import threading
+import time
+import configuracion
+from validar_urls import PoliticaRobots
+
+
+class Cubeta:
+    """Cubeta de fichas de un host."""
+
+    def __init__(self, ritmo, capacidad):
+        self.ritmo_base = ritmo  # Fichas por segundo sin penalización
+        self.ritmo = ritmo
+        self.capacidad = capacidad
+        self.fichas = capacidad
+        self.actualizada = time.monotonic()
+
+    def reservar(self):
+        """Toma una ficha (aunque quede en negativo) y devuelve los segundos que hay que esperar."""
+        ahora = time.monotonic()
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.actualizada) * self.ritmo)
+        self.actualizada = ahora
+        self.fichas -= 1
+        return max(0.0, -self.fichas / self.ritmo)
+
+
+class Planificador:
+    """Reparte los turnos de petición por host entre todos los hilos y corrutinas."""
+
+    def __init__(self, peticiones_por_segundo=configuracion.PETICIONES_POR_SEGUNDO_HOST, rafaga=configuracion.RAFAGA_HOST,
+                 ruta_robots=configuracion.RUTA_ROBOTS, user_agent=configuracion.USER_AGENT_ROBOTS):
+        self.rafaga = rafaga
+        self.ritmo = peticiones_por_segundo
+        retraso = self._crawl_delay(ruta_robots, user_agent)
+        if retraso:
+            self.ritmo = min(self.ritmo, 1 / retraso)
+        self._cubetas = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _crawl_delay(ruta_robots, user_agent):
+        """Crawl-delay del robots.txt local para el agente de usuario, o None."""
+        try:
+            return PoliticaRobots(ruta_robots, user_agent).crawl_delay()
+        except OSError:
+            return None
+
+    def _cubeta(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._cubetas:
+            self._cubetas[host] = Cubeta(self.ritmo, self.rafaga)
+        return self._cubetas[host]
+
+    def reservar(self, url):
+        """Reserva el siguiente turno del host de la URL y devuelve los segundos de espera."""
+        with self._lock:
+            return self._cubeta(url).reservar()
+
+    def esperar_turno(self, url):
+        """Bloquea el hilo hasta que le toque hacer la petición."""
+        time.sleep(self.reservar(url))
+
+    async def esperar_turno_async(self, url):
+        """Versión para corrutinas de esperar_turno."""
+        await asyncio.sleep(self.reservar(url))
+
+    def registrar_bloqueo(self, url):
+        """La web ha devuelto la página de bloqueo: reducir el ritmo del host."""
+        with self._lock:
+            cubeta = self._cubeta(url)
+            cubeta.ritmo = max(cubeta.ritmo / configuracion.FACTOR_BACKOFF, cubeta.ritmo_base / configuracion.BACKOFF_MAXIMO)
+            cubeta.fichas = min(cubeta.fichas, 0)  # Sin ráfagas después de un bloqueo
+
+    def registrar_exito(self, url):
+        """Página correcta: devolver poco a poco el host a su ritmo base."""
+        with self._lock:
+            cubeta = self._cubeta(url)
+            cubeta.ritmo = min(cubeta.ritmo_base, cubeta.ritmo * configuracion.FACTOR_RECUPERACION)
+
+    def intervalo(self, url):
+        """Segundos actuales entre peticiones al host de la URL."""
+        with self._lock:
+            return 1 / self._cubeta(url).ritmo
+
+
+_planificador = None
+_lock_planificador = threading.Lock()
+
+# Función para obtener el planificador compartido por todo el proceso
+def obtener_planificador():
+    """Devuelve la instancia única de Planificador, creándola la primera vez."""
+    global _planificador
+    with _lock_planificador:
+        if _planificador is None:
+            _planificador = Planificador()
+        return _planificador
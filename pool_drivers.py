@@ -0,0 +1,285 @@
+"""
+Pool de drivers de Selenium reutilizables.
+
+FUNCIONAMIENTO:
+1. Al crear el pool se arrancan N sesiones de Chrome ("en caliente") que quedan a la espera.
+2. Cada hilo de trabajo toma una sesión libre, la usa para procesar una página y la devuelve.
+3. Una sesión se recicla (se cierra y se abre otra nueva) cuando:
+   - Ha procesado el número máximo de páginas configurado.
+   - El navegador se ha caído y la sesión ya no responde.
+4. Al terminar el programa se cierran todas las sesiones, aunque haya habido errores.
+
+Las sesiones usan el perfil de navegador configurado (PERFIL_NAVEGADOR): 'completo' o 'ligero'
+(sin imágenes, fuentes, vídeo ni rastreadores, con carga 'eager' y headless por defecto).
+Con PERFILES_PERSISTENTES cada hueco del pool usa su propio directorio de datos de Chrome
+(DIR_PERFILES/hueco_N, reservado con un archivo de bloqueo para que dos procesos no compartan el mismo)
+en lugar del modo incógnito, de modo que las cookies, entre ellas la del
+consentimiento de cookies, sobreviven al reciclado de la sesión y a las siguientes ejecuciones.
+
+USO:
+    with PoolDrivers(tamano=4) as pool:
+        for resultado in pool.mapear(procesar_pagina, urls):
+            ...
+
+Así se evita arrancar un Chrome nuevo por cada URL y se pueden repartir las páginas entre varios hilos.
+"""
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import atexit
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+from metricas import obtener_metricas
+import configuracion
+
+
+# Excepción que lanzan los scripts cuando detectan que la página está bloqueada
+class PaginaBloqueada(Exception):
+    """La web ha devuelto la página de bloqueo en lugar del contenido."""
+
+
+# Recursos que el perfil 'ligero' no descarga: solo leemos texto y el src de una imagen
+URLS_BLOQUEADAS = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*hotjar.com*', '*criteo.*', '*adnxs.com*', '*taboola.com*',
+]
+
+# Opciones de Chrome del perfil 'ligero'
+ARGUMENTOS_LIGERO = [
+    '--disable-extensions', '--disable-gpu', '--disable-background-networking', '--disable-default-apps',
+    '--disable-sync', '--disable-component-update', '--no-first-run', '--mute-audio',
+    '--blink-settings=imagesEnabled=false',
+]
+PREFERENCIAS_LIGERO = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.default_content_setting_values.notifications': 2,
+    'profile.default_content_setting_values.geolocation': 2,
+}
+
+# Función para configurar el driver
+def configurar_driver(headless=None, perfil=configuracion.PERFIL_NAVEGADOR, directorio_perfil=None):
+    """
+    Inicializa y configura el driver de Selenium.
+    perfil='completo' carga las páginas con todos sus recursos; perfil='ligero' bloquea imágenes, fuentes,
+    vídeo y rastreadores, usa pageLoadStrategy 'eager' y desactiva funciones que no necesitamos.
+    Si no se indica headless, el perfil ligero se ejecuta sin interfaz gráfica.
+    Con directorio_perfil se usa ese directorio de datos de Chrome (cookies persistentes) en lugar del modo incógnito.
+    """
+    ligero = perfil == 'ligero'
+    headless = ligero if headless is None else headless
+    options = Options()
+    if directorio_perfil:
+        options.add_argument(f'--user-data-dir={os.path.abspath(directorio_perfil)}')
+    else:
+        options.add_argument('--incognito')
+    if headless:
+        options.add_argument('--headless=new')  # Ejecutar sin interfaz gráfica
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument(f'user-agent={random.choice(configuracion.USER_AGENTS)}')  # Rotar agentes de usuario
+    if ligero:
+        options.page_load_strategy = 'eager'  # No esperar a imágenes ni iframes, solo al DOM
+        for argumento in ARGUMENTOS_LIGERO:
+            options.add_argument(argumento)
+        options.add_experimental_option('prefs', PREFERENCIAS_LIGERO)
+    service = Service(configuracion.RUTA_CHROMEDRIVER)
+    driver = webdriver.Chrome(service=service, options=options)
+    if ligero:
+        # Bloquear en la red lo que las preferencias no cubren (fuentes, vídeo, rastreadores)
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': URLS_BLOQUEADAS})
+    driver.maximize_window()  # Maximizar la ventana una sola vez por sesión
+    return driver
+
+
+# Función para bloquear un archivo sin esperar
+def bloquear_archivo(ruta):
+    """
+    Abre y bloquea el archivo para este proceso; devuelve el archivo abierto o None si lo tiene otro.
+    El sistema libera el bloqueo al cerrar el archivo o al morir el proceso.
+    """
+    archivo = open(ruta, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return None
+    return archivo
+
+# Función para reservar un directorio de perfil que no use ningún otro proceso
+def reservar_perfil(directorio_base=configuracion.DIR_PERFILES):
+    """
+    Devuelve (directorio, candado) del primer 'hueco_N' libre. Chrome no admite dos sesiones con el mismo
+    --user-data-dir, así que varios procesos en la misma máquina (trabajadores de coordinador.py,
+    numero_anuncios.py junto a pipeline.py) reciben directorios distintos; entre ejecuciones se
+    reutilizan los mismos y las cookies se conservan.
+    """
+    os.makedirs(directorio_base, exist_ok=True)
+    for numero in itertools.count():
+        directorio = os.path.join(directorio_base, f'hueco_{numero}')
+        candado = bloquear_archivo(directorio + '.lock')
+        if candado:
+            return directorio, candado
+
+# Función para comprobar si una sesión sigue respondiendo
+def driver_activo(driver):
+    """Devuelve False si el navegador se ha caído o la sesión ya no es válida."""
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+class PoolDrivers:
+    """Mantiene N sesiones de Chrome abiertas y las reparte entre hilos de trabajo."""
+
+    def __init__(self, tamano=configuracion.NUM_DRIVERS, max_paginas=configuracion.MAX_PAGINAS_POR_DRIVER, headless=None,
+                 perfil=configuracion.PERFIL_NAVEGADOR):
+        self.tamano = tamano
+        self.max_paginas = max_paginas
+        self.headless = headless
+        self.perfil = perfil
+        self._libres = queue.Queue()  # Sesiones disponibles
+        self._paginas = {}  # Páginas procesadas por cada sesión
+        self._huecos = {}  # Hueco del pool (y directorio de perfil) de cada sesión
+        self._perfiles = {}  # Directorio de perfil reservado (y su candado) de cada hueco
+        self._lock = threading.Lock()
+        self._cerrado = False
+        atexit.register(self.cerrar)  # Cerrar los navegadores aunque el script termine con error
+        try:
+            for hueco in range(tamano):
+                self._libres.put(self._crear(hueco))
+        except BaseException:
+            self.cerrar()  # No dejar huérfanas las sesiones que sí arrancaron
+            raise
+
+    def _crear(self, hueco):
+        """Arranca una sesión nueva en el hueco indicado y la registra en el pool."""
+        directorio = None
+        if configuracion.PERFILES_PERSISTENTES:
+            with self._lock:
+                if hueco not in self._perfiles:
+                    self._perfiles[hueco] = reservar_perfil()
+                directorio = self._perfiles[hueco][0]
+        with obtener_metricas().tramo('arranque_driver'):
+            driver = configurar_driver(self.headless, self.perfil, directorio)
+        with self._lock:
+            self._paginas[driver] = 0
+            self._huecos[driver] = hueco
+        return driver
+
+    def _descartar(self, driver):
+        """Cierra una sesión y la elimina del pool."""
+        with self._lock:
+            self._paginas.pop(driver, None)
+            self._huecos.pop(driver, None)
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            logging.error(f"Error al cerrar el driver: {str(e)}")
+
+    def _reciclar(self, driver):
+        """
+        Sustituye una sesión gastada o caída por una nueva en el mismo hueco (y perfil). Si Chrome no
+        arranca tras INTENTOS_ARRANQUE_DRIVER intentos, el pool se queda con un hueco menos y devuelve None.
+        """
+        hueco = self._huecos[driver]
+        self._descartar(driver)  # Chrome libera el directorio de perfil al cerrarse
+        for intento in range(1, configuracion.INTENTOS_ARRANQUE_DRIVER + 1):
+            try:
+                return self._crear(hueco)
+            except Exception as e:  # ChromeDriver ausente o Chrome que no arranca
+                logging.error(f"No se pudo arrancar el driver del hueco {hueco} (intento {intento}): {str(e)}")
+        with self._lock:
+            self.tamano -= 1
+        logging.error(f"El pool sigue con {self.tamano} sesiones sin el hueco {hueco}")
+        return None
+
+    def _tomar(self):
+        """Espera una sesión libre; lanza WebDriverException si el pool se ha quedado sin sesiones."""
+        while True:
+            try:
+                return self._libres.get(timeout=1)
+            except queue.Empty:
+                with self._lock:
+                    if self.tamano <= 0:
+                        raise WebDriverException("No queda ninguna sesión de Chrome en el pool")
+
+    @contextmanager
+    def driver(self):
+        """Presta una sesión libre al hilo que la pide y la devuelve al terminar."""
+        driver = self._tomar()
+        try:
+            yield driver
+        finally:
+            if self._cerrado:  # El pool se cerró mientras la sesión estaba prestada
+                self._descartar(driver)
+            else:
+                with self._lock:
+                    self._paginas[driver] += 1
+                    gastado = self._paginas[driver] >= self.max_paginas
+                if gastado or not driver_activo(driver):
+                    driver = self._reciclar(driver)
+                if driver is not None:  # Solo vuelven al pool las sesiones que están vivas
+                    self._libres.put(driver)
+
+    def mapear(self, funcion, elementos):
+        """
+        Aplica funcion(driver, elemento) a cada elemento repartiéndolos entre los hilos del pool.
+        Devuelve los resultados en el mismo orden que los elementos. Si alguna llamada lanza una
+        excepción (por ejemplo PaginaBloqueada) se cancelan las tareas pendientes y se propaga.
+        """
+        def tarea(elemento):
+            with self.driver() as driver:
+                return funcion(driver, elemento)
+
+        with ThreadPoolExecutor(max_workers=self.tamano) as executor:
+            futuros = [executor.submit(tarea, elemento) for elemento in elementos]
+            for futuro in futuros:
+                try:
+                    yield futuro.result()
+                except BaseException:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+    def cerrar(self):
+        """Cierra todas las sesiones del pool."""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        while True:
+            try:
+                driver = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(driver)
+        with self._lock:
+            for _, candado in self._perfiles.values():  # Liberar los directorios de perfil para otros procesos
+                candado.close()
+            self._perfiles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cerrar()
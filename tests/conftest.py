@@ -0,0 +1,54 @@
+"""
+Configuración común de las pruebas.
+
+FUNCIONAMIENTO:
+1. Antes de importar configuracion desactiva las escrituras auxiliares (eventos de métricas, archivo
+   de páginas, HTML guardado y perfiles persistentes) y añade al path la raíz del proyecto y
+   'benchmarks', donde está el sitio local de pruebas (sitio_fixtures.py).
+2. Cada prueba se ejecuta en un directorio temporal, así que las rutas relativas de configuracion
+   ('datos/...') no tocan los datos reales, con un planificador sin límite de ritmo y un cortacircuitos
+   nuevo.
+3. 'sitio' levanta el sitio de pruebas y 'navegador' arranca Chrome sin interfaz, o salta la prueba
+   si la máquina no tiene Chrome o ChromeDriver.
+
+USO:
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+os.environ.update({'INMO_METRICAS': '', 'INMO_ARCHIVAR_PAGINAS': '0', 'INMO_GUARDAR_HTML': '0',
+                   'INMO_PERFILES_PERSISTENTES': '0'})
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [RAIZ, os.path.join(RAIZ, 'benchmarks')]
+
+import pytest
+from sitio_fixtures import SitioFixtures
+
+
+@pytest.fixture(autouse=True)
+def entorno_aislado(tmp_path, monkeypatch):
+    import planificador
+    import fallos
+    monkeypatch.chdir(tmp_path)
+    sin_esperas = planificador.Planificador(1e9, 1e9)
+    sin_esperas.ritmo = 1e9  # Sin Crawl-delay del robots.txt
+    monkeypatch.setattr(planificador, '_planificador', sin_esperas)
+    monkeypatch.setattr(fallos, '_cortacircuitos', fallos.Cortacircuitos())
+    return tmp_path
+
+@pytest.fixture
+def sitio():
+    with SitioFixtures() as sitio:
+        yield sitio
+
+@pytest.fixture(scope='session')
+def navegador():
+    try:
+        from pool_drivers import configurar_driver
+        driver = configurar_driver(headless=True)
+    except Exception as e:  # Sin Chrome o sin ChromeDriver en esta máquina
+        pytest.skip(f"no se puede arrancar Chrome ({type(e).__name__})")
+    yield driver
+    driver.quit()
@@ -0,0 +1,24 @@
+"""Pruebas del archivo de páginas (archivo_paginas.py) con varios procesos escribiendo a la vez."""
+
+from concurrent.futures import ProcessPoolExecutor
+from archivo_paginas import ArchivoPaginas
+
+
+def archivar(directorio, proceso):
+    archivo = ArchivoPaginas(directorio, tamano_segmento=2048)
+    for numero in range(300):
+        # Dos de cada tres páginas tienen el mismo contenido en todos los procesos
+        archivo.guardar('anuncio', f"http://sitio/{numero}", f"<html>{numero} {'x' * numero * 20} {proceso if numero % 3 == 0 else ''}</html>")
+    archivo.cerrar()
+
+def test_varios_procesos_archivan_sin_pisar_bloques(tmp_path):
+    directorio = str(tmp_path / 'archivo')
+    with ProcessPoolExecutor(6) as ejecutor:
+        list(ejecutor.map(archivar, [directorio] * 6, range(6)))
+    archivo = ArchivoPaginas(directorio)
+    capturas = list(archivo.iterar())  # Cada bloque se descomprime desde el desplazamiento del índice
+    assert len(capturas) == 6 * 300
+    assert all(html.startswith(f"<html>{captura['url'].rsplit('/', 1)[1]} ") for captura, html in capturas)
+    assert archivo._conexion.execute("SELECT COUNT(*) FROM contenidos").fetchone()[0] == 200 + 6 * 100
+    assert len(list(tmp_path.glob('archivo/segmento_*.bin'))) > 1  # Se ha pasado de segmento
+    archivo.cerrar()
@@ -0,0 +1,57 @@
+"""Pruebas de los alquileres (lease) y latidos de la cola persistente (cola.py)."""
+
+import threading
+import time
+from cola import ColaPersistente, EN_CURSO
+from campos_anuncio import referencia_anuncio
+
+
+def crear_cola(sitio, duracion_lease=60):
+    cola = ColaPersistente('datos/cola.sqlite', duracion_lease=duracion_lease)
+    cola.poner_varias('anuncios', [(referencia_anuncio(url), [cd_postal, url]) for cd_postal, url in sitio.anuncios(['28001'])])
+    return cola
+
+def test_tomar_alquila_cada_tarea_a_un_solo_trabajador(sitio):
+    cola = crear_cola(sitio)
+    tomadas = cola.tomar('anuncios', 10, trabajador='w1')
+    assert len(tomadas) == 10
+    assert cola.contar('anuncios', (EN_CURSO,)) == 10
+    assert not {clave for clave, _ in tomadas} & {clave for clave, _ in cola.tomar('anuncios', 100, trabajador='w2')}
+    assert cola.tomar('anuncios', 1, trabajador='w3') == []
+    cola.cerrar()
+
+def test_tomar_desde_varios_hilos_no_repite_tareas(sitio):
+    cola = crear_cola(sitio)
+    por_hilo = {}
+
+    def trabajar(nombre):
+        claves = por_hilo.setdefault(nombre, [])
+        while tareas := cola.tomar('anuncios', 3, trabajador=nombre):
+            claves.extend(clave for clave, _ in tareas)
+
+    hilos = [threading.Thread(target=trabajar, args=(f"w{i}",)) for i in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    claves = [clave for lista in por_hilo.values() for clave in lista]
+    assert len(claves) == len(set(claves)) == sitio.total
+    cola.cerrar()
+
+def test_alquiler_caducado_lo_toma_otro_trabajador(sitio):
+    cola = crear_cola(sitio, duracion_lease=0.3)
+    tomadas = cola.tomar('anuncios', 5, trabajador='caido')
+    assert cola.tomar('anuncios', 5, trabajador='vivo') != tomadas
+    time.sleep(0.4)  # El trabajador 'caido' no envía latidos
+    assert cola.tomar('anuncios', 5, trabajador='rescate') == tomadas
+    cola.cerrar()
+
+def test_latido_renueva_los_alquileres(sitio):
+    cola = crear_cola(sitio, duracion_lease=0.4)
+    tomadas = cola.tomar('anuncios', 5, trabajador='w1')
+    for _ in range(3):
+        time.sleep(0.25)
+        assert cola.latido('w1') == 5
+    assert {clave for clave, _ in cola.tomar('anuncios', 100, trabajador='w2')}.isdisjoint(clave for clave, _ in tomadas)
+    assert cola.latido('desconocido') == 0
+    cola.cerrar()
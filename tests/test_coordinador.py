@@ -0,0 +1,105 @@
+"""Pruebas del coordinador (coordinador.py): métodos remotos permitidos, trabajadores remotos y exportación."""
+
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import pytest
+import coordinador
+from coordinador import ClienteCola, ManejadorCola
+from cola import ColaPersistente, EN_CURSO, HECHA, PENDIENTE
+from campos_anuncio import COLUMNAS_ANUNCIO, referencia_anuncio
+from historial_precios import HistorialPrecios
+from fetch_http import obtener_anuncios
+
+RUTA_COLA = 'datos/cola.sqlite'
+
+
+@pytest.fixture
+def servidor():
+    """Coordinador sirviendo una cola nueva en un puerto libre; devuelve (url, cola)."""
+    cola = ColaPersistente(RUTA_COLA)
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), type('Manejador', (ManejadorCola,), {'cola': cola}))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}", cola
+    servidor.shutdown()
+    servidor.server_close()
+    cola.cerrar()
+
+# Función para llamar a un método del coordinador sin ClienteCola
+def llamar(url, metodo, *args):
+    cuerpo = json.dumps({'args': args}).encode('utf-8')
+    with urlopen(Request(f"{url}/{metodo}", data=cuerpo, headers={'Content-Type': 'application/json'}), timeout=5) as respuesta:
+        return json.loads(respuesta.read())['resultado']
+
+@pytest.mark.parametrize('metodo', ['vaciar', 'reanudar', 'cerrar', '_actualizar', 'resultados', '__init__'])
+def test_metodos_fuera_de_la_lista_blanca(servidor, metodo):
+    url, cola = servidor
+    cola.poner('anuncios', '1', ['28001', 'http://fotocasa.test/1'])
+    with pytest.raises(HTTPError) as error:
+        llamar(url, metodo)
+    assert error.value.code == 404
+    assert cola.contar('anuncios') == 1  # La cola no se ha tocado
+
+def test_cliente_solo_expone_la_lista_blanca(servidor):
+    cliente = ClienteCola(servidor[0])
+    with pytest.raises(AttributeError):
+        cliente.vaciar
+    assert llamar(servidor[0], 'contar', 'anuncios') == cliente.contar('anuncios') == 0
+
+def test_trabajadores_remotos(servidor, sitio):
+    url, cola = servidor
+    cliente = ClienteCola(url)
+    links = sitio.anuncios(['28001', '28002'])
+    assert cliente.poner_varias('anuncios', [(referencia_anuncio(link[1]), list(link)) for link in links]) == len(links)
+
+    # Dos trabajadores remotos alquilan tareas distintas, las extraen del sitio y guardan los resultados
+    def trabajar(nombre):
+        remoto = ClienteCola(url)
+        while tareas := remoto.tomar('anuncios', 20, trabajador=nombre):
+            assert remoto.latido(nombre) == len(tareas)
+            registros = [datos for _, datos in obtener_anuncios([tuple(carga) for _, carga in tareas]) if datos]
+            remoto.guardar_resultados(registros, trabajador=nombre)
+
+    hilos = [threading.Thread(target=trabajar, args=(nombre,)) for nombre in ('w1', 'w2')]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert cliente.resumen() == {'anuncios': {HECHA: len(links)}}
+    assert cliente.vigentes([referencia_anuncio(url) for _, url in links]) == {referencia_anuncio(url) for _, url in links}
+
+def test_reanudar_solo_devuelve_las_tareas_propias_o_caducadas():
+    cola = ColaPersistente(RUTA_COLA, duracion_lease=60)
+    cola.poner_varias('anuncios', [(str(i), [i]) for i in range(3)])
+    cola.tomar('anuncios', 1, trabajador='w1')
+    cola.tomar('anuncios', 1, trabajador='w2')
+    assert cola.reanudar('w1') == 1
+    assert cola.resumen() == {'anuncios': {PENDIENTE: 2, EN_CURSO: 1}}
+    cola.cerrar()
+
+# Función para crear un anuncio guardado por un trabajador
+def anuncio(referencia, precio, fecha='01-11-2024'):
+    return {**dict.fromkeys(COLUMNAS_ANUNCIO, 'No disponible'), 'fecha': fecha, 'referencia': referencia,
+            'codigo_postal': '28001', 'precio': f"{precio:,} €".replace(',', '.')}
+
+def test_exportar_no_repite_resultados(monkeypatch):
+    exportados = []
+    monkeypatch.setattr(coordinador, 'guardar_anuncios', lambda registros, formato: exportados.extend(registros))
+    cola = ColaPersistente(RUTA_COLA)
+    cola.guardar_resultados([anuncio(str(i), 100_000 + i) for i in range(5)])
+    coordinador.exportar(lote=2, destino=RUTA_COLA)
+    assert sorted(datos['referencia'] for datos in exportados) == [str(i) for i in range(5)]
+    coordinador.exportar(lote=2, destino=RUTA_COLA)
+    assert len(exportados) == 5  # Nada nuevo que exportar
+    cola.guardar_resultados([anuncio('3', 90_000, fecha='05-11-2024')])
+    coordinador.exportar(lote=2, destino=RUTA_COLA)
+    assert exportados[5:] == [anuncio('3', 90_000, fecha='05-11-2024')]
+    cola.cerrar()
+
+    # Los anuncios de los trabajadores también llegan al historial de precios
+    historial = HistorialPrecios()
+    assert historial.trayectoria('3')['precio'].tolist() == [100_003, 90_000]
+    assert historial.bajadas('2024-11-01')['referencia'].tolist() == ['3']
+    historial.cerrar()
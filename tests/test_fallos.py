@@ -0,0 +1,141 @@
+"""Pruebas de la clasificación de fallos, la cola de reintentos y el cortacircuitos (fallos.py)."""
+
+import asyncio
+import json
+import threading
+import time
+from urllib.request import urlopen
+import pytest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from pool_drivers import PaginaBloqueada
+from fallos import (CircuitoAbierto, ColaReintentos, Cortacircuitos, EstructuraAusente, clasificar, espera_reintento,
+                    mapear_con_reintentos)
+import configuracion
+
+URL = 'http://fotocasa.test/es/comprar/vivienda/1'
+
+
+class PoolSecuencial:
+    """Mismo mapear() que PoolDrivers, sin navegadores."""
+
+    def mapear(self, funcion, elementos):
+        return [funcion(None, elemento) for elemento in elementos]
+
+
+@pytest.fixture
+def reintentos(monkeypatch):
+    for clase in configuracion.ESPERA_FALLO:  # Esperas cortas: 0,1 s, 0,2 s, 0,4 s...
+        monkeypatch.setitem(configuracion.ESPERA_FALLO, clase, 0.1)
+    cola = ColaReintentos('datos/reintentos.sqlite', 'datos/fallidos.jsonl')
+    yield cola
+    cola.cerrar()
+
+@pytest.mark.parametrize('error, clase', [
+    (PaginaBloqueada(URL), 'bloqueo'), (CircuitoAbierto(URL), 'bloqueo'), (TimeoutException(), 'timeout'),
+    (EstructuraAusente(URL), 'sin_estructura'), (WebDriverException('net::ERR_NAME_NOT_RESOLVED'), 'red'),
+    (WebDriverException('chrome not reachable'), 'driver_caido'), (ConnectionResetError(), 'red'), (ValueError(), 'otro'),
+])
+def test_clasificar(error, clase):
+    assert clasificar(error) == clase
+
+def test_espera_reintento_se_duplica_hasta_el_maximo():
+    base = configuracion.ESPERA_FALLO['timeout']
+    assert [espera_reintento('timeout', intentos) for intentos in (1, 2, 3)] == [base, base * 2, base * 4]
+    assert espera_reintento('timeout', 50) == configuracion.ESPERA_FALLO_MAXIMA
+
+def test_reintento_espera_su_turno(reintentos):
+    assert reintentos.registrar('anuncios', '1', ['28001', URL], TimeoutException()) == ('timeout', 0.1)
+    assert reintentos.listos('anuncios') == []
+    time.sleep(0.15)
+    assert reintentos.listos('anuncios') == [['28001', URL]]
+    assert reintentos.registrar('anuncios', '1', ['28001', URL], TimeoutException()) == ('timeout', 0.2)
+    assert reintentos.listos('anuncios') == []
+    assert 0.1 < reintentos.proxima('anuncios') <= 0.2
+
+def test_intentos_agotados_pasan_a_fallidos(reintentos):
+    for _ in range(configuracion.INTENTOS_FALLO['sin_estructura'] - 1):
+        reintentos.registrar('anuncios', '1', ['28001', URL], EstructuraAusente(URL))
+    assert reintentos.registrar('anuncios', '1', ['28001', URL], EstructuraAusente(URL)) == ('sin_estructura', None)
+    assert reintentos.contar('anuncios') == 0
+    with open('datos/fallidos.jsonl', encoding='utf-8') as f:
+        fallido = json.loads(f.readline())
+    assert (fallido['clave'], fallido['clase'], fallido['intentos']) == ('1', 'sin_estructura', configuracion.INTENTOS_FALLO['sin_estructura'])
+
+def test_mapear_con_reintentos_repite_los_fallos(reintentos, sitio):
+    links = sitio.anuncios(['28001'])[:6]
+    fallan = {url for _, url in links[::2]}  # Fallan la primera vez
+    intentos = {}
+
+    def descargar(driver, link):  # Los reintentos vuelven de la cola como listas JSON
+        intentos[link[1]] = intentos.get(link[1], 0) + 1
+        if link[1] in fallan and intentos[link[1]] == 1:
+            raise TimeoutException(link[1])
+        with urlopen(link[1], timeout=5) as respuesta:
+            return respuesta.status
+
+    inicio = time.monotonic()
+    resultados = list(mapear_con_reintentos(PoolSecuencial(), descargar, iter(links), 'anuncios', clave=lambda link: link[1],
+                                            reintentos=reintentos, limite=5, trozo=4))
+    assert sorted((tuple(link), estado) for link, estado in resultados) == sorted((link, 200) for link in links)
+    assert [intentos[url] for _, url in links] == [2, 1, 2, 1, 2, 1]
+    assert time.monotonic() - inicio >= 0.1  # Los reintentos esperan su turno
+    assert reintentos.contar('anuncios') == 0
+
+def test_mapear_con_reintentos_aplaza_con_el_circuito_abierto(reintentos):
+    def bloqueado(driver, elemento):
+        raise CircuitoAbierto(elemento)
+
+    with pytest.raises(CircuitoAbierto):
+        list(mapear_con_reintentos(PoolSecuencial(), bloqueado, ['a', 'b'], 'anuncios', reintentos=reintentos))
+    assert sorted(reintentos.listos('anuncios')) == ['a', 'b']  # Sin contar intento: se repiten en la siguiente ejecución
+
+def test_circuito_se_abre_y_se_cierra_con_la_prueba():
+    cortacircuitos = Cortacircuitos(umbral=2, pausa=0.2, max_aperturas=3)
+    cortacircuitos.registrar_bloqueo(URL)
+    assert not cortacircuitos.en_pausa(URL)
+    cortacircuitos.registrar_bloqueo(URL)
+    assert cortacircuitos.en_pausa(URL)
+
+    # Pasada la pausa solo sale la petición de prueba; el resto espera a saber si el host sigue bloqueado
+    inicio = time.monotonic()
+    cortacircuitos.esperar(URL)
+    assert time.monotonic() - inicio >= 0.15
+    esperando = threading.Thread(target=cortacircuitos.esperar, args=(URL,))
+    esperando.start()
+    esperando.join(0.2)
+    assert esperando.is_alive()  # Semiabierto
+    cortacircuitos.registrar_exito(URL)
+    esperando.join(1)
+    assert not esperando.is_alive()
+    inicio = time.monotonic()
+    cortacircuitos.esperar(URL)  # Cerrado: no espera
+    assert time.monotonic() - inicio < 0.05
+
+def test_prueba_fallida_reabre_el_circuito_hasta_dar_el_host_por_perdido():
+    cortacircuitos = Cortacircuitos(umbral=1, pausa=0.1, max_aperturas=2)
+    cortacircuitos.registrar_bloqueo(URL)
+    cortacircuitos.esperar(URL)  # Petición de prueba
+    cortacircuitos.registrar_bloqueo(URL)  # La prueba vuelve a estar bloqueada: segunda apertura
+    with pytest.raises(CircuitoAbierto):
+        cortacircuitos.esperar(URL)
+    with pytest.raises(CircuitoAbierto):
+        asyncio.run(cortacircuitos.esperar_async(URL))
+
+def test_esperar_async_deja_pasar_una_sola_prueba():
+    cortacircuitos = Cortacircuitos(umbral=1, pausa=0.1)
+    cortacircuitos.registrar_bloqueo(URL)
+    salidas = []
+
+    async def peticion(nombre):
+        await cortacircuitos.esperar_async(URL, intervalo=0.05)
+        salidas.append((nombre, time.monotonic()))
+        if len(salidas) == 1:  # Petición de prueba
+            await asyncio.sleep(0.2)
+            cortacircuitos.registrar_exito(URL)
+
+    async def varias():
+        await asyncio.gather(*(peticion(nombre) for nombre in range(3)))
+
+    asyncio.run(varias())
+    assert sorted(nombre for nombre, _ in salidas) == [0, 1, 2]
+    assert all(momento - salidas[0][1] >= 0.15 for _, momento in salidas[1:])  # Las demás esperan a la prueba
@@ -0,0 +1,49 @@
+"""Pruebas de la descarga por HTTP (fetch_http.py) contra el sitio de pruebas."""
+
+import fallos
+from fetch_http import extraer_anuncio, extraer_busqueda, obtener_anuncios, obtener_busquedas
+from campos_anuncio import CAMPOS_TARJETA, referencia_anuncio
+from sitio_fixtures import SitioFixtures, valores_anuncio
+import configuracion
+
+PAGINA_BLOQUEO = '<html><body><div><h1>Se ha detectado un uso indebido</h1></div></body></html>'
+
+
+def test_obtener_anuncios(sitio):
+    links = sitio.anuncios(['28001', '28002'])
+    resultados = list(obtener_anuncios(iter(links), lote=40))  # Acepta un iterador y lo procesa por lotes
+    assert [link for link, _ in resultados] == links
+    for (cd_postal, url), datos in resultados:
+        valores = valores_anuncio(referencia_anuncio(url))
+        assert datos['referencia'] == valores['referencia']
+        assert datos['codigo_postal'] == cd_postal
+        assert (datos['precio'], datos['area'], datos['tipo']) == (valores['precio'], valores['area'], valores['tipo'])
+
+def test_obtener_busquedas(sitio):
+    [(website, (contador, tarjetas))] = obtener_busquedas(sitio.busquedas(['28001']))
+    assert contador == sitio.total
+    assert len(tarjetas) == configuracion.ANUNCIOS_POR_PAGINA
+    primera = tarjetas[0]
+    valores = valores_anuncio(referencia_anuncio(primera['href']))
+    assert set(primera) == {'href', *CAMPOS_TARJETA}
+    assert (primera['precio'], primera['area']) == (valores['precio'], valores['area'])
+
+def test_busqueda_sin_resultados():
+    with SitioFixtures(total=0) as vacio:
+        assert obtener_busquedas(vacio.busquedas(['28001'])) == [(vacio.busquedas(['28001'])[0], (0, []))]
+
+def test_busqueda_sin_contador_ni_aviso():
+    assert extraer_busqueda('<html><body><div id="App"></div></body></html>', 'http://fotocasa.test/l') is None
+
+def test_bloqueos_abren_el_circuito():
+    url = 'http://fotocasa.test/anuncio/1'
+    for _ in range(configuracion.UMBRAL_CIRCUITO):
+        assert extraer_anuncio(PAGINA_BLOQUEO, url, '28001') is None
+    assert fallos.obtener_cortacircuitos().en_pausa(url)
+
+def test_host_perdido_pasa_a_selenium(sitio, monkeypatch):
+    cortacircuitos = fallos.Cortacircuitos(umbral=1, max_aperturas=1)
+    monkeypatch.setattr(fallos, '_cortacircuitos', cortacircuitos)
+    links = sitio.anuncios(['28001'])[:5]
+    cortacircuitos.registrar_bloqueo(links[0][1])
+    assert [datos for _, datos in obtener_anuncios(links)] == [None] * len(links)
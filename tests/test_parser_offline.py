@@ -0,0 +1,50 @@
+"""Pruebas de la extracción sin navegador (parser_offline.py) contra las fichas del sitio de pruebas."""
+
+import datetime
+import pytest
+from lxml import html
+from archivo_paginas import ArchivoPaginas
+from campos_anuncio import CAMPOS_ANUNCIO, NO_DISPONIBLE, extraer_campos, referencia_anuncio
+from parser_offline import extraer_campos_html, guardar_html, parsear_archivo_paginas, parsear_directorio
+from sitio_fixtures import pagina_anuncio, referencias_zona, valores_anuncio
+
+# Campo de CAMPOS_ANUNCIO -> clave de valores_anuncio()
+CAMPOS_FIXTURE = {'precio': 'precio', 'area': 'area', 'dormitorios': 'dormitorios', 'planta': 'planta', 'tipo': 'tipo',
+                  'img': 'img', 'promotora': 'promotora', 'certificado_energetico': 'certificado'}
+REFERENCIAS = referencias_zona('28001', 12)
+
+
+@pytest.mark.parametrize('referencia', REFERENCIAS)
+def test_offline_lee_los_valores_de_la_ficha(referencia):
+    campos = extraer_campos_html(html.document_fromstring(pagina_anuncio(referencia)))
+    valores = valores_anuncio(referencia)
+    assert set(campos) == set(CAMPOS_ANUNCIO)
+    for campo, clave in CAMPOS_FIXTURE.items():
+        assert campos[campo] == valores[clave]
+    assert campos['direccion'] == NO_DISPONIBLE  # Campo sin elemento en la ficha: valor por defecto
+
+def test_offline_y_selenium_extraen_lo_mismo(sitio, navegador):
+    for cd_postal, url in sitio.anuncios(['28001'])[:5]:
+        navegador.get(url)
+        esperado = extraer_campos_html(html.document_fromstring(pagina_anuncio(referencia_anuncio(url))))
+        assert extraer_campos(navegador) == esperado
+
+def test_parsear_directorio(tmp_path, sitio):
+    links = sitio.anuncios(['28001', '28002'])
+    for cd_postal, url in links:
+        guardar_html(pagina_anuncio(referencia_anuncio(url)), url, cd_postal, '01-01-2025', str(tmp_path / 'html'))
+    registros = parsear_directorio(str(tmp_path / 'html'), procesos=2)
+    assert sorted(registro['referencia'] for registro in registros) == sorted(referencia_anuncio(url) for _, url in links)
+    for registro in registros:
+        assert registro['precio'] == valores_anuncio(registro['referencia'])['precio']
+        assert registro['fecha'] == '01-01-2025'
+
+def test_parsear_archivo_paginas_por_lotes():
+    archivo = ArchivoPaginas()
+    for referencia in REFERENCIAS:
+        archivo.guardar('anuncio', f"http://fotocasa.test/{referencia}", pagina_anuncio(referencia), referencia=referencia,
+                        codigo_postal='28001', fecha=datetime.date(2025, 1, 1))
+    archivo.cerrar()
+    lotes = list(parsear_archivo_paginas(procesos=2, lote=5))
+    assert [len(lote) for lote in lotes] == [5, 5, 2]
+    assert sorted(registro['referencia'] for lote in lotes for registro in lote) == REFERENCIAS
@@ -1,46 +1,177 @@
 """
-Este script verifica si las URLs almacenadas en archivos CSV pueden ser rastreadas según las reglas 
+Este script verifica si las URLs almacenadas en archivos CSV pueden ser rastreadas según las reglas
 definidas en el archivo robots.txt de un sitio web.
 
 FUNCIONAMIENTO:
-1. Carga y analiza el archivo robots.txt de Fotocasa utilizando urllib.robotparser.
-2. Lee dos archivos CSV:
+1. Carga el robots.txt una sola vez (el incluido en el repositorio o el publicado por la web) y lo
+   guarda en caché durante TTL_ROBOTS_SEGUNDOS.
+2. Precompila las reglas Allow/Disallow del grupo que corresponde a nuestro agente de usuario en
+   expresiones regulares (admite los comodines '*' y '$' que urllib.robotparser no entiende).
+   Gana la regla más larga que coincide y, en caso de empate, Allow.
+3. Lee dos archivos CSV:
    - 'start_urls.csv' (columna 0): Contiene URLs iniciales.
    - 'links_anuncios.csv' (columna 2): Contiene URLs de anuncios.
-3. Para cada URL en ambos archivos, verifica si su rastreo está permitido según robots.txt.
-4. Muestra un mensaje indicando si la URL puede ser rastreada o no.
+4. Evalúa cada columna entera de una vez y muestra qué URLs pueden ser rastreadas y cuáles no.
+
+Los scripts de rastreo usan PoliticaRobots (obtener_politica()) para descartar las URLs no permitidas
+antes de ponerlas en cola.
 
 USO:
-Este script es útil para desarrolladores de web scraping, ya que permite comprobar automáticamente 
+Este script es útil para desarrolladores de web scraping, ya que permite comprobar automáticamente
 si un sitio web permite el rastreo de determinadas páginas antes de ejecutar un crawler.
 """
 
 
-from urllib.robotparser import RobotFileParser
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+import os
+import re
+import threading
+import time
 import pandas as pd
+import configuracion
+
+
+# Función para convertir una ruta de robots.txt en expresión regular
+def compilar_regla(ruta):
+    """'/*/l/2*' -> re que casa con la ruta+query; '$' al final ancla la coincidencia."""
+    anclada = ruta.endswith('$')
+    ruta = ruta[:-1] if anclada else ruta
+    patron = '.*'.join(re.escape(parte) for parte in ruta.split('*'))
+    return re.compile(patron + ('$' if anclada else ''))
+
+
+# Función para leer los grupos de reglas de un robots.txt
+def leer_grupos(texto):
+    """Devuelve {agente: {'reglas': [(permitir, longitud, regex)], 'crawl_delay': float o None}}."""
+    grupos = {}
+    agentes, en_reglas = [], False
+    for linea in texto.splitlines():
+        linea = linea.split('#', 1)[0].strip()
+        if ':' not in linea:
+            continue
+        clave, valor = (parte.strip() for parte in linea.split(':', 1))
+        clave = clave.lower()
+        if clave == 'user-agent':
+            if en_reglas:  # Empieza un grupo nuevo
+                agentes, en_reglas = [], False
+            agentes.append(valor.lower())
+            for agente in agentes:
+                grupos.setdefault(agente, {'reglas': [], 'crawl_delay': None})
+        elif clave in ('allow', 'disallow'):
+            en_reglas = True
+            if not valor:  # 'Disallow:' vacío no prohíbe nada
+                continue
+            for agente in agentes:
+                grupos[agente]['reglas'].append((clave == 'allow', len(valor), compilar_regla(valor)))
+        elif clave == 'crawl-delay':
+            en_reglas = True
+            try:
+                for agente in agentes:
+                    grupos[agente]['crawl_delay'] = float(valor)
+            except ValueError:
+                pass
+    return grupos
+
+
+class PoliticaRobots:
+    """Reglas de robots.txt para un agente de usuario, cargadas una vez y cacheadas con TTL."""
+
+    def __init__(self, origen=configuracion.ORIGEN_ROBOTS, user_agent=configuracion.USER_AGENT_ROBOTS,
+                 ttl=configuracion.TTL_ROBOTS_SEGUNDOS):
+        self.origen = origen  # Ruta local o URL del robots.txt
+        self.user_agent = user_agent.lower()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cargado = None
+        self._reglas = []
+        self._crawl_delay = None
+
+    def _leer(self):
+        """Texto del robots.txt desde el archivo local o la web."""
+        if self.origen.startswith(('http://', 'https://')):
+            peticion = Request(self.origen, headers={'User-Agent': configuracion.USER_AGENTS[0]})
+            with urlopen(peticion, timeout=30) as respuesta:
+                return respuesta.read().decode('utf-8', errors='replace')
+        with open(self.origen, encoding='utf-8') as f:
+            return f.read()
+
+    def _cargar(self):
+        """(Re)carga y compila las reglas si no están cargadas o ha caducado la caché."""
+        with self._lock:
+            if self._cargado is not None and time.monotonic() - self._cargado < self.ttl:
+                return
+            try:
+                grupos = leer_grupos(self._leer())
+            except OSError as e:
+                if self._cargado is None and os.path.exists(configuracion.RUTA_ROBOTS):
+                    print(f"No se pudo leer {self.origen} ({e}), se usa {configuracion.RUTA_ROBOTS}")
+                    with open(configuracion.RUTA_ROBOTS, encoding='utf-8') as f:
+                        grupos = leer_grupos(f.read())
+                elif self._cargado is not None:
+                    self._cargado = time.monotonic()  # Mantener las reglas anteriores hasta el siguiente TTL
+                    return
+                else:
+                    raise
+            grupo = grupos.get(self.user_agent) or grupos.get('*') or {'reglas': [], 'crawl_delay': None}
+            # Ordenar para que la primera coincidencia sea la más larga y, a igual longitud, Allow
+            self._reglas = sorted(grupo['reglas'], key=lambda regla: (-regla[1], not regla[0]))
+            self._crawl_delay = grupo['crawl_delay']
+            self._cargado = time.monotonic()
+
+    def permitida(self, url):
+        """True si robots.txt permite rastrear la URL."""
+        self._cargar()
+        partes = urlsplit(url)
+        ruta = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+        for permitir, _, regex in self._reglas:
+            if regex.match(ruta):
+                return permitir
+        return True
+
+    def mascara(self, urls):
+        """Serie booleana con una entrada por URL; cada URL distinta se evalúa una sola vez."""
+        urls = pd.Series(urls)
+        distintas = urls.drop_duplicates()
+        resultado = dict(zip(distintas, (self.permitida(str(url)) for url in distintas)))
+        return urls.map(resultado).astype(bool)
+
+    def filtrar(self, urls):
+        """Devuelve solo las URLs permitidas, en el mismo orden."""
+        urls = list(urls)
+        return [url for url, permitida in zip(urls, self.mascara(urls)) if permitida]
+
+    def crawl_delay(self):
+        """Crawl-delay del grupo de nuestro agente de usuario, o None."""
+        self._cargar()
+        return self._crawl_delay
+
+
+_politica = None
+_lock_politica = threading.Lock()
+
+# Función para obtener la política compartida por todo el proceso
+def obtener_politica():
+    """Devuelve la instancia única de PoliticaRobots, creándola la primera vez."""
+    global _politica
+    with _lock_politica:
+        if _politica is None:
+            _politica = PoliticaRobots()
+        return _politica
+
+def main():
+    politica = obtener_politica()
+    # Leer los archivo de csv
+    pd.set_option('display.max_colwidth', None)
+    df = pd.read_csv('datos/start_urls.csv', header=None)[0]
+    df_anuncios = pd.read_csv('datos/links_anuncios.csv', header=None, usecols=[2])[2]
+    # Verificar si las URLs están permitidas para rastrear
+    for urls in (df, df_anuncios):
+        for url, permitida in zip(urls, politica.mascara(urls)):
+            if permitida:
+                print(f"La URL {url} está permitida para rastrear.")
+            else:
+                print(f"La URL {url} NO está permitida para rastrear.")
 
-def es_url_permitida(url, robots_url):
-    # Cargar el archivo robots.txt
-    parser = RobotFileParser()
-    parser.set_url(robots_url)
-    parser.read()
-    # Verificar si la URL está permitida
-    return parser.can_fetch("*", url)
-
-robots_txt_url = "https://www.fotocasa.es/robots.txt" # URL del archivo robots.txt
-# Leer los archivo de csv
-pd.set_option('display.max_colwidth', None)
-df = pd.read_csv('datos/start_urls.csv', header=None)[0]
-df_anuncios = pd.read_csv('datos/links_anuncios.csv', header=None)[2]
-# Verificar si las URLs están permitidas para rastrear
-for url in df:
-    if es_url_permitida(url, robots_txt_url):
-        print(f"La URL {url} está permitida para rastrear.")
-    else:
-        print(f"La URL {url} NO está permitida para rastrear.")
-
-for url in df_anuncios:
-    if es_url_permitida(url, robots_txt_url):
-        print(f"La URL {url} está permitida para rastrear.")
-    else:
-        print(f"La URL {url} NO está permitida para rastrear.")
+if __name__ == "__main__":
+    main()